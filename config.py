@@ -22,5 +22,13 @@ DEFAULT_STRATEGIES_FOLDER = "strategies"
 DEFAULT_RESULTS_PATH = ".results/"
 DEFAULT_DELIMITER = ";"
 MAX_PROCESSES_NUMBER = 36
+MIGRATION_BROKER_HOST = "127.0.0.1"
+MIGRATION_BROKER_PORT = 50010
+EXECUTOR_HOST = "127.0.0.1"
+EXECUTOR_PORT = 50020
+# The authkeys of the migration broker and of the remote workers are never stored, they are passed on the command line or
+# in these environment variables
+MIGRATION_BROKER_AUTHKEY_VARIABLE = "JACKBOT_MIGRATION_AUTHKEY"
+EXECUTOR_AUTHKEY_VARIABLE = "JACKBOT_EXECUTOR_AUTHKEY"
 
 # endregion
@@ -0,0 +1,97 @@
+import os
+import sys
+
+import numpy
+
+from core import lib
+from core.bot import candle_store
+from core.bot.candle_store import OPEN_T, OPEN, HIGH, LOW, CLOSE, VOLUME, CLOSE_T
+
+PYRAMID_FLAGS = ["3m", "5m", "15m", "1h", "4h", "1d"]
+# Quote volume, number of trades, taker buy base and quote volumes of the binance klines
+SUMMED_COLUMNS = [VOLUME, 7, 8, 9, 10]
+MINUTE_MS = 60000
+
+
+def resample(data: numpy.ndarray, timeframe: int) -> numpy.ndarray:
+    """Groups 1m candles into closed bars of a timeframe
+
+    Candles are grouped by their OPEN_T timestamp (ms) floored to the timeframe, so missing minutes never shift the
+    following bars. The trailing bar is dropped if the dataset ends before it closes.
+
+    Parameters:
+        data (ndarray): 1m candles matrix
+        timeframe (int): minutes of the bars
+
+    Returns:
+        The bars matrix, with the same column layout of the candles
+    """
+    span = timeframe * MINUTE_MS
+    if len(data) == 0 or timeframe <= 1:
+        return numpy.array(data, order = "F")
+    buckets = (data[:, OPEN_T] // span).astype(numpy.int64)
+    starts = numpy.flatnonzero(numpy.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = numpy.concatenate((starts[1:], [len(data)])) - 1
+
+    bars = numpy.zeros((len(starts), data.shape[1]), dtype = numpy.float64, order = "F")
+    bars[:, OPEN_T] = buckets[starts] * span
+    bars[:, OPEN] = data[starts, OPEN]
+    bars[:, HIGH] = numpy.maximum.reduceat(data[:, HIGH], starts)
+    bars[:, LOW] = numpy.minimum.reduceat(data[:, LOW], starts)
+    bars[:, CLOSE] = data[ends, CLOSE]
+    bars[:, CLOSE_T] = bars[:, OPEN_T] + span - 1
+    for column in SUMMED_COLUMNS:
+        if column < data.shape[1]:
+            bars[:, column] = numpy.add.reduceat(data[:, column], starts)
+
+    if data[ends[-1], CLOSE_T] < bars[-1, CLOSE_T]:
+        bars = bars[:-1]
+    return bars
+
+
+def get_bars_path(data_path: str, timeframe: int) -> str:
+    return os.path.splitext(candle_store.get_store_path(data_path))[0] + "." + lib.get_flag_from_minutes(timeframe) + candle_store.STORE_EXTENSION
+
+
+def load_bars(data_path: str, timeframe: int, data: numpy.ndarray = None) -> numpy.ndarray:
+    """Returns the memory mapped bars of a dataset, building and caching them next to the dataset when missing or stale
+
+    Parameters:
+        data_path (str): path of the 1m dataset
+        timeframe (int): minutes of the bars
+        data (ndarray): already loaded 1m candles of the dataset, loaded from data_path if not provided
+    """
+    if timeframe <= 1:
+        return data if data is not None else candle_store.load(data_path)
+    if lib.get_flag_from_minutes(timeframe) is None:
+        print("Unable to cache bars for a timeframe of " + str(timeframe) + " minutes, resampling in memory")
+        return resample(data if data is not None else candle_store.load(data_path), timeframe)
+
+    bars_path = get_bars_path(data_path, timeframe)
+    store_path = candle_store.get_store_path(data_path)
+    if data is None:
+        data = candle_store.load(data_path)
+        if data is None: return None
+    if not os.path.exists(bars_path) or candle_store.is_stale(data_path) or os.path.getmtime(bars_path) < os.path.getmtime(store_path):
+        tmp_path = bars_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            numpy.save(file, resample(data, timeframe))
+        os.replace(tmp_path, bars_path)
+    return numpy.load(bars_path, mmap_mode = "r")
+
+
+def build_pyramid(data_path: str, flags: list[str] = None) -> dict[str, numpy.ndarray]:
+    """Builds and caches the bars of all the pyramid timeframes of a 1m dataset"""
+    if flags is None: flags = PYRAMID_FLAGS
+    data = candle_store.load(data_path)
+    if data is None: return {}
+    return dict([(flag, load_bars(data_path, lib.get_minutes_from_flag(flag), data)) for flag in flags])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m core.bot.bar_pyramid <dataset> [<dataset> ...]")
+        exit(1)
+    for path in sys.argv[1:]:
+        for flag, bars in build_pyramid(path).items():
+            print("{:<6s}{:>10d} bars -> {:s}".format(flag, len(bars), get_bars_path(path, lib.get_minutes_from_flag(flag))), flush = True)
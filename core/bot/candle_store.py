@@ -0,0 +1,136 @@
+import os
+import sys
+import tempfile
+
+import numpy
+from numpy.lib import format as npy_format
+
+import config
+
+OPEN_T: int = 0
+OPEN: int = 1
+HIGH: int = 2
+LOW: int = 3
+CLOSE: int = 4
+VOLUME: int = 5
+CLOSE_T: int = 6
+
+STORE_EXTENSION = ".npy"
+CONVERSION_CHUNK_ROWS = 1 << 18
+
+
+def get_store_path(data_path: str) -> str:
+    """Returns the path of the binary candle store associated to a dataset"""
+    if data_path.endswith(STORE_EXTENSION):
+        return data_path
+    return os.path.splitext(data_path)[0] + STORE_EXTENSION
+
+
+def is_stale(data_path: str) -> bool:
+    """Verifies if the binary store of a csv dataset is missing or older than the csv itself"""
+    store_path = get_store_path(data_path)
+    if not os.path.exists(store_path):
+        return True
+    if store_path == data_path or not os.path.exists(data_path):
+        return False
+    return os.path.getmtime(store_path) < os.path.getmtime(data_path)
+
+
+def __parse_row(line: str) -> list[float]:
+    """Returns the values of a csv line, ignoring a trailing delimiter, None if the line is not numeric"""
+    fields = [field.strip() for field in line.split(config.DEFAULT_DELIMITER)]
+    while len(fields) > 0 and fields[-1] == "": fields.pop()
+    try:
+        return [float(field) for field in fields] if len(fields) > 0 else None
+    except ValueError:
+        return None
+
+
+def __parse_chunk(lines: list[str], columns: int) -> numpy.ndarray:
+    """Parses the lines with 'columns' values, the headers and the malformed lines are skipped"""
+    try:
+        return numpy.loadtxt(lines, delimiter = config.DEFAULT_DELIMITER, dtype = numpy.float64, ndmin = 2, usecols = range(columns))
+    except ValueError:
+        rows = [row for row in map(__parse_row, lines) if row is not None and len(row) == columns]
+        return numpy.array(rows, dtype = numpy.float64).reshape(len(rows), columns)
+
+
+def __read_chunks(csv_path: str):
+    """Yields the valid rows of the csv in chunks, the number of columns is the one of the first numeric line"""
+    columns = None
+    lines = []
+    with open(csv_path, "r") as file:
+        for line in file:
+            if columns is None:
+                row = __parse_row(line)
+                if row is None: continue
+                columns = len(row)
+            if not line.strip(): continue
+            lines.append(line)
+            if len(lines) >= CONVERSION_CHUNK_ROWS:
+                yield __parse_chunk(lines, columns)
+                lines = []
+    if len(lines) > 0:
+        yield __parse_chunk(lines, columns)
+
+
+def convert(csv_path: str, store_path: str = None) -> str:
+    """Converts a delimited csv dataset into a column-major binary candle store
+
+    The csv is parsed in chunks twice, to count the valid rows and then straight into the memory mapped output, so the
+    conversion never holds the whole parsed dataset in memory. Headers and malformed lines are skipped. The column layout
+    of the csv is preserved.
+
+    Parameters:
+        csv_path (str): path of the csv dataset
+        store_path (str): destination of the store, defaults to the csv path with the store extension
+
+    Returns:
+        The path of the written store
+    """
+    if store_path is None: store_path = get_store_path(csv_path)
+    rows, columns = 0, 0
+    for chunk in __read_chunks(csv_path):
+        rows += len(chunk)
+        columns = chunk.shape[1]
+    # Concurrent conversions of the same dataset write their own file, the last replace wins
+    with tempfile.NamedTemporaryFile(dir = os.path.dirname(os.path.abspath(store_path)), suffix = ".tmp", delete = False) as file:
+        tmp_path = file.name
+    try:
+        store = npy_format.open_memmap(tmp_path, mode = "w+", dtype = numpy.float64, shape = (rows, columns), fortran_order = True)
+        offset = 0
+        for chunk in __read_chunks(csv_path):
+            store[offset: offset + len(chunk)] = chunk
+            offset += len(chunk)
+        store.flush()
+        del store
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return store_path
+
+
+def load(data_path: str) -> numpy.ndarray:
+    """Loads a dataset as a read only memory mapped candle matrix
+
+    If the path points to a csv, its binary store is built the first time and whenever the csv changes.
+    The returned matrix is indexed as data[candle, column], with the same columns of the csv.
+    """
+    if not os.path.exists(data_path) and not os.path.exists(get_store_path(data_path)):
+        print("Unable to find dataset " + data_path, flush = True)
+        return None
+    if is_stale(data_path):
+        print("Converting " + data_path + " to " + get_store_path(data_path) + "...", flush = True)
+        convert(data_path)
+    return numpy.load(get_store_path(data_path), mmap_mode = "r")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m core.bot.candle_store <dataset.csv> [<dataset.csv> ...]")
+        exit(1)
+    for path in sys.argv[1:]:
+        print("Converting " + path + "...", flush = True)
+        out = convert(path)
+        print("Stored " + str(numpy.load(out, mmap_mode = "r").shape) + " candles matrix in " + out, flush = True)
@@ -1,13 +1,50 @@
-from abc import abstractmethod, ABC
+class DataFrame:
+    """Numeric candle frame, producers reuse the same instance updating it in place"""
 
+    __slots__ = ("symbol", "start_time", "close_time", "open_price", "close_price", "high_price", "low_price", "is_closed")
 
-class DataFrame(ABC):
-    def __init__(self):
-        self.symbol = ''
+    def __init__(self, symbol: str = ''):
+        self.symbol = symbol
         self.start_time = 0
         self.close_time = 0
-        self.open_price = 0
-        self.close_price = 0
-        self.high_price = 0
-        self.low_price = 0
+        self.open_price = 0.0
+        self.close_price = 0.0
+        self.high_price = 0.0
+        self.low_price = 0.0
         self.is_closed = False
+
+    def update(self, start_time: int, close_time: int, open_price: float, close_price: float, high_price: float, low_price: float, is_closed: bool):
+        self.start_time = start_time
+        self.close_time = close_time
+        self.open_price = open_price
+        self.close_price = close_price
+        self.high_price = high_price
+        self.low_price = low_price
+        self.is_closed = is_closed
+
+
+if __name__ == "__main__":
+    # Benchmark of the whole backtest loop, a strategy on a random walk of 1m candles or on a dataset
+    import sys
+    import time
+
+    from core.bot import candle_store, dataset_evaluator
+    from core.bot.parity import MomentumStrategy, random_walk, INITIAL_BALANCE
+    from core.bot.wallet_handler import TestWallet
+
+    data = candle_store.load(sys.argv[1]) if len(sys.argv) > 1 else random_walk(525600)
+    strategy = MomentumStrategy(TestWallet(INITIAL_BALANCE), max_positions = 3)
+    start = time.perf_counter()
+    result = dataset_evaluator.evaluate(strategy, INITIAL_BALANCE, data, None, timeframe = 3)[0]
+    elapsed = time.perf_counter() - start
+
+    # Frame filling alone, its share of the loop
+    frame = DataFrame()
+    open_t, opens, highs, lows, closes, close_t = (data[:, c].tolist() for c in (0, 1, 2, 3, 4, 6))
+    fill_start = time.perf_counter()
+    for epoch in range(len(data)):
+        frame.update(open_t[epoch], close_t[epoch], opens[epoch], closes[epoch], highs[epoch], lows[epoch], False)
+    fill_elapsed = time.perf_counter() - fill_start
+
+    print("{:<25s}{:>12.0f} candles/s, {:d} trades".format("Backtest loop: ", len(data) / elapsed, len(result.trades)))
+    print("{:<25s}{:>12.0f} candles/s, {:.1f}% of the loop".format("Frame filling: ", len(data) / fill_elapsed, fill_elapsed * 100 / elapsed))
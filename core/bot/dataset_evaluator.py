@@ -3,20 +3,16 @@ import copy
 import numpy
 
 from core import lib
+from core.bot import trade_log
+from core.bot.candle_store import OPEN_T, OPEN, HIGH, LOW, CLOSE, CLOSE_T
 from core.bot.data_frame import DataFrame
 from core.bot.strategy import Strategy
 from core.bot.wallet_handler import TestWallet
 
-OPEN_T: int = 0
-HIGH: int = 2
-LOW: int = 3
-CLOSE: int = 4
-CLOSE_T: int = 6
-
 
 class TestResult:
     def __init__(self):
-        self.closed_positions = []
+        self.trades = trade_log.create(0)
         self.total_profit = 0
         self.days = 0
         self.win_ratio = 0
@@ -26,31 +22,51 @@ class TestResult:
         self.opened_positions = 0
         self.final_balance = 0
         self.time_frame_minutes = 0
+        self.positions_percentage = 0
+        self.max_drawdown = 0
 
     @classmethod
     def construct(cls, strategy: Strategy, initial_balance: float, minute_candles: int, time_frame_minutes: int):
+        trades = strategy.trade_log.trades.copy()
+        return cls.from_trades(initial_balance, minute_candles, time_frame_minutes, trades, len(strategy.open_positions) + len(trades))
+
+    @classmethod
+    def from_trades(cls, initial_balance: float, minute_candles: int, time_frame_minutes: int, trades: numpy.ndarray, opened_positions: int):
+        """Builds the result from the closed trades of a backtest (see trade_log), given in closing order"""
         result = TestResult()
         result.initial_balance = initial_balance
-        result.total_profit = 0
         result.minutes = minute_candles
         result.days = float(minute_candles) / 1440
         result.time_frame_minutes = time_frame_minutes
-        result.closed_positions = copy.deepcopy(strategy.closed_positions)
-        won = 0
-        for c in result.closed_positions:
-            result.total_profit += c.profit
-            if c.won: won += 1
-        result.win_ratio = 0
+        result.trades = trades
+        result.total_profit = float(numpy.sum(trades["profit"]))
+        result.positions_percentage = float(numpy.sum(trades["result_percentage"]))
         result.final_balance = result.initial_balance + result.total_profit
-        if len(strategy.closed_positions) > 0: result.win_ratio = won / len(strategy.closed_positions)
+        if len(trades) > 0: result.win_ratio = float(numpy.count_nonzero(trades["won"])) / len(trades)
         # result.estimated_apy = (((((((result.final_balance / initial_balance) - 1) * 100) / result.days) / 100) + 1) ** 365 - 1) * 100
-        result.estimated_apy = (365 / result.days) * ((result.final_balance / result.initial_balance) - 1) * 100
-        result.opened_positions = len(strategy.open_positions) + len(strategy.closed_positions)
+        # A backtest on no bars spans no time
+        result.estimated_apy = (365 / result.days) * ((result.final_balance / result.initial_balance) - 1) * 100 if result.days > 0 else 0
+        result.opened_positions = opened_positions
+        result.max_drawdown = cls.__max_drawdown(initial_balance, trades["profit"])
+        return result
+
+    @staticmethod
+    def __max_drawdown(initial_balance: float, profits) -> float:
+        """Largest drop of the balance from its previous peak, as a ratio of the peak, with the profits in closing order"""
+        if len(profits) == 0: return 0
+        balances = initial_balance + numpy.cumsum(profits, dtype = numpy.float64)
+        peaks = numpy.maximum(numpy.maximum.accumulate(balances), initial_balance)
+        return float(numpy.max((peaks - balances) / peaks))
+
+    def compact(self, trades: bool = True):
+        """Returns a copy of the result to send across processes, the trades are a single structured array, dropped if not 'trades'"""
+        result = copy.copy(self)
+        if not trades: result.trades = trade_log.create(0)
         return result
 
     def get_dict(self):
         dic = self.__dict__
-        dic.pop("closed_positions", None)
+        dic.pop("trades", None)
         return dic
 
     def __str__(self):
@@ -61,66 +77,158 @@ class TestResult:
                "\n{:<25s}{:^4.3f}".format("Total profit: ", self.total_profit) + \
                "\n{:<25s}{:^4}".format("Opened positions: ", self.opened_positions) + \
                "\n{:<25s}{:^4.3f}".format("Win rate: ", self.win_ratio * 100) + "%" + \
+               "\n{:<25s}{:^4.3f}".format("Max drawdown: ", self.max_drawdown * 100) + "%" + \
                "\n{:<25s}{:^4.3f}".format("Estimated apy: ", self.estimated_apy) + "%"
 
 
-def evaluate(strategy: Strategy, initial_balance: float, data: numpy.ndarray, progress_delegate,
-             balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0) -> [TestResult, list[float], int]:
-    epoch = 0
-    high = data[epoch, HIGH]
-    low = data[epoch, LOW]
-    start_time = 0
-    frame = DataFrame()
-    time_span = len(data)
-    balance_trend = []
-    if not isinstance(strategy.wallet_handler, TestWallet):
-        print("Unable to test the strategy, the wallet handler is not an instance of a TestWallet")
-        return None, balance_trend, index
+def __read_block(data: numpy.ndarray, start: int, end: int):
+    block = data[start: end]
+    return block[:, OPEN_T].astype(numpy.int64).tolist(), block[:, OPEN].tolist(), block[:, HIGH].tolist(), \
+        block[:, LOW].tolist(), block[:, CLOSE].tolist(), block[:, CLOSE_T].astype(numpy.int64).tolist()
 
+
+class EvaluationState:
+    """Checkpoint of a backtest paused at a segment boundary, resumed by evaluate_segment or evaluate_bars_segment"""
+
+    def __init__(self, strategy: Strategy, data: numpy.ndarray = None):
+        self.strategy = strategy
+        self.epoch = 0
+        self.balance_trend = []
+        # Frame of the timeframe being built over the 1m candles
+        self.high = self.low = self.open_price = self.start_time = None
+        if data is not None and len(data) > 0:
+            self.high = float(data[0, HIGH])
+            self.low = float(data[0, LOW])
+            self.open_price = float(data[0, OPEN])
+            self.start_time = int(data[0, OPEN_T])
+
+
+def evaluate_segment(state: EvaluationState, data: numpy.ndarray, end: int, progress_delegate = None,
+                     balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0) -> bool:
+    """Continues a backtest on the 1m candles up to the candle 'end' (excluded)
+
+    Returns:
+        False if the backtest has been interrupted
+    """
+    strategy = state.strategy
+    epoch = state.epoch
+    high, low, open_price, start_time = state.high, state.low, state.open_price, state.start_time
+    frame = DataFrame()
+    time_span = min(end, len(data) - 1)
     # Report progress each month
     progress_reporter_span = 1440 * 30
     try:
         while epoch < time_span:
-            if epoch + 1 >= len(data): break
-            frame.close_price = str(data[epoch, CLOSE])
-            frame.high_price = str(data[epoch, HIGH])
-            frame.low_price = str(data[epoch, LOW])
-            frame.start_time = str(data[epoch, OPEN_T])
-            frame.close_time = str(data[epoch, CLOSE_T])
-            frame.is_closed = False
-            if high < data[epoch, HIGH]:
-                high = data[epoch, HIGH]
-
-            if low > data[epoch, LOW]:
-                low = data[epoch, LOW]
-
-            if epoch != 0 and (epoch % timeframe) == timeframe - 1:
-                frame.is_closed = True
-                frame.high_price = str(high)
-                frame.low_price = str(low)
-                frame.start_time = start_time
-                frame.close_time = data[epoch, CLOSE_T]
-
-                # Set defaults to next candle
-                high = data[epoch + 1, 2]
-                low = data[epoch + 1, 3]
-                start_time = data[epoch + 1, 0]
-            if epoch % balance_update_interval == 0: balance_trend.append(strategy.wallet_handler.get_balance())
-            strategy.update_state(frame)
-            if epoch % progress_reporter_span == 0 and progress_delegate is not None: progress_delegate(
-                progress_reporter_span)
-            epoch += 1
+            # Candles are read as python numbers one block at a time, one more candle is read to peek the next open
+            offset = epoch
+            block_end = min(offset + progress_reporter_span, time_span)
+            open_ts, opens, highs, lows, closes, close_ts = __read_block(data, offset, block_end + 1)
+            while epoch < block_end:
+                i = epoch - offset
+                frame.update(open_ts[i], close_ts[i], opens[i], closes[i], highs[i], lows[i], False)
+                if high < highs[i]:
+                    high = highs[i]
+
+                if low > lows[i]:
+                    low = lows[i]
+
+                if epoch != 0 and (epoch % timeframe) == timeframe - 1:
+                    frame.update(start_time, close_ts[i], open_price, closes[i], high, low, True)
+
+                    # Set defaults to next candle
+                    high = highs[i + 1]
+                    low = lows[i + 1]
+                    open_price = opens[i + 1]
+                    start_time = open_ts[i + 1]
+                if epoch % balance_update_interval == 0: state.balance_trend.append(strategy.wallet_handler.get_balance())
+                strategy.update_state(frame)
+                if epoch % progress_reporter_span == 0 and progress_delegate is not None: progress_delegate(
+                    progress_reporter_span)
+                epoch += 1
     except (KeyboardInterrupt, SystemExit):
         print("\nWorker " + str(index) + " interrupted", flush=True)
+        return False
+    finally:
+        state.epoch = epoch
+        state.high, state.low, state.open_price, state.start_time = high, low, open_price, start_time
+    return True
+
+
+def evaluate(strategy: Strategy, initial_balance: float, data: numpy.ndarray, progress_delegate,
+             balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0) -> [TestResult, list[float], int]:
+    if not isinstance(strategy.wallet_handler, TestWallet):
+        print("Unable to test the strategy, the wallet handler is not an instance of a TestWallet")
+        return None, [], index
+
+    state = EvaluationState(strategy, data)
+    if not evaluate_segment(state, data, len(data), progress_delegate, balance_update_interval, timeframe, index):
         # for p in strategy.open_positions:
         #     strategy.wallet_handler.balance += p.investment
-        return None, balance_trend, index
+        return None, state.balance_trend, index
 
-    if progress_delegate is not None: progress_delegate(time_span - epoch)
+    if progress_delegate is not None: progress_delegate(len(data) - state.epoch)
 
     # for p in strategy.open_positions:
     #   strategy.wallet_handler.balance += p.investment
 
-    balance_trend.append(strategy.wallet_handler.get_balance())
+    state.balance_trend.append(strategy.wallet_handler.get_balance())
     res = TestResult.construct(strategy, initial_balance, len(data), timeframe)
-    return res, balance_trend, index
+    return res, state.balance_trend, index
+
+
+def evaluate_bars_segment(state: EvaluationState, bars: numpy.ndarray, end: int, progress_delegate = None,
+                          balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0) -> bool:
+    """Continues a backtest on the closed bars up to the bar 'end' (excluded)
+
+    Returns:
+        False if the backtest has been interrupted
+    """
+    strategy = state.strategy
+    epoch = state.epoch
+    frame = DataFrame()
+    time_span = min(end, len(bars))
+    balance_update_bars = max(1, balance_update_interval // timeframe)
+    # Report progress each month
+    progress_reporter_span = max(1, (1440 * 30) // timeframe)
+    try:
+        while epoch < time_span:
+            offset = epoch
+            block_end = min(offset + progress_reporter_span, time_span)
+            open_ts, opens, highs, lows, closes, close_ts = __read_block(bars, offset, block_end)
+            while epoch < block_end:
+                i = epoch - offset
+                frame.update(open_ts[i], close_ts[i], opens[i], closes[i], highs[i], lows[i], True)
+                if epoch % balance_update_bars == 0: state.balance_trend.append(strategy.wallet_handler.get_balance())
+                strategy.update_state(frame)
+                epoch += 1
+            if progress_delegate is not None: progress_delegate(block_end - offset)
+    except (KeyboardInterrupt, SystemExit):
+        print("\nWorker " + str(index) + " interrupted", flush=True)
+        return False
+    finally:
+        state.epoch = epoch
+    return True
+
+
+def evaluate_bars(strategy: Strategy, initial_balance: float, bars: numpy.ndarray, progress_delegate,
+                  balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0) -> [TestResult, list[float], int]:
+    """Evaluates the strategy only on the closed bars of its timeframe (see bar_pyramid), checking the exits once per bar"""
+    if not isinstance(strategy.wallet_handler, TestWallet):
+        print("Unable to test the strategy, the wallet handler is not an instance of a TestWallet")
+        return None, [], index
+    if len(bars) == 0:
+        return TestResult.construct(strategy, initial_balance, 0, timeframe), [], index
+
+    state = EvaluationState(strategy)
+    if not evaluate_bars_segment(state, bars, len(bars), progress_delegate, balance_update_interval, timeframe, index):
+        return None, state.balance_trend, index
+
+    state.balance_trend.append(strategy.wallet_handler.get_balance())
+    res = TestResult.construct(strategy, initial_balance, get_bars_minutes(bars, len(bars)), timeframe)
+    return res, state.balance_trend, index
+
+
+def get_bars_minutes(bars: numpy.ndarray, end: int) -> int:
+    """Minutes spanned by the first 'end' bars"""
+    if end <= 0: return 0
+    return int(round((bars[end - 1, CLOSE_T] + 1 - bars[0, OPEN_T]) / 60000))
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+import numpy
+
+MEGABYTE = 1024 * 1024
+
+
+def get_size(value) -> int:
+    """Bytes of the arrays contained in an indicator value (array, tuple, list or dict of them)"""
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(get_size(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(get_size(v) for v in value)
+    return 0
+
+
+class IndicatorCache:
+    """LRU cache of full indicator series, bounded by the bytes of the cached arrays
+
+    Keys identify the series, as (dataset id, timeframe, strategy class, indicators key) in the vectorized engine. The
+    least recently used series are evicted when the budget is exceeded, a series larger than the budget is never cached.
+    """
+
+    def __init__(self, budget: int = 256 * MEGABYTE):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    def get(self, key, compute):
+        """Returns the cached series of the key, computing it with 'compute()' if missing"""
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        value = compute()
+        size = get_size(value)
+        if self.budget is not None and size > self.budget:
+            return value
+        self.__entries[key] = (value, size)
+        self.size += size
+        while self.budget is not None and self.size > self.budget:
+            evicted, (evicted_value, evicted_size) = self.__entries.popitem(last = False)
+            self.size -= evicted_size
+        return value
+
+    def clear(self):
+        self.__entries.clear()
+        self.size = 0
+
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
@@ -0,0 +1,133 @@
+import math
+import operator
+
+from core.bot.data_frame import DataFrame
+
+SOURCES = {"open": "open_price", "high": "high_price", "low": "low_price", "close": "close_price"}
+# Frames a node may lag behind its inputs before the whole graph is brought up to date
+MAX_PENDING = 4096
+
+
+class IndicatorNode:
+    """Output of an indicator in the graph, computed lazily when read by feeding it all the frames it skipped"""
+
+    def __init__(self, graph, key: tuple, inputs: list, step = None):
+        self.graph = graph
+        self.key = key
+        self.inputs = inputs
+        self.consumers = []
+        self.__step = step
+        self.__outputs = []
+        # Frame index of the first buffered output
+        self.__offset = 0
+        for node in inputs:
+            node.consumers.append(self)
+
+    @property
+    def computed(self) -> int:
+        """Number of frames the node has computed"""
+        return self.__offset + len(self.__outputs)
+
+    def push(self, value):
+        self.__outputs.append(value)
+
+    def at(self, index: int):
+        return self.__outputs[index - self.__offset]
+
+    def update(self):
+        target = self.graph.frames
+        if self.__step is None or self.computed == target: return
+        for node in self.inputs:
+            node.update()
+        step = self.__step
+        if len(self.inputs) == 1:
+            source = self.inputs[0]
+            for index in range(self.computed, target):
+                self.__outputs.append(step(source.at(index)))
+        else:
+            for index in range(self.computed, target):
+                self.__outputs.append(step(*[node.at(index) for node in self.inputs]))
+        for node in self.inputs:
+            node.trim()
+        self.trim()
+
+    def trim(self):
+        """Drops the outputs consumed by all the consumers, keeping the last ones to read"""
+        keep_from = self.computed - self.graph.depth
+        for node in self.consumers:
+            keep_from = min(keep_from, node.computed)
+        if keep_from > self.__offset:
+            del self.__outputs[:keep_from - self.__offset]
+            self.__offset = keep_from
+        # A consumer never read would retain the outputs forever
+        if len(self.__outputs) > MAX_PENDING:
+            self.graph.update()
+
+    def value(self, shift: int = 0):
+        """Returns the output on the current frame, or on 'shift' frames before (less than the depth of the graph)"""
+        self.update()
+        if shift >= len(self.__outputs): return math.nan
+        return self.__outputs[-1 - shift]
+
+
+class IndicatorGraph:
+    """Registry of the indicators of a strategy, identical (indicator, parameters, inputs) nodes are created once"""
+
+    def __init__(self, depth: int = 2):
+        self.depth = depth
+        self.frames = 0
+        self.__nodes = {}
+        self.__sources = []
+
+    def source(self, name: str) -> IndicatorNode:
+        """Returns the node of a price of the frames: open, high, low or close"""
+        if name not in SOURCES:
+            print("Unknown source " + name + ", available sources: " + str(list(SOURCES.keys())))
+            return None
+        key = ("source", name)
+        node = self.__nodes.get(key)
+        if node is None:
+            node = IndicatorNode(self, key, [])
+            self.__nodes[key] = node
+            self.__sources.append((SOURCES[name], node))
+        return node
+
+    def indicator(self, indicator_class: type, *inputs: IndicatorNode, method: str = "compute_next", **params) -> IndicatorNode:
+        """Returns the node of an indicator, creating it only if no identical node exists
+
+        Parameters:
+            indicator_class (type): streaming indicator, instanced with the params
+            inputs (IndicatorNode): nodes whose outputs are passed, in order, to the method at each frame
+            method (str): streaming method of the indicator
+        """
+        key = (indicator_class, method, tuple(sorted(params.items())), tuple(node.key for node in inputs))
+        node = self.__nodes.get(key)
+        if node is None:
+            node = IndicatorNode(self, key, list(inputs), getattr(indicator_class(**params), method))
+            self.__nodes[key] = node
+        return node
+
+    def element(self, node: IndicatorNode, index: int) -> IndicatorNode:
+        """Returns the node of an element of a tuple output, as the k line of a STOCH"""
+        key = ("element", index, node.key)
+        element = self.__nodes.get(key)
+        if element is None:
+            # An item getter, unlike a lambda, can be pickled
+            element = IndicatorNode(self, key, [node], operator.itemgetter(index))
+            self.__nodes[key] = element
+        return element
+
+    def tick(self, frame: DataFrame):
+        for attribute, node in self.__sources:
+            node.push(getattr(frame, attribute))
+        self.frames += 1
+        for attribute, node in self.__sources:
+            node.trim()
+
+    def update(self):
+        """Brings all the nodes up to date"""
+        for node in self.__nodes.values():
+            node.update()
+
+    def __len__(self):
+        return len(self.__nodes)
@@ -0,0 +1,149 @@
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+
+import numpy
+
+import config
+from core import lib
+
+STORE_SUFFIX = ".indicators"
+HASH_SUFFIX = ".hash"
+HASH_CHUNK_BYTES = 1 << 20
+TUPLE_MARKER = ".tuple"
+
+
+def get_store_root(data_path: str) -> str:
+    return os.path.splitext(data_path)[0] + STORE_SUFFIX
+
+
+def get_dataset_hash(data_path: str) -> str:
+    """Returns the sha1 of the content of a dataset
+
+    The hash is saved next to the dataset together with its size and modification time, the file is hashed again only when
+    one of them changes.
+    """
+    stat = os.stat(data_path)
+    signature = str(stat.st_size) + " " + str(stat.st_mtime_ns)
+    hash_path = os.path.splitext(data_path)[0] + HASH_SUFFIX
+    if os.path.exists(hash_path):
+        with open(hash_path, "r") as file:
+            cached = file.read().split()
+        if len(cached) == 3 and " ".join(cached[:2]) == signature:
+            return cached[2]
+
+    digest = hashlib.sha1()
+    with open(data_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    dataset_hash = digest.hexdigest()
+    with open(hash_path, "w") as file:
+        file.write(signature + " " + dataset_hash)
+    return dataset_hash
+
+
+class IndicatorStore:
+    """Indicator series of a dataset saved next to it, reused across processes and runs
+
+    Series are stored as memory mapped .npy files under <dataset>.indicators/<content hash>/<timeframe>/, one folder for
+    each strategy class and indicators key. A dataset whose content changes gets a new hash, the series of the old
+    content are removed at the first write. Only picklable paths are kept, so the store can be sent to the workers.
+    """
+
+    def __init__(self, data_path: str, timeframe: int):
+        self.data_path = data_path
+        self.timeframe = timeframe
+        self.dataset_hash = get_dataset_hash(data_path)
+        self.root = get_store_root(data_path)
+
+    def get_folder(self, strategy_class: type, indicators_key) -> str:
+        key_digest = hashlib.sha1(repr(indicators_key).encode()).hexdigest()[:16]
+        timeframe_flag = lib.get_flag_from_minutes(self.timeframe)
+        if timeframe_flag is None: timeframe_flag = str(self.timeframe) + "m"
+        return os.path.join(self.root, self.dataset_hash, timeframe_flag, strategy_class.__name__ + "-" + key_digest)
+
+    def get(self, strategy_class: type, indicators_key, compute) -> dict[str, any]:
+        """Returns the stored indicators, computing them with 'compute()' and storing them if missing"""
+        folder = self.get_folder(strategy_class, indicators_key)
+        if os.path.isdir(folder):
+            return self.__load(folder)
+
+        indicators = compute()
+        self.__remove_stale()
+        # Written aside and renamed, concurrent workers never read a partial folder
+        tmp_folder = folder + ".tmp" + str(os.getpid())
+        os.makedirs(tmp_folder, exist_ok = True)
+        if not self.__save(tmp_folder, indicators):
+            shutil.rmtree(tmp_folder, ignore_errors = True)
+            return indicators
+        try:
+            os.rename(tmp_folder, folder)
+        except OSError:
+            # Another process stored the same indicators first
+            shutil.rmtree(tmp_folder, ignore_errors = True)
+        return indicators
+
+    @staticmethod
+    def __save(folder: str, indicators: dict[str, any]) -> bool:
+        for name, value in indicators.items():
+            if isinstance(value, numpy.ndarray):
+                numpy.save(os.path.join(folder, name + ".npy"), value)
+            elif isinstance(value, tuple) and all(isinstance(v, numpy.ndarray) for v in value):
+                numpy.save(os.path.join(folder, name + TUPLE_MARKER + ".npy"), numpy.stack(value))
+            else:
+                return False
+        return True
+
+    @staticmethod
+    def __load(folder: str) -> dict[str, any]:
+        indicators = {}
+        for file_name in os.listdir(folder):
+            array = numpy.load(os.path.join(folder, file_name), mmap_mode = "r")
+            name = file_name[:-len(".npy")]
+            if name.endswith(TUPLE_MARKER):
+                indicators[name[:-len(TUPLE_MARKER)]] = tuple(array[i] for i in range(len(array)))
+            else:
+                indicators[name] = array
+        return indicators
+
+    def __remove_stale(self):
+        if not os.path.isdir(self.root): return
+        for entry in os.listdir(self.root):
+            if entry != self.dataset_hash:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors = True)
+
+
+def prebuild(data_path: str, options_path: str) -> str:
+    """Stores the indicators of the strategy of an options file (train or evaluate format) on a dataset"""
+    from core.bot import bar_pyramid
+    from core.bot.vector_evaluator import VectorizedStrategy
+    from core.bot.wallet_handler import TestWallet
+
+    with open(options_path) as file:
+        options = json.load(file)
+    strategy_name = options["strategy"]
+    timeframe = lib.get_minutes_from_flag(options["timeframe"])
+    strategy_class = getattr(importlib.import_module(config.DEFAULT_STRATEGIES_FOLDER + "." + strategy_name), strategy_name)
+    if not issubclass(strategy_class, VectorizedStrategy):
+        print(strategy_name + " is not a VectorizedStrategy, no indicators to store")
+        return None
+    # Parameters of evaluation files have a value, the ones of training files are taken at the middle of their bounds
+    params = dict([(p["name"], p["_value"] if p.get("_value") is not None else (p["lower_bound"] + p["upper_bound"]) / 2) for p in options["parameters"]])
+    strategy = strategy_class(TestWallet.factory(0), **params)
+    bars = bar_pyramid.load_bars(data_path, timeframe)
+    if bars is None: return None
+    store = IndicatorStore(data_path, timeframe)
+    store.get(strategy_class, strategy.get_indicators_key(), lambda: strategy.compute_bar_indicators(bars))
+    return store.get_folder(strategy_class, strategy.get_indicators_key())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m core.bot.indicator_store <dataset> <options file> [<options file> ...]")
+        exit(1)
+    for path in sys.argv[2:]:
+        folder = prebuild(sys.argv[1], path)
+        if folder is not None: print(path + " -> " + folder, flush = True)
@@ -37,20 +37,15 @@ class MiddleWare(ABC):
 class BinanceMiddleWare(MiddleWare):
     def __init__(self, callback, symbol, granularity):
         super().__init__(callback, symbol, granularity)
+        self.frame = DataFrame(symbol)
         self.twm = ThreadedWebsocketManager(api_key=config.API_KEY, api_secret=config.API_SECRET)
         self.twm.start()
         self.twm.start_kline_socket(callback=self.update, symbol=self.symbol)
 
     def convert(self, message) -> DataFrame:
-        frame = DataFrame()
-        frame.start_time = message["k"]["t"]
-        frame.close_time = message["k"]["T"]
-        frame.open_price = message["k"]["o"]
-        frame.close_price = message["k"]["c"]
-        frame.high_price = message["k"]["h"]
-        frame.low_price = message["k"]["l"]
-        frame.is_closed = message["k"]["x"]
-        return frame
+        kline = message["k"]
+        self.frame.update(int(kline["t"]), int(kline["T"]), float(kline["o"]), float(kline["c"]), float(kline["h"]), float(kline["l"]), bool(kline["x"]))
+        return self.frame
 
     def update(self, message):
         self.callback(self.convert(message))
@@ -63,7 +58,7 @@ class KucoinMiddleWare(MiddleWare):
 
     def __init__(self, callback, symbol, granularity):
         super().__init__(callback, symbol, granularity)
-        self.passed_frame = DataFrame()
+        self.frame = DataFrame(symbol)
         self.unsubscribe = True
         self.kucoin_data = KucoinData('key', 'secret', 'apiName')
         threading.Thread(target=self.subscribe).start()
@@ -74,16 +69,10 @@ class KucoinMiddleWare(MiddleWare):
             time.sleep(int(self.granularity) * 60)
 
     def convert(self, message) -> DataFrame:
-        frame = DataFrame()
-        frame.symbol = self.symbol
-        frame.start_time = message[198][0]
-        frame.close_time = message[198][0] + (int(self.granularity) * 60000)
-        frame.open_price = message[198][1]
-        frame.close_price = message[198][4]
-        frame.high_price = message[198][2]
-        frame.low_price = message[198][3]
-        frame.is_closed = True
-        return frame
+        candle = message[198]
+        start_time = int(candle[0])
+        self.frame.update(start_time, start_time + (int(self.granularity) * 60000), float(candle[1]), float(candle[4]), float(candle[2]), float(candle[3]), True)
+        return self.frame
 
     def stop(self):
         self.unsubscribe = False
@@ -0,0 +1,155 @@
+import sys
+
+import numpy
+
+from core.bot import bar_pyramid, dataset_evaluator, vector_evaluator
+from core.bot.candle_store import OPEN, CLOSE
+from core.bot.condition import PerpetualStrategyCondition
+from core.bot.strategy import *
+from core.bot.vector_evaluator import VectorizedStrategy
+
+INITIAL_BALANCE = 1000
+TOLERANCE = 1e-9
+
+
+class MomentumStrategy(Strategy, VectorizedStrategy):
+    """Fixture strategy with perpetual conditions, long on the closed bars that close above their open and short below"""
+
+    def __init__(self, wallet_handler: WalletHandler, take_profit_ratio: float = 0.02, stop_loss_ratio: float = 0.02, investment_ratio: float = 0.5,
+                 max_positions: int = 1):
+        self.take_profit_ratio = take_profit_ratio
+        self.stop_loss_ratio = stop_loss_ratio
+        self.investment_ratio = investment_ratio
+        super().__init__(wallet_handler, max_positions)
+
+    def compute_indicators_step(self, frame):
+        pass
+
+    def get_leverage(self) -> float:
+        return 1
+
+    def get_margin_investment(self):
+        return self.wallet_handler.get_balance() * self.investment_ratio
+
+    def get_stop_loss(self, symbol: str, open_price: float, position_type: PositionType) -> float:
+        return open_price * (1 - self.stop_loss_ratio) if position_type == PositionType.LONG else open_price * (1 + self.stop_loss_ratio)
+
+    def get_take_profit(self, symbol: str, open_price: float, position_type: PositionType) -> float:
+        return open_price * (1 + self.take_profit_ratio) if position_type == PositionType.LONG else open_price * (1 - self.take_profit_ratio)
+
+    def get_long_conditions(self) -> List[StrategyCondition]:
+        return [PerpetualStrategyCondition(lambda frame: frame.is_closed and frame.close_price > frame.open_price)]
+
+    def get_short_conditions(self) -> List[StrategyCondition]:
+        return [PerpetualStrategyCondition(lambda frame: frame.is_closed and frame.close_price < frame.open_price)]
+
+    def compute_bar_indicators(self, bars: numpy.ndarray) -> dict[str, any]:
+        return {}
+
+    def compute_signals(self, bars: numpy.ndarray, indicators: dict[str, any]) -> [list[vector_evaluator.ConditionSignal], list[vector_evaluator.ConditionSignal]]:
+        return [vector_evaluator.PerpetualSignal(bars[:, CLOSE] > bars[:, OPEN])], [vector_evaluator.PerpetualSignal(bars[:, CLOSE] < bars[:, OPEN])]
+
+    def get_exit_levels(self, open_prices: numpy.ndarray, entry_indexes: numpy.ndarray, position_type: PositionType) -> [numpy.ndarray, numpy.ndarray]:
+        return self.get_take_profit("", open_prices, position_type), self.get_stop_loss("", open_prices, position_type)
+
+    def get_investment_ratio(self) -> float:
+        return self.investment_ratio
+
+
+def make_bars(prices: list[tuple[float, float, float, float]], timeframe: int = 3) -> numpy.ndarray:
+    """Returns closed bars of the timeframe from (open, high, low, close) tuples"""
+    bars = numpy.zeros((len(prices), 7))
+    for i, (open_price, high, low, close) in enumerate(prices):
+        bars[i] = (i * timeframe * 60000, open_price, high, low, close, 0, (i + 1) * timeframe * 60000 - 1)
+    return bars
+
+
+def random_walk(length: int = 30000, seed: int = 0) -> numpy.ndarray:
+    """Returns 1m candles of a random walk"""
+    generator = numpy.random.default_rng(seed)
+    closes = 2000 + numpy.cumsum(generator.normal(0, 1, length))
+    opens = numpy.concatenate(([2000], closes[:-1]))
+    spreads = numpy.abs(generator.normal(0, 0.8, (2, length)))
+    candles = numpy.zeros((length, 7))
+    candles[:, 0] = numpy.arange(length) * 60000
+    candles[:, 1] = opens
+    candles[:, 2] = numpy.maximum(opens, closes) + spreads[0]
+    candles[:, 3] = numpy.minimum(opens, closes) - spreads[1]
+    candles[:, 4] = closes
+    candles[:, 6] = candles[:, 0] + 59999
+    return candles
+
+
+def check_winning_trade() -> bool:
+    """Backtests a long opened at 101 that reaches its take profit on the next bar, the trade has to earn 2% of its investment"""
+    strategy, result = __backtest_winning_trade()
+    if result is None or len(result.trades) != 1: return False
+    trade = result.trades[0]
+    expected = INITIAL_BALANCE * strategy.investment_ratio * strategy.take_profit_ratio
+    return bool(trade["won"]) and abs(trade["profit"] - expected) <= TOLERANCE * expected and abs(result.total_profit - expected) <= TOLERANCE * expected
+
+
+def check_wallet_refund() -> bool:
+    """The test wallet has to get back the investment and the profit of the closed trade"""
+    strategy, result = __backtest_winning_trade()
+    if result is None: return False
+    return abs(strategy.wallet_handler.get_balance() - result.final_balance) <= TOLERANCE * INITIAL_BALANCE
+
+
+def __backtest_winning_trade() -> tuple[MomentumStrategy, dataset_evaluator.TestResult]:
+    bars = make_bars([(100, 101.5, 99.5, 101), (101, 104, 100.5, 101)])
+    strategy = MomentumStrategy(TestWallet(INITIAL_BALANCE))
+    result, balance_trend, index = dataset_evaluator.evaluate_bars(strategy, INITIAL_BALANCE, bars, None)
+    return strategy, result
+
+
+def create_stoch_rsi_macd(wallet_handler: WalletHandler) -> Strategy:
+    """Returns a StochRsiMacdStrategy, its bounded and event conditions are reset at each opening"""
+    from strategies.StochRsiMacdStrategy import StochRsiMacdStrategy
+    return StochRsiMacdStrategy(wallet_handler, risk_reward_ratio = 2, atr_factor = 2, intervals_tolerance = 4.6, investment_ratio = 0.1,
+                                stoch_overbought = 65, stoch_oversold = 35)
+
+
+def check_engines(closed_bars: bool, create_strategy = None, timeframe: int = 3) -> bool:
+    """Backtests a strategy (the fixture one with 3 positions if not provided) on a random walk with the event and the
+    vectorized engines, the trades and the final balances have to match"""
+    if create_strategy is None: create_strategy = lambda wallet_handler: MomentumStrategy(wallet_handler, max_positions = 3)
+    data = random_walk()
+    # The event engine never reads the last candle, the vectorized one is given the same candles
+    bars = bar_pyramid.resample(data[:-1], timeframe)
+    events = create_strategy(TestWallet(INITIAL_BALANCE))
+    vectorized = create_strategy(TestWallet(INITIAL_BALANCE))
+    if closed_bars:
+        expected = dataset_evaluator.evaluate_bars(events, INITIAL_BALANCE, bars, None, timeframe = timeframe)[0]
+        actual = vector_evaluator.evaluate(vectorized, INITIAL_BALANCE, bars, timeframe)[0]
+    else:
+        expected = dataset_evaluator.evaluate(events, INITIAL_BALANCE, data, None, timeframe = timeframe)[0]
+        actual = vector_evaluator.evaluate(vectorized, INITIAL_BALANCE, bars, timeframe, data[:-1])[0]
+    if expected is None or actual is None or len(expected.trades) == 0 or len(expected.trades) != len(actual.trades): return False
+    for field in expected.trades.dtype.names:
+        if not numpy.allclose(expected.trades[field], actual.trades[field], rtol = TOLERANCE, atol = 0): return False
+    return expected.opened_positions == actual.opened_positions and \
+        abs(events.wallet_handler.get_balance() - vectorized.wallet_handler.get_balance()) <= TOLERANCE * INITIAL_BALANCE
+
+
+CHECKS = {"winning trade": check_winning_trade, "wallet refund": check_wallet_refund,
+          "closed bars": lambda: check_engines(True), "1m candles": lambda: check_engines(False),
+          "stoch rsi macd bars": lambda: check_engines(True, create_stoch_rsi_macd)}
+
+
+def run(names: list[str] = None) -> bool:
+    """Prints the outcome of the checks, returns whether all of them pass"""
+    if names is None: names = list(CHECKS.keys())
+    all_pass = True
+    for name in names:
+        passed = CHECKS[name]()
+        all_pass = all_pass and passed
+        print("{:<20s}{:s}".format(name, "ok" if passed else "FAIL"), flush = True)
+    return all_pass
+
+
+if __name__ == "__main__":
+    if "-h" in sys.argv:
+        print("Usage: python -m core.bot.parity")
+        exit(0)
+    exit(0 if run() else 1)
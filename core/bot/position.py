@@ -41,6 +41,8 @@ class Position(ABC):
         self.won = False
         self.profit = 0
         self.open_date = open_date
+        # Start time of the frame that opened the position, in ms
+        self.open_time = 0
         self.open_price = open_price
         self.take_profit = take_profit
         self.stop_loss = stop_loss
@@ -75,6 +77,37 @@ class Position(ABC):
 
         return self.closed
 
+    def should_close_in_range(self, low: float, high: float) -> bool:
+        """Return if the price range of a candle touches the take profit or the stop loss, the take profit is checked first"""
+
+        if self.pos_type == PositionType.LONG:
+            if high >= self.take_profit:
+                self.closed = True
+                self.won = True
+
+            elif low <= self.stop_loss:
+                self.closed = True
+                self.won = False
+
+        elif self.pos_type == PositionType.SHORT:
+            if low <= self.take_profit:
+                self.closed = True
+                self.won = True
+
+            elif high >= self.stop_loss:
+                self.closed = True
+                self.won = False
+
+        return self.closed
+
+    def settle(self, close_price: float):
+        """Sets the result percentage and the profit of the position closed at 'close_price'"""
+        if self.pos_type == PositionType.LONG:
+            self.result_percentage = ((close_price / self.open_price) - 1) * 100
+        elif self.pos_type == PositionType.SHORT:
+            self.result_percentage = ((self.open_price / close_price) - 1) * 100
+        self.profit = self.investment * (self.result_percentage / 100)
+
 
     def __str__(self):
         if self.closed:
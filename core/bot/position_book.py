@@ -0,0 +1,86 @@
+import heapq
+import math
+
+from core.bot.position import Position, PositionType
+
+
+class _SymbolBook:
+
+    def __init__(self):
+        # Min heaps of (key, sequence, position), keys are negated for the levels that are reached from above
+        self.long_take_profits = []
+        self.long_stop_losses = []
+        self.short_take_profits = []
+        self.short_stop_losses = []
+
+    def heaps(self) -> list[list]:
+        return [self.long_take_profits, self.long_stop_losses, self.short_take_profits, self.short_stop_losses]
+
+    def size(self) -> int:
+        return sum(len(h) for h in self.heaps())
+
+    def compact(self):
+        """Drops the entries of the positions already closed through the other heap"""
+        for heap in self.heaps():
+            heap[:] = [entry for entry in heap if not entry[2].closed]
+            heapq.heapify(heap)
+
+
+class PositionBook:
+    """Open positions of a strategy keyed by symbol, their levels in heaps so that each candle pops only the reached positions"""
+
+    def __init__(self):
+        self.__books = {}
+        self.__positions = {}
+        self.__sequence = 0
+
+    def add(self, position: Position):
+        book = self.__books.get(position.currency)
+        if book is None:
+            book = _SymbolBook()
+            self.__books[position.currency] = book
+        sequence = self.__sequence
+        self.__sequence += 1
+        self.__positions[sequence] = position
+        # A non-finite level is never reached and a nan key would break the heap order, it is not pushed
+        if position.pos_type == PositionType.LONG:
+            self.__push(book.long_take_profits, position.take_profit, sequence, position)
+            self.__push(book.long_stop_losses, -position.stop_loss, sequence, position)
+        else:
+            self.__push(book.short_take_profits, -position.take_profit, sequence, position)
+            self.__push(book.short_stop_losses, position.stop_loss, sequence, position)
+
+    @staticmethod
+    def __push(heap: list, key: float, sequence: int, position: Position):
+        if math.isfinite(key): heapq.heappush(heap, (key, sequence, position))
+
+    @staticmethod
+    def __pop_reached(heap: list, bound: float, triggered: dict):
+        while len(heap) > 0 and heap[0][0] <= bound:
+            key, sequence, position = heapq.heappop(heap)
+            if not position.closed: triggered[sequence] = position
+
+    def close_triggered(self, symbol: str, low: float, high: float) -> list[Position]:
+        """Closes and returns, in opening order, the positions of the symbol whose take profit or stop loss is in the candle range"""
+        book = self.__books.get(symbol)
+        if book is None: return []
+        triggered = {}
+        self.__pop_reached(book.long_take_profits, high, triggered)
+        self.__pop_reached(book.long_stop_losses, -low, triggered)
+        self.__pop_reached(book.short_take_profits, -low, triggered)
+        self.__pop_reached(book.short_stop_losses, high, triggered)
+        closed = []
+        for sequence in sorted(triggered):
+            position = triggered[sequence]
+            position.should_close_in_range(low, high)
+            del self.__positions[sequence]
+            closed.append(position)
+        # Each open position has two entries, compact when stale entries dominate
+        if book.size() > 4 * len(self.__positions) + 64: book.compact()
+        return closed
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def __iter__(self):
+        return iter(list(self.__positions.values()))
@@ -0,0 +1,38 @@
+import numpy
+
+OPENS = 0
+HIGHS = 1
+LOWS = 2
+CLOSES = 3
+
+
+class PriceHistory:
+    """Preallocated OHLC history of the last 'length' closed frames
+
+    Each value is written twice, at its slot and 'length' slots later, in a buffer of double length. The last values are
+    therefore always a contiguous slice that talib reads without copies. Views are overwritten as the history rolls,
+    they are valid until the next append.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.__buffer = numpy.zeros((4, 2 * length), dtype = numpy.float64)
+        self.__slot = -1
+        self.__count = 0
+        self.__start = length
+        self.__end = length
+
+    def append(self, open_price: float, high_price: float, low_price: float, close_price: float):
+        self.__slot = (self.__slot + 1) % self.length
+        values = (open_price, high_price, low_price, close_price)
+        self.__buffer[:, self.__slot] = values
+        self.__buffer[:, self.__slot + self.length] = values
+        if self.__count < self.length: self.__count += 1
+        self.__end = self.__slot + 1 + self.length
+        self.__start = self.__end - self.__count
+
+    def view(self, series: int) -> numpy.ndarray:
+        return self.__buffer[series, self.__start:self.__end]
+
+    def __len__(self):
+        return self.__count
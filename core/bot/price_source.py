@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+from abc import abstractmethod, ABC
+
+from CexLib.Kucoin.KucoinData import KucoinData
+from core.bot.data_frame import DataFrame
+
+
+class PriceSource(ABC):
+    """Provides the mark price at which a strategy opens its positions"""
+
+    @abstractmethod
+    def get_mark_price(self, frame: DataFrame) -> float:
+        pass
+
+
+class FramePriceSource(PriceSource):
+    """Simulated mark price for backtests, the close of the current frame. Never hits the network"""
+
+    def get_mark_price(self, frame: DataFrame) -> float:
+        return frame.close_price
+
+
+class CachedMarkPriceSource(PriceSource):
+    """Live mark price of the exchange, requested at most once every 'refresh_interval' seconds per symbol"""
+
+    def __init__(self, data: KucoinData = None, refresh_interval: float = 5):
+        if data is None:
+            data = KucoinData(os.environ.get('FK_KEY'), os.environ.get('FK_SECRET'), os.environ.get('FK_PASS'))
+        self.data = data
+        self.refresh_interval = refresh_interval
+        self.__prices = {}
+        self.__lock = threading.Lock()
+
+    def get_mark_price(self, frame: DataFrame) -> float:
+        now = time.time()
+        with self.__lock:
+            cached = self.__prices.get(frame.symbol)
+            if cached is None or now - cached[0] >= self.refresh_interval:
+                mark_price = self.data.get_current_mark_price(frame.symbol)
+                cached = (now, float(mark_price["value"]))
+                self.__prices[frame.symbol] = cached
+            return cached[1]
+
+    def invalidate(self, symbol: str = None):
+        with self.__lock:
+            if symbol is None:
+                self.__prices.clear()
+            else:
+                self.__prices.pop(symbol, None)
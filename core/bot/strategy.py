@@ -1,33 +1,54 @@
 import datetime
+import math
 import os
 import time
 from abc import abstractmethod, ABC
 from typing import List
 import time
-from CexLib.Kucoin.KucoinData import KucoinData
 from core.bot.condition import StrategyCondition
+from core.bot.indicator_graph import IndicatorGraph
 
 from core.bot.middle_ware import DataFrame
 
 from core.bot.position import PositionType, Position, OrderType, KucoinPosition
+from core.bot.position_book import PositionBook
+from core.bot.price_history import PriceHistory, OPENS, HIGHS, LOWS, CLOSES
+from core.bot.price_source import PriceSource, FramePriceSource, CachedMarkPriceSource
+from core.bot.trade_log import TradeLog, LONG, SHORT
 
 from core.bot.wallet_handler import WalletHandler, TestWallet
 
 
+# Bars of history kept for each period of the longest indicator, enough for the EMA based ones to converge
+HISTORY_PERIODS = 5
+
+
 class Strategy(ABC):
 
     #condizioni in base alle quali entriamo o usciamo da una posizione
 
-    def __init__(self, wallet_handler: WalletHandler, max_positions: int):
+    def __init__(self, wallet_handler: WalletHandler, max_positions: int, price_source: PriceSource = None, longest_period: int = 100):
         self.max_positions = max_positions
-        self.open_positions = []
+        self.open_positions = PositionBook()
+        # Backtests record only the trades of the closed positions, live strategies also keep the positions
+        self.trade_log = TradeLog()
         self.closed_positions = []
+        self.__keep_positions = not isinstance(wallet_handler, TestWallet)
         self.__long_conditions = self.get_long_conditions()
         self.__short_conditions = self.get_short_conditions()
-        self.__longest_period = 500
+        self.__longest_period = longest_period
+        # Strategies computing talib indicators read them over a fixed window of the closed frames
+        self.history = PriceHistory(HISTORY_PERIODS * longest_period)
+        self.indicators = {}
+        # Streaming indicators shared by the conditions, computed only when read
+        self.graph = IndicatorGraph()
+        self.__uses_history = type(self).compute_indicators is not Strategy.compute_indicators
         self.wallet_handler = wallet_handler
         self.balance_trend = []
-        self.data = KucoinData(os.environ.get('FK_KEY'), os.environ.get('FK_SECRET'), os.environ.get('FK_PASS'))
+        # Backtests use the simulated price of the frame, live strategies a cached exchange feed
+        if price_source is None:
+            price_source = FramePriceSource() if isinstance(wallet_handler, TestWallet) else CachedMarkPriceSource()
+        self.price_source = price_source
 
     @abstractmethod
     def get_stop_loss(self, symbol: str, open_price: float, position_type: PositionType) -> float:
@@ -58,6 +79,29 @@ class Strategy(ABC):
     def get_short_conditions(self) -> List[StrategyCondition]:
         pass
 
+    def compute_indicators(self) -> list[tuple[str, any]]:
+        """Returns the (name, value) pairs of the indicators over the price history, computed at each closed frame"""
+        return []
+
+    def get_indicator(self, name: str):
+        return self.indicators[name]
+
+    @property
+    def opens(self):
+        return self.history.view(OPENS)
+
+    @property
+    def highs(self):
+        return self.history.view(HIGHS)
+
+    @property
+    def lows(self):
+        return self.history.view(LOWS)
+
+    @property
+    def closes(self):
+        return self.history.view(CLOSES)
+
     @staticmethod
     def __check_conditions(conditions: List[StrategyCondition]) -> bool:
         for c in conditions:
@@ -65,26 +109,41 @@ class Strategy(ABC):
                 return False
         return True
 
+    def __has_exit_levels(self, symbol: str, market_price: float, position_type: PositionType) -> bool:
+        """Checks if the take profit and the stop loss are defined, they are not while the indicators warm up"""
+        return math.isfinite(self.get_take_profit(symbol, market_price, position_type)) and math.isfinite(self.get_stop_loss(symbol, market_price, position_type))
+
     @staticmethod
     def __reset_conditions(conditions):
         for c in conditions:
             c.reset()
 
+    def __record(self, position: Position, close_time: int):
+        close_price = position.take_profit if position.won else position.stop_loss
+        position.settle(close_price)
+        self.trade_log.append(position.open_time, close_time, position.open_price, close_price, LONG if position.pos_type == PositionType.LONG else SHORT, position.investment,
+                              position.profit, position.result_percentage, position.won)
+
 
     def update_state(self, frame: DataFrame, verbose: bool = False):
 
-        to_remove = []
-        for pos in self.open_positions:
-            closed = pos.should_close()
-            if closed:
-                self.closed_positions.append(pos)
-                to_remove.append(pos)
+        closed = self.open_positions.close_triggered(frame.symbol, frame.low_price, frame.high_price)
+        for position in closed:
+            self.__record(position, frame.close_time)
+            if isinstance(self.wallet_handler, TestWallet):
+                self.wallet_handler.balance += position.investment + position.profit
+        if self.__keep_positions: self.closed_positions.extend(closed)
 
-        for rem in to_remove:
-            self.open_positions.remove(rem)
 
+        self.graph.tick(frame)
+        if frame.is_closed:
+            self.history.append(frame.open_price, frame.high_price, frame.low_price, frame.close_price)
+            if self.__uses_history: self.indicators = dict(self.compute_indicators())
+        # Conditions reading the history indicators wait for the first closed frame
+        if self.__uses_history and len(self.history) == 0:
+            return
 
-        market_price = self.data.get_current_mark_price(frame.symbol)
+        market_price = self.price_source.get_mark_price(frame)
         self.compute_indicators_step(frame)
 
         for c in self.__long_conditions:
@@ -94,32 +153,34 @@ class Strategy(ABC):
             c.tick(frame)
 
         if len(self.open_positions) < self.max_positions and self.wallet_handler.get_balance() > 0:
-            if self.__check_conditions(self.__long_conditions):
+            if self.__check_conditions(self.__long_conditions) and self.__has_exit_levels(frame.symbol, market_price, PositionType.LONG):
                 investment = self.get_margin_investment()
 
                 pos = KucoinPosition(frame.symbol, PositionType.LONG, OrderType.MARKET, datetime.datetime.utcnow(),
                                      market_price, self.get_take_profit(frame.symbol, market_price, PositionType.LONG),
-                                     self.get_stop_loss(market_price, PositionType.LONG),
+                                     self.get_stop_loss(frame.symbol, market_price, PositionType.LONG),
                                      self.get_margin_investment(),
                                      self.get_leverage(), self.wallet_handler)
+                pos.open_time = frame.start_time
                 if isinstance(self.wallet_handler, TestWallet):
                     self.wallet_handler.balance -= investment
 
-                self.open_positions.append(pos)
+                self.open_positions.add(pos)
                 if verbose: print("\nOpened position: " + str(pos))
                 self.__reset_conditions(self.__long_conditions)  # resetta le condizioni, in caso che siano perpetue
 
-            if self.__check_conditions(self.__short_conditions):
+            if self.__check_conditions(self.__short_conditions) and self.__has_exit_levels(frame.symbol, market_price, PositionType.SHORT):
                 investment = self.get_margin_investment()
 
                 pos = KucoinPosition(frame.symbol, PositionType.SHORT, OrderType.MARKET, datetime.datetime.utcnow(),
-                                     market_price, self.get_take_profit(frame.symbol, market_price, PositionType.LONG),
-                                     self.get_stop_loss(market_price, PositionType.LONG),
+                                     market_price, self.get_take_profit(frame.symbol, market_price, PositionType.SHORT),
+                                     self.get_stop_loss(frame.symbol, market_price, PositionType.SHORT),
                                      self.get_margin_investment(),
                                      self.get_leverage(), self.wallet_handler)
+                pos.open_time = frame.start_time
                 if isinstance(self.wallet_handler, TestWallet):
                     self.wallet_handler.balance -= investment
 
-                self.open_positions.append(pos)
+                self.open_positions.add(pos)
                 if verbose: print("\nOpened position: " + str(pos))
-                self.__reset_conditions(self.__long_conditions)  # resetta le condizioni, in caso che siano perpetue
+                self.__reset_conditions(self.__short_conditions)  # resetta le condizioni, in caso che siano perpetue
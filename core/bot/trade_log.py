@@ -0,0 +1,48 @@
+import numpy
+
+LONG = 0
+SHORT = 1
+
+TRADE_DTYPE = numpy.dtype([("open_time", numpy.int64), ("close_time", numpy.int64), ("open_price", numpy.float64), ("close_price", numpy.float64), ("side", numpy.int8),
+                           ("investment", numpy.float64), ("profit", numpy.float64), ("result_percentage", numpy.float64), ("won", numpy.bool_)])
+
+
+def create(size: int) -> numpy.ndarray:
+    """Returns an empty array of 'size' trades"""
+    return numpy.zeros(size, dtype = TRADE_DTYPE)
+
+
+class TradeLog:
+    """Closed trades of a backtest, in closing order, recorded in a preallocated structured array
+
+    The array doubles when full, so recording a trade never allocates Python objects. Only the recorded rows are pickled,
+    a log travels between processes as a single compact buffer.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.__trades = create(max(1, capacity))
+        self.__size = 0
+
+    def append(self, open_time: int, close_time: int, open_price: float, close_price: float, side: int, investment: float, profit: float, result_percentage: float, won: bool):
+        if self.__size == len(self.__trades):
+            self.__trades = numpy.concatenate((self.__trades, create(len(self.__trades))))
+        self.__trades[self.__size] = (open_time, close_time, open_price, close_price, side, investment, profit, result_percentage, won)
+        self.__size += 1
+
+    @property
+    def trades(self) -> numpy.ndarray:
+        """View of the recorded trades"""
+        return self.__trades[:self.__size]
+
+    def clear(self):
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def __getstate__(self):
+        return {"trades": self.trades.copy()}
+
+    def __setstate__(self, state):
+        self.__trades = state["trades"] if len(state["trades"]) > 0 else create(1)
+        self.__size = len(state["trades"])
@@ -0,0 +1,442 @@
+import heapq
+import math
+from abc import abstractmethod, ABC
+
+import numpy
+
+from core.bot import bar_pyramid, dataset_evaluator, trade_log
+from core.bot.candle_store import OPEN_T, HIGH, LOW, CLOSE, CLOSE_T
+from core.bot.dataset_evaluator import TestResult
+from core.bot.indicator_cache import IndicatorCache
+from core.bot.indicator_store import IndicatorStore
+from core.bot.position import PositionType
+from core.bot.strategy import Strategy
+from core.bot.wallet_handler import TestWallet
+
+
+# region Conditions
+# The conditions are one-shot: once their window ends they are false for a tick before checking their delegates again,
+# events inside a window do not extend it. Windows are walked one at a time, never the bars.
+
+class ConditionSignal(ABC):
+    """Array counterpart of a StrategyCondition, 'signal' holds its value on each bar if it is never reset"""
+
+    def __init__(self, signal: numpy.ndarray, possible: numpy.ndarray):
+        self.signal = signal
+        # Bars on which the condition can hold whenever it has been reset
+        self.possible = possible
+
+    @abstractmethod
+    def restart(self, start: int) -> [numpy.ndarray, int]:
+        """Returns the values from the bar 'start' of the condition reset before it, up to the bar from which they equal 'signal'"""
+        pass
+
+
+class PerpetualSignal(ConditionSignal):
+    """Array counterpart of the PerpetualStrategyCondition"""
+
+    def __init__(self, mask: numpy.ndarray):
+        mask = numpy.asarray(mask, dtype = bool)
+        super().__init__(mask, mask)
+
+    def restart(self, start: int) -> [numpy.ndarray, int]:
+        return numpy.zeros(0, dtype = bool), start
+
+
+class _WindowSignal(ConditionSignal):
+    """Condition true over windows opened by its delegate, a reset closes the current window"""
+
+    def __init__(self, length: int, opening: numpy.ndarray, window: int):
+        self.length = length
+        self.opening = opening
+        starts = []
+        start = self._next_start(0)
+        while start < length:
+            starts.append(start)
+            start = self._next_start(self._window_end(start) + 1)
+        self.is_start = numpy.zeros(length, dtype = bool)
+        self.is_start[starts] = True
+        signal = numpy.zeros(length, dtype = bool)
+        for start in starts:
+            signal[start: self._window_end(start)] = True
+        # A window lasts at most 'window' bars, so the condition can only hold within them from an opening bar
+        openings = numpy.concatenate(([0], numpy.cumsum(opening)))
+        bars = numpy.arange(1, length + 1)
+        super().__init__(signal, openings[bars] > openings[numpy.maximum(bars - window, 0)])
+
+    def _next_start(self, bar: int) -> int:
+        return self.length
+
+    def _window_end(self, start: int) -> int:
+        return start + 1
+
+    def restart(self, start: int) -> [numpy.ndarray, int]:
+        # Windows opened after a reset match the ones of 'signal' from the first shared opening bar
+        windows = []
+        merge = self._next_start(start)
+        while merge < self.length and not self.is_start[merge]:
+            windows.append(merge)
+            merge = self._next_start(self._window_end(merge) + 1)
+        values = numpy.zeros(merge - start, dtype = bool)
+        for window in windows:
+            values[window - start: self._window_end(window) - start] = True
+        return values, merge
+
+
+class EventSignal(_WindowSignal):
+    """Array counterpart of the EventStrategyCondition, true on an event bar and the 'tolerance_duration' following ones"""
+
+    def __init__(self, mask: numpy.ndarray, tolerance_duration: float):
+        mask = numpy.asarray(mask, dtype = bool)
+        self.events = numpy.flatnonzero(mask)
+        # The condition holds while the ticks since the event are at most the tolerance
+        self.window = math.floor(tolerance_duration) + 1
+        super().__init__(len(mask), mask, self.window)
+
+    def _next_start(self, bar: int) -> int:
+        k = numpy.searchsorted(self.events, bar)
+        return int(self.events[k]) if k < len(self.events) else self.length
+
+    def _window_end(self, start: int) -> int:
+        return min(start + self.window, self.length)
+
+
+class BoundedSignal(_WindowSignal):
+    """Array counterpart of the BoundedStrategyCondition, true from a valid bar until an invalid bar or the tolerance expires"""
+
+    def __init__(self, valid_mask: numpy.ndarray, invalid_mask: numpy.ndarray, duration_tolerance: float = 0):
+        valid_mask = numpy.asarray(valid_mask, dtype = bool)
+        self.valids = numpy.flatnonzero(valid_mask)
+        self.invalids = numpy.flatnonzero(numpy.asarray(invalid_mask, dtype = bool))
+        # The condition holds while the ticks since the valid bar are less than the tolerance
+        self.window = max(math.ceil(duration_tolerance), 1)
+        super().__init__(len(valid_mask), valid_mask, self.window)
+
+    def _next_start(self, bar: int) -> int:
+        k = numpy.searchsorted(self.valids, bar)
+        return int(self.valids[k]) if k < len(self.valids) else self.length
+
+    def _window_end(self, start: int) -> int:
+        # An invalid bar ends the window, the valid bar itself is not checked
+        k = numpy.searchsorted(self.invalids, start + 1)
+        return min(start + self.window, int(self.invalids[k]) if k < len(self.invalids) else self.length)
+
+
+class _EntrySignal:
+    """Entries of a side of a strategy, true where all its conditions hold, with the conditions reset at each opening"""
+
+    def __init__(self, conditions: list[ConditionSignal], length: int):
+        self.conditions = conditions
+        self.length = length
+        signal = numpy.ones(length, dtype = bool)
+        for condition in conditions:
+            signal &= condition.signal
+        self.entries = numpy.flatnonzero(signal)
+        self.restarted = numpy.zeros(0, dtype = numpy.int64)
+        self.merge = 0
+
+    def restart(self, start: int):
+        """Resets the conditions after the bar 'start' - 1"""
+        restarts = [condition.restart(start) for condition in self.conditions]
+        self.merge = max([start] + [merge for values, merge in restarts])
+        signal = numpy.ones(self.merge - start, dtype = bool)
+        for condition, (values, merge) in zip(self.conditions, restarts):
+            signal[:merge - start] &= values
+            signal[merge - start:] &= condition.signal[merge: self.merge]
+        self.restarted = start + numpy.flatnonzero(signal)
+
+    def next(self, bar: int) -> int:
+        """Returns the first entry bar from 'bar', the number of bars if none"""
+        k = numpy.searchsorted(self.restarted, bar)
+        if k < len(self.restarted): return int(self.restarted[k])
+        k = numpy.searchsorted(self.entries, max(bar, self.merge))
+        return int(self.entries[k]) if k < len(self.entries) else self.length
+
+
+# endregion
+
+
+class VectorizedStrategy(ABC):
+    """Strategy able to express its entry conditions as boolean arrays over the whole dataset"""
+
+    def get_indicators_key(self):
+        """Hashable of the parameters that shape the indicators, strategies with the same key share the same indicators"""
+        return None
+
+    @abstractmethod
+    def compute_bar_indicators(self, bars: numpy.ndarray) -> dict[str, any]:
+        """Returns the indicator series over all the closed bars"""
+        pass
+
+    @abstractmethod
+    def compute_signals(self, bars: numpy.ndarray, indicators: dict[str, any]) -> [list[ConditionSignal], list[ConditionSignal]]:
+        """Returns the long and the short entry conditions, as the ones of the strategy"""
+        pass
+
+    @abstractmethod
+    def get_exit_levels(self, open_prices: numpy.ndarray, entry_indexes: numpy.ndarray, position_type: PositionType) -> [numpy.ndarray, numpy.ndarray]:
+        """Returns the take profits and the stop losses of the positions opened at the entry bars"""
+        pass
+
+    @abstractmethod
+    def get_investment_ratio(self) -> float:
+        """Ratio of the available balance invested in each position"""
+        pass
+
+
+SEARCH_BLOCK = 64
+
+
+class _RangeSearch:
+    """Finds the first candle at or after a start whose value reaches a level for many queries at once, through a sparse table of block maxima"""
+
+    def __init__(self, values: numpy.ndarray):
+        self.length = len(values)
+        blocks = max(1, -(-self.length // SEARCH_BLOCK))
+        self.values = numpy.full(blocks * SEARCH_BLOCK, -numpy.inf)
+        self.values[:self.length] = values
+        self.blocks = blocks
+        self.table = [self.values.reshape(blocks, SEARCH_BLOCK).max(axis = 1)]
+        while (1 << len(self.table)) <= blocks:
+            previous, step = self.table[-1], 1 << (len(self.table) - 1)
+            self.table.append(numpy.maximum(previous[:-step], previous[step:]))
+
+    def __first_in_block(self, blocks: numpy.ndarray, starts: numpy.ndarray, levels: numpy.ndarray) -> numpy.ndarray:
+        candles = blocks[:, None] * SEARCH_BLOCK + numpy.arange(SEARCH_BLOCK)[None, :]
+        reached = (candles >= starts[:, None]) & (self.values[candles] >= levels[:, None])
+        return numpy.where(reached.any(axis = 1), candles[numpy.arange(len(blocks)), reached.argmax(axis = 1)], -1)
+
+    def first_reaching(self, starts: numpy.ndarray, levels: numpy.ndarray) -> numpy.ndarray:
+        """Returns for each query the first index >= start with value >= level, the length of the values if none"""
+        result = numpy.full(len(starts), self.length, dtype = numpy.int64)
+        pending = numpy.flatnonzero(starts < self.length)
+        if len(pending) == 0: return result
+        first = self.__first_in_block(starts[pending] // SEARCH_BLOCK, starts[pending], levels[pending])
+        result[pending[first >= 0]] = first[first >= 0]
+        pending = pending[first < 0]
+
+        # Skip the following blocks whose maximum does not reach the level
+        blocks = starts[pending] // SEARCH_BLOCK + 1
+        levels = levels[pending]
+        for k in range(len(self.table) - 1, -1, -1):
+            span = 1 << k
+            table = self.table[k]
+            skippable = blocks + span <= self.blocks
+            skippable[skippable] &= table[blocks[skippable]] < levels[skippable]
+            blocks = numpy.where(skippable, blocks + span, blocks)
+        found = blocks < self.blocks
+        first = self.__first_in_block(blocks[found], blocks[found] * SEARCH_BLOCK, levels[found])
+        result[pending[found]] = first
+        return result
+
+
+def __find_exits(highs: numpy.ndarray, lows: numpy.ndarray, starts: numpy.ndarray, take_profits: numpy.ndarray, stop_losses: numpy.ndarray,
+                 is_long: numpy.ndarray) -> [numpy.ndarray, numpy.ndarray]:
+    """Returns for each position the first candle from its start touching a level (-1 if none) and if it is the take profit"""
+    length = len(highs)
+    above = _RangeSearch(highs)
+    below = _RangeSearch(-numpy.asarray(lows))
+    take_profit_hit = numpy.full(len(starts), length, dtype = numpy.int64)
+    stop_loss_hit = numpy.full(len(starts), length, dtype = numpy.int64)
+    short = ~is_long
+    take_profit_hit[is_long] = above.first_reaching(starts[is_long], take_profits[is_long])
+    stop_loss_hit[is_long] = below.first_reaching(starts[is_long], -stop_losses[is_long])
+    take_profit_hit[short] = below.first_reaching(starts[short], -take_profits[short])
+    stop_loss_hit[short] = above.first_reaching(starts[short], stop_losses[short])
+    # As in Position.should_close, the take profit is checked first
+    won = (take_profit_hit <= stop_loss_hit) & (take_profit_hit < length)
+    exits = numpy.minimum(take_profit_hit, stop_loss_hit)
+    return numpy.where(exits < length, exits, -1), won
+
+
+def __account(entries: tuple, candidates: list[tuple[int, numpy.ndarray]], starts: numpy.ndarray, exits: numpy.ndarray, result_percentages: numpy.ndarray,
+              defined: numpy.ndarray, investments: numpy.ndarray, opened: numpy.ndarray, investment_ratio: float, max_positions: int, initial_balance: float,
+              start: int, end: int) -> float:
+    """Walks the entry bars of an individual as Strategy.update_state, filling 'investments' and 'opened', returns its final balance"""
+    balance = float(initial_balance)
+    # Min heap of (exit, entry bar, side, value returned to the wallet) in closing order, the positions never closed exit at infinity
+    positions = []
+    bar = start
+    while True:
+        nexts = [entry.next(bar) for entry in entries]
+        bar = min(nexts)
+        if bar >= end: break
+        ks = [offset + int(numpy.searchsorted(bars, bar)) if nexts[side] == bar else -1 for side, (offset, bars) in enumerate(candidates)]
+        position_start = starts[max(ks)]
+        while len(positions) > 0 and positions[0][0] < position_start:
+            balance += heapq.heappop(positions)[3]
+        if len(positions) < max_positions and balance > 0:
+            for side, (entry, k) in enumerate(zip(entries, ks)):
+                # Positions with undefined levels are never opened
+                if k < 0 or not defined[k]: continue
+                investment = balance * investment_ratio
+                balance -= investment
+                heapq.heappush(positions, (exits[k] if exits[k] >= 0 else math.inf, bar, side, investment + investment * (result_percentages[k] / 100)))
+                investments[k] = investment
+                opened[k] = True
+                entry.restart(bar + 1)
+        bar += 1
+    for exit, entry_bar, side, value in sorted(positions):
+        if exit != math.inf: balance += value
+    return balance
+
+
+def evaluate_population(strategies: list, initial_balance: float, bars: numpy.ndarray, timeframe: int = 1, data: numpy.ndarray = None,
+                        indicators_cache: IndicatorCache = None, dataset_id: str = None, indicators_store: IndicatorStore = None, end: int = None,
+                        start: int = 0) -> list[TestResult]:
+    """Vectorized backtest of a whole population of VectorizedStrategy, indicators and exits computed together for all of them
+
+    Parameters:
+        strategies (list): strategies implementing VectorizedStrategy
+        initial_balance (float): initial balance of each individual
+        bars (ndarray): closed bars of the strategy timeframe (see bar_pyramid)
+        timeframe (int): minutes of the bars
+        data (ndarray): 1m candles used to check the exits, the bars are used if not provided
+        indicators_cache (IndicatorCache): cache of the indicator series reused across calls, only this call shares them if not provided
+        dataset_id (str): identifier of the dataset of the bars in the cache, the content hash of the store if not provided
+        indicators_store (IndicatorStore): on-disk indicators of the dataset and timeframe of the bars
+        end (int): number of bars to backtest, all of them if not provided. Indicators are still computed on all the bars, so
+            they are shared with the calls on the other prefixes
+        start (int): first bar on which positions are opened, the previous bars only warm up the indicators
+
+    Returns:
+        The test result of each strategy, None for the strategies that can not be tested
+    """
+    results = [None] * len(strategies)
+    end = len(bars) if end is None else max(0, min(int(end), len(bars)))
+    start = max(0, min(int(start), end))
+    testable = []
+    for i, strategy in enumerate(strategies):
+        if not isinstance(strategy, VectorizedStrategy):
+            print("Unable to test the strategy, " + type(strategy).__name__ + " is not a VectorizedStrategy")
+        elif not isinstance(strategy.wallet_handler, TestWallet):
+            print("Unable to test the strategy, the wallet handler is not an instance of a TestWallet")
+        elif end == start:
+            results[i] = TestResult.from_trades(initial_balance, 0, timeframe, trade_log.create(0), 0)
+        else:
+            testable.append(i)
+    if len(testable) == 0: return results
+
+    # Signals and exit levels of each individual, indicators shared among equal keys
+    if indicators_cache is None: indicators_cache = IndicatorCache(None)
+    if dataset_id is None and indicators_store is not None: dataset_id = indicators_store.dataset_hash
+    owners, entry_indexes, is_long, take_profits, stop_losses = [], [], [], [], []
+    sides = {}
+    offset = 0
+    for i in testable:
+        strategy = strategies[i]
+        indicators_key = strategy.get_indicators_key()
+        compute = lambda: strategy.compute_bar_indicators(bars)
+        load = (lambda: indicators_store.get(type(strategy), indicators_key, compute)) if indicators_store is not None else compute
+        indicators = indicators_cache.get((dataset_id, timeframe, type(strategy), indicators_key), load)
+        long_conditions, short_conditions = strategy.compute_signals(bars, indicators)
+        if data is not None and not all(isinstance(condition, PerpetualSignal) for condition in long_conditions + short_conditions):
+            # The event engine ticks the conditions every minute of the candles, their tolerances can not be counted in bars
+            print("Unable to test the strategy on the 1m candles, " + type(strategy).__name__ + " has conditions that are not perpetual")
+            continue
+        entries, candidates = [], []
+        for position_type, conditions in ((PositionType.LONG, long_conditions), (PositionType.SHORT, short_conditions)):
+            entries.append(_EntrySignal(conditions, len(bars)))
+            # Bars on which an entry is possible whatever the resets, a superset of the opened ones
+            possible = numpy.ones(end - start, dtype = bool)
+            for condition in conditions:
+                possible &= condition.possible[start:end]
+            indexes = start + numpy.flatnonzero(possible)
+            tp, sl = strategy.get_exit_levels(numpy.asarray(bars[indexes, CLOSE], dtype = numpy.float64), indexes, position_type)
+            candidates.append((offset, indexes))
+            offset += len(indexes)
+            owners.append(numpy.full(len(indexes), i, dtype = numpy.int64))
+            entry_indexes.append(indexes)
+            is_long.append(numpy.full(len(indexes), position_type == PositionType.LONG))
+            take_profits.append(numpy.asarray(tp, dtype = numpy.float64))
+            stop_losses.append(numpy.asarray(sl, dtype = numpy.float64))
+        sides[i] = (tuple(entries), candidates)
+    if len(sides) == 0: return results
+    owners, entry_indexes, is_long = numpy.concatenate(owners), numpy.concatenate(entry_indexes), numpy.concatenate(is_long)
+    take_profits, stop_losses = numpy.concatenate(take_profits), numpy.concatenate(stop_losses)
+    open_prices = numpy.asarray(bars[entry_indexes, CLOSE], dtype = numpy.float64)
+
+    # Positions with undefined levels (indicators not warmed up yet) are never opened
+    defined = numpy.isfinite(take_profits) & numpy.isfinite(stop_losses)
+    exits_data = data if data is not None else bars
+    if data is not None:
+        starts = numpy.searchsorted(data[:, OPEN_T], bars[entry_indexes, CLOSE_T], side = "right")
+    else:
+        starts = entry_indexes + 1
+    exits = numpy.full(len(owners), -1, dtype = numpy.int64)
+    won = numpy.zeros(len(owners), dtype = bool)
+    exits[defined], won[defined] = __find_exits(numpy.asarray(exits_data[:, HIGH]), numpy.asarray(exits_data[:, LOW]), starts[defined], take_profits[defined],
+                                                stop_losses[defined], is_long[defined])
+    if end < len(bars):
+        # Exits after the last bar of the prefix have not happened yet
+        exits_end = numpy.searchsorted(data[:, OPEN_T], bars[end - 1, CLOSE_T], side = "right") if data is not None else end
+        won &= (exits >= 0) & (exits < exits_end)
+        exits = numpy.where(exits < exits_end, exits, -1)
+    close_prices = numpy.where(won, take_profits, stop_losses)
+    with numpy.errstate(invalid = "ignore"):
+        result_percentages = numpy.where(is_long, (close_prices / open_prices) - 1, (open_prices / close_prices) - 1) * 100
+
+    # Accounting, each individual walks its entry bars resetting its conditions at each opening
+    investments = numpy.zeros(len(owners))
+    opened = numpy.zeros(len(owners), dtype = bool)
+    balances = {}
+    for i, (entries, candidates) in sides.items():
+        balances[i] = __account(entries, candidates, starts, exits, result_percentages, defined, investments, opened, strategies[i].get_investment_ratio(),
+                                strategies[i].max_positions, initial_balance, start, end)
+
+    minutes = dataset_evaluator.get_bars_minutes(bars[start:], end - start)
+    closed = opened & (exits >= 0)
+    # Trades of all the positions, the ones of each individual are then taken in closing order
+    trades = trade_log.create(len(owners))
+    trades["open_time"] = bars[entry_indexes, OPEN_T]
+    trades["close_time"] = numpy.where(exits >= 0, exits_data[exits, CLOSE_T], 0)
+    trades["open_price"] = open_prices
+    trades["close_price"] = close_prices
+    trades["side"] = numpy.where(is_long, trade_log.LONG, trade_log.SHORT)
+    trades["investment"] = investments
+    trades["profit"] = investments * (result_percentages / 100)
+    trades["result_percentage"] = result_percentages
+    trades["won"] = won
+    for i in sides:
+        owned = owners == i
+        owned_closed = numpy.flatnonzero(owned & closed)
+        # Closing order, the positions closed by the same candle in opening order
+        owned_closed = owned_closed[numpy.lexsort((~is_long[owned_closed], entry_indexes[owned_closed], exits[owned_closed]))]
+        strategies[i].wallet_handler.balance = float(balances[i])
+        results[i] = TestResult.from_trades(initial_balance, minutes, timeframe, trades[owned_closed], int(numpy.count_nonzero(opened & owned)))
+    return results
+
+
+def evaluate(strategy: Strategy, initial_balance: float, bars: numpy.ndarray, timeframe: int = 1, data: numpy.ndarray = None, index: int = 0,
+             indicators_store: IndicatorStore = None) -> [TestResult, list[float], int]:
+    """Vectorized backtest of a single VectorizedStrategy, trading as the event engine on the closed bars (see core.bot.parity)
+
+    Returns:
+        The test result, the initial and final balance and the index
+    """
+    result = evaluate_population([strategy], initial_balance, bars, timeframe, data, indicators_store = indicators_store)[0]
+    if result is None: return None, [initial_balance], index
+    return result, [initial_balance, strategy.wallet_handler.get_balance()], index
+
+
+def evaluate_candles(strategy: Strategy, initial_balance: float, data: numpy.ndarray, progress_delegate = None,
+                     balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0, indicators_store: IndicatorStore = None) -> [TestResult, list[float], int]:
+    """Same interface as dataset_evaluator.evaluate, signals on the timeframe bars and exits on the 1m candles (see evaluate for the differences)"""
+    result = evaluate(strategy, initial_balance, bar_pyramid.resample(data, timeframe), timeframe, data, index, indicators_store)
+    if progress_delegate is not None: progress_delegate(len(data))
+    return result
+
+
+def evaluate_closed_bars(strategy: Strategy, initial_balance: float, bars: numpy.ndarray, progress_delegate = None,
+                         balance_update_interval: int = 1440, timeframe: int = 3, index: int = 0, indicators_store: IndicatorStore = None) -> [TestResult, list[float], int]:
+    """Same interface as dataset_evaluator.evaluate_bars, signals and exits on the closed bars (see evaluate for the differences)"""
+    result = evaluate(strategy, initial_balance, bars, timeframe, None, index, indicators_store)
+    if progress_delegate is not None: progress_delegate(len(bars))
+    return result
+
+
+def get_evaluator(closed_bars: bool = False, vectorized: bool = False):
+    """Returns the backtest function for the dataset type (1m candles or closed bars) and the engine"""
+    if vectorized:
+        return evaluate_closed_bars if closed_bars else evaluate_candles
+    return dataset_evaluator.evaluate_bars if closed_bars else dataset_evaluator.evaluate
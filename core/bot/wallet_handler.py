@@ -6,7 +6,7 @@ from kucoin.client import Client as Client_K
 # from kucoin_futures.client import Trade
 # from kucoin_futures.client import Market
 from CexLib.Kucoin.KucoinOrder import Trade
-from CexLib.Kucoin.KucoinData import Data
+from CexLib.Kucoin.KucoinData import KucoinData as Data
 
 
 
@@ -0,0 +1,36 @@
+import os
+import pickle
+
+CHECKPOINT_VERSION = 3
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+def get_checkpoint_path(result_path: str) -> str:
+    return os.path.splitext(result_path)[0] + CHECKPOINT_SUFFIX
+
+
+def save(path: str, state: dict):
+    """Writes the state of a training, atomically: a preempted write never replaces the previous checkpoint"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump(dict(state, version = CHECKPOINT_VERSION), file, protocol = pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load(path: str) -> dict:
+    """Returns the state of a training saved by 'save', None if it can not be read"""
+    if not os.path.exists(path):
+        print("Checkpoint " + path + " not found")
+        return None
+    try:
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+        print("Unable to read the checkpoint " + path + ", " + str(error))
+        return None
+    if state.get("version") != CHECKPOINT_VERSION:
+        print("Checkpoint " + path + " has version " + str(state.get("version")) + ", expected " + str(CHECKPOINT_VERSION))
+        return None
+    return state
@@ -0,0 +1,527 @@
+import collections
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+import config
+from core.bot import bar_pyramid, candle_store
+from core.bot.indicator_store import IndicatorStore, get_dataset_hash
+from core.training import worker
+from core.training.migration import parse_address
+from core.training.shared_dataset import SharedDataset
+
+# Ids of the last cancelled tasks shared with the workers, and starts kept for the tasks already completed
+CANCELLED_SLOTS = 1024
+KEPT_STARTS = 4096
+# Signal interrupting a worker running a cancelled task
+INTERRUPT_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+
+def publish_datasets(paths: list[str], timeframe: int, closed_bars: bool = False, vectorized: bool = False, store_indicators: bool = True) -> list[tuple[str, SharedDataset, IndicatorStore]]:
+    """Loads the datasets and publishes them in shared memory, the ones that can not be loaded are skipped
+
+    Returns:
+        The (path, shared dataset, indicators store) of each loaded dataset, the store is None if not vectorized
+    """
+    datasets = []
+    for path in paths:
+        print("Loading " + path + "...")
+        data = bar_pyramid.load_bars(path, timeframe) if closed_bars else candle_store.load(path)
+        if data is None: continue
+        # Vectorized runs reuse the indicator series stored on disk by the previous runs on the same dataset
+        datasets.append((path, SharedDataset.publish(data), IndicatorStore(path, timeframe) if vectorized and store_indicators else None))
+    return datasets
+
+
+class Session:
+    """Parameters of the workers of a training, with the datasets referenced by path so that remote workers can load them"""
+
+    def __init__(self, strategy_module: str, strategy_name: str, data_paths: list[str], validation_paths: list[str], initial_balance: float, timeframe: int,
+                 closed_bars: bool = False, vectorized: bool = False, indicators_cache_mb: int = 256, store_indicators: bool = True):
+        self.strategy_module = strategy_module
+        self.strategy_name = strategy_name
+        self.data_paths = data_paths
+        self.validation_paths = validation_paths
+        self.initial_balance = initial_balance
+        self.timeframe = timeframe
+        self.closed_bars = closed_bars
+        self.vectorized = vectorized
+        self.indicators_cache_mb = indicators_cache_mb
+        self.store_indicators = store_indicators
+
+    def get_initargs(self, datasets: list[tuple[str, SharedDataset, IndicatorStore]], validation_sets: list[tuple[str, SharedDataset, IndicatorStore]], progress_delegate = None) -> tuple:
+        """Arguments of 'worker.initialize' for the published datasets of the session"""
+        return (self.strategy_module, self.strategy_name, [d for p, d, s in datasets], self.initial_balance, self.timeframe, progress_delegate, self.closed_bars, self.vectorized,
+                self.indicators_cache_mb, [s for p, d, s in datasets], [d for p, d, s in validation_sets], [s for p, d, s in validation_sets])
+
+
+# region Task runner
+
+class _Cancelled(BaseException):
+    pass
+
+
+class _CancelledTasks:
+    """Ring of the ids of the last cancelled tasks, shared with the processes running the tasks"""
+
+    def __init__(self, size: int = CANCELLED_SLOTS):
+        self.ids = multiprocessing.Array("q", [-1] * size, lock = False)
+        self.count = 0
+
+    def add(self, task_id: int):
+        self.ids[self.count % len(self.ids)] = task_id
+        self.count += 1
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self.ids[:]
+
+
+# Tasks picked up by the process, reported to the trainer, the cancelled tasks and the task being run
+_starts = None
+_cancelled = None
+_task = None
+
+
+def _initialize_runner(starts, cancelled: _CancelledTasks, initializer = None, initargs: tuple = ()):
+    """Initializer of the processes running the tasks through _run_task"""
+    global _starts, _cancelled
+    _starts, _cancelled = starts, cancelled
+    if INTERRUPT_SIGNAL is not None: signal.signal(INTERRUPT_SIGNAL, _interrupt)
+    if initializer is not None: initializer(*initargs)
+
+
+def _interrupt(signum, frame):
+    # Signals that arrive late, once the cancelled task is over, are ignored
+    if _task is not None and _task in _cancelled: raise _Cancelled()
+
+
+def _run_task(task_id: int, function, args: tuple):
+    """Runs a task, returns None if it is cancelled before completing"""
+    global _task
+    if task_id in _cancelled: return None
+    try:
+        _task = task_id
+        if _starts is not None: _starts.put((task_id, os.getpid()))
+        return function(*args)
+    except _Cancelled:
+        return None
+    finally:
+        _task = None
+
+
+def _interrupt_process(pid: int):
+    if INTERRUPT_SIGNAL is None: return
+    try:
+        os.kill(pid, INTERRUPT_SIGNAL)
+    except ProcessLookupError:
+        pass
+
+
+# endregion
+
+
+class _Result:
+    """Result of a task run in process or by a remote worker, with the interface of the pool results"""
+
+    def __init__(self, task_id: int = None, callback = None, error_callback = None):
+        self.task_id = task_id
+        # Time at which a worker picked up the task
+        self.started = None
+        self.cancelled = False
+        self.__callback = callback
+        self.__error_callback = error_callback
+        self.__event = threading.Event()
+        self.__value = None
+        self.__error = None
+
+    def set(self, value, error: BaseException = None):
+        self.__value = value
+        self.__error = error
+        if error is None and self.__callback is not None and not self.cancelled: self.__callback(value)
+        if error is not None and self.__error_callback is not None and not self.cancelled: self.__error_callback(error)
+        self.__event.set()
+
+    def ready(self) -> bool:
+        return self.__event.is_set()
+
+    def get(self, timeout: float = None):
+        if not self.__event.wait(timeout): raise multiprocessing.TimeoutError()
+        if self.__error is not None: raise self.__error
+        return self.__value
+
+
+class _MapResult:
+
+    def __init__(self, results: list[_Result]):
+        self.__results = results
+
+    def ready(self) -> bool:
+        return all(r.ready() for r in self.__results)
+
+    def get(self, timeout: float = None) -> list:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return [r.get(max(0, deadline - time.monotonic()) if deadline is not None else None) for r in self.__results]
+
+
+class InProcessExecutor:
+    """Runs the tasks in the trainer process as they are submitted, to debug and profile the workers"""
+
+    def __init__(self, initializer = None, initargs: tuple = ()):
+        if initializer is not None: initializer(*initargs)
+
+    def apply_async(self, func, args: tuple = (), callback = None, error_callback = None) -> _Result:
+        result = _Result(None, callback, error_callback)
+        result.started = time.monotonic()
+        try:
+            value = func(*args)
+        except Exception as error:
+            result.set(None, error)
+            return result
+        result.set(value)
+        return result
+
+    def starmap_async(self, func, iterable) -> _MapResult:
+        return _MapResult([self.apply_async(func, args) for args in iterable])
+
+    def started(self, result: _Result) -> float:
+        return result.started
+
+    def cancel(self, result: _Result):
+        pass
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class LocalExecutor(multiprocessing.pool.Pool):
+    """Pool of worker processes on the trainer machine, whose cancelled tasks are skipped or interrupted by a signal"""
+
+    def __init__(self, processes: int = None, initializer = None, initargs: tuple = ()):
+        self.__starts = {}
+        self.__completed = collections.deque()
+        self.__cancelled = _CancelledTasks()
+        self.__identifiers = itertools.count()
+        self.__start_queue = multiprocessing.Queue()
+        self.__running = True
+        super().__init__(processes, _initialize_runner, (self.__start_queue, self.__cancelled, initializer, initargs))
+        threading.Thread(target = self.__listen, daemon = True).start()
+
+    def apply_async(self, func, args: tuple = (), callback = None, error_callback = None):
+        task_id = next(self.__identifiers)
+        result = super().apply_async(_run_task, (task_id, func, args), callback = lambda value: self.__complete(task_id, callback, value),
+                                     error_callback = lambda error: self.__complete(task_id, error_callback, error))
+        result.task_id = task_id
+        return result
+
+    def started(self, result) -> float:
+        """Time (time.monotonic) at which a worker picked up the task, None if it is still queued"""
+        start = self.__starts.get(result.task_id)
+        return start[0] if start is not None else None
+
+    def cancel(self, result):
+        self.__cancelled.add(result.task_id)
+        start = self.__starts.get(result.task_id)
+        if start is not None: _interrupt_process(start[1])
+
+    def terminate(self):
+        self.__running = False
+        super().terminate()
+
+    def __listen(self):
+        while self.__running:
+            try:
+                task_id, pid = self.__start_queue.get(timeout = 1)
+            except queue.Empty:
+                continue
+            except (OSError, EOFError, ValueError):
+                return
+            self.__starts[task_id] = (time.monotonic(), pid)
+            # Cancelled while the start was on its way
+            if task_id in self.__cancelled: _interrupt_process(pid)
+
+    def __complete(self, task_id: int, callback, value):
+        self.__completed.append(task_id)
+        if len(self.__completed) > KEPT_STARTS: self.__starts.pop(self.__completed.popleft(), None)
+        if callback is not None and task_id not in self.__cancelled: callback(value)
+
+
+class JobBoard:
+    """Tasks and results of the current session version, kept by the trainer and served to the worker daemons"""
+
+    def __init__(self):
+        self.__version = 0
+        self.__session = None
+        self.__jobs = queue.Queue()
+        self.__results = queue.Queue()
+        # Job id -> (time, (daemon, pid)) of the jobs taken, cancelled queued jobs and interrupts of each daemon
+        self.__starts = {}
+        self.__cancelled = set()
+        self.__interrupts = {}
+
+    def open(self, session: Session, hashes: list[str]):
+        self.__version += 1
+        self.__session = (session, hashes)
+        self.__jobs = queue.Queue()
+        self.__results = queue.Queue()
+        self.__starts = {}
+        self.__cancelled = set()
+        self.__interrupts = {}
+
+    def close(self):
+        self.__version += 1
+        self.__session = None
+
+    def session(self) -> tuple:
+        """Returns the version and the (session, dataset hashes) of the current training, None if there is no training"""
+        return self.__version, self.__session
+
+    def submit(self, job: tuple):
+        self.__jobs.put(job)
+
+    def take(self, version: int, taker: tuple = None, timeout: float = 1) -> tuple:
+        """Returns the next (id, function name, args) job of a session for the (daemon, pid) taker, None if there is none or the session changed"""
+        if version != self.__version: return None
+        try:
+            job = self.__jobs.get(timeout = timeout)
+            while job[0] in self.__cancelled:
+                self.__cancelled.remove(job[0])
+                job = self.__jobs.get(timeout = timeout)
+        except queue.Empty:
+            return None
+        self.__starts[job[0]] = (time.monotonic(), taker)
+        return job
+
+    def started(self, job_id: int) -> float:
+        start = self.__starts.get(job_id)
+        return start[0] if start is not None else None
+
+    def cancel(self, job_id: int):
+        """Drops a queued job, or asks the daemon running it to interrupt it"""
+        start = self.__starts.get(job_id)
+        if start is None:
+            self.__cancelled.add(job_id)
+        elif start[1] is not None:
+            daemon, pid = start[1]
+            self.__interrupts.setdefault(daemon, []).append((pid, job_id))
+
+    def interrupts(self, daemon: str) -> list[tuple[int, int]]:
+        """Returns the (pid, job id) of the jobs of the daemon to interrupt"""
+        return self.__interrupts.pop(daemon, [])
+
+    def complete(self, version: int, job_id: int, value, error: BaseException = None):
+        if version != self.__version: return
+        start = self.__starts.pop(job_id, None)
+        self.__results.put((job_id, value, error, start[0] if start is not None else None))
+
+    def result(self, timeout: float = 1) -> tuple:
+        try:
+            return self.__results.get(timeout = timeout)
+        except queue.Empty:
+            return None
+
+
+class _JobServer(BaseManager):
+    pass
+
+
+class _JobClient(BaseManager):
+    pass
+
+
+_JobClient.register("board")
+
+
+class RemoteExecutor:
+    """Tasks served over TCP to the daemons started with 'python -m core.training.executor <trainer address>' and the same 'authkey'"""
+
+    def __init__(self, session: Session, address: tuple[str, int], authkey: str):
+        if not authkey: raise ValueError("The remote executor needs an authkey")
+        self.__board = JobBoard()
+        # Remote workers verify that their copies of the datasets have the same content
+        self.__board.open(session, [get_dataset_hash(path) for path in session.data_paths + session.validation_paths])
+        _JobServer.register("board", callable = lambda: self.__board)
+        self.__server = _JobServer(address = address, authkey = authkey.encode()).get_server()
+        threading.Thread(target = self.__server.serve_forever, daemon = True).start()
+        print("Waiting for the remote workers on " + address[0] + ":" + str(address[1]), flush = True)
+        self.__pending = {}
+        self.__identifiers = itertools.count()
+        self.__running = True
+        self.__collector = threading.Thread(target = self.__collect, daemon = True)
+        self.__collector.start()
+
+    def apply_async(self, func, args: tuple = (), callback = None, error_callback = None) -> _Result:
+        job_id = next(self.__identifiers)
+        result = _Result(job_id, callback, error_callback)
+        self.__pending[job_id] = result
+        self.__board.submit((job_id, func.__name__, args))
+        return result
+
+    def starmap_async(self, func, iterable) -> _MapResult:
+        return _MapResult([self.apply_async(func, args) for args in iterable])
+
+    def started(self, result: _Result) -> float:
+        return result.started if result.started is not None else self.__board.started(result.task_id)
+
+    def cancel(self, result: _Result):
+        if result.ready(): return
+        result.cancelled = True
+        self.__board.cancel(result.task_id)
+
+    def terminate(self):
+        self.__running = False
+        self.__board.close()
+        self.__server.stop_event.set()
+        self.__server.listener.close()
+
+    def join(self):
+        self.__collector.join()
+
+    def __collect(self):
+        while self.__running:
+            completed = self.__board.result()
+            if completed is None: continue
+            job_id, value, error, started = completed
+            result = self.__pending.pop(job_id, None)
+            if result is None: continue
+            result.started = started
+            result.set(value, error)
+
+
+def create(mode: str, processes_number: int, session: Session, datasets: list[tuple[str, SharedDataset, IndicatorStore]], validation_sets: list[tuple[str, SharedDataset, IndicatorStore]],
+           progress_delegate = None, address: tuple[str, int] = (config.EXECUTOR_HOST, config.EXECUTOR_PORT), authkey: str = None):
+    """Returns the executor of the tasks of a training: 'local' (pool of the machine), 'in_process' or 'remote' (listening on 'address')"""
+    if mode == "in_process":
+        return InProcessExecutor(worker.initialize, session.get_initargs(datasets, validation_sets, progress_delegate))
+    if mode == "remote":
+        return RemoteExecutor(session, address, authkey)
+    return LocalExecutor(processes_number, worker.initialize, session.get_initargs(datasets, validation_sets, progress_delegate))
+
+
+# region Worker daemon
+
+def __connect(address: tuple[str, int], authkey: str):
+    try:
+        client = _JobClient(address = address, authkey = authkey.encode())
+        client.connect()
+        return client.board()
+    except multiprocessing.AuthenticationError:
+        print("The trainer at " + address[0] + ":" + str(address[1]) + " rejected the authkey", flush = True)
+        return None
+    except (OSError, EOFError):
+        return None
+
+
+def __serve_tasks(address: tuple[str, int], authkey: str, version: int, initargs: tuple, daemon: str, cancelled: _CancelledTasks):
+    """Process of a daemon, runs the tasks of a session until the session changes or the trainer is lost"""
+    _initialize_runner(None, cancelled, worker.initialize, initargs)
+    board = __connect(address, authkey)
+    if board is None: return
+    while True:
+        try:
+            job = board.take(version, (daemon, os.getpid()))
+            if job is None:
+                if board.session()[0] != version: return
+                continue
+            job_id, function, args = job
+            try:
+                value, error = _run_task(job_id, getattr(worker, function), args), None
+            except Exception as exception:
+                value, error = None, exception
+            board.complete(version, job_id, value, error)
+        except (OSError, EOFError):
+            return
+
+
+def __start_session(address: tuple[str, int], authkey: str, version: int, session: Session, hashes: list[str], processes_number: int, daemon: str, cancelled: _CancelledTasks,
+                    data_folder: str = None) -> [list, list]:
+    """Loads the datasets of a session and starts the processes running its tasks"""
+    paths = session.data_paths + session.validation_paths
+    local_paths = [os.path.join(data_folder, os.path.basename(path)) if data_folder is not None else path for path in paths]
+    for path, dataset_hash in zip(local_paths, hashes):
+        if not os.path.exists(path) or get_dataset_hash(path) != dataset_hash:
+            print("Dataset " + path + " is missing or differs from the one of the trainer", flush = True)
+            return [], []
+    datasets = publish_datasets(local_paths, session.timeframe, session.closed_bars, session.vectorized, session.store_indicators)
+    if len(datasets) < len(local_paths):
+        for path, dataset, store in datasets: dataset.dispose()
+        return [], []
+    initargs = session.get_initargs(datasets[:len(session.data_paths)], datasets[len(session.data_paths):])
+    processes = [multiprocessing.Process(target = __serve_tasks, args = (address, authkey, version, initargs, daemon, cancelled), daemon = True) for i in range(processes_number)]
+    for process in processes: process.start()
+    print("Running " + session.strategy_name + " on " + ", ".join(local_paths) + " with " + str(processes_number) + " processes", flush = True)
+    return processes, datasets
+
+
+def __stop_session(processes: list, datasets: list):
+    for process in processes:
+        process.terminate()
+        process.join()
+    for path, dataset, store in datasets: dataset.dispose()
+
+
+def serve_workers(address: str, authkey: str, processes_number: int = None, data_folder: str = None):
+    """Runs the worker daemon of a machine until interrupted, following the trainings of the trainer at 'address'
+
+    Parameters:
+        address (str): 'host:port' of the trainer
+        authkey (str): secret shared with the trainer
+        processes_number (int): processes running the tasks, one for each core if None
+        data_folder (str): folder with the datasets of the trainings, by file name, if None the paths of the trainer are used
+    """
+    address = parse_address(address, config.EXECUTOR_PORT)
+    processes_number = processes_number if processes_number is not None else os.cpu_count()
+    board = None
+    daemon = socket.gethostname() + ":" + str(os.getpid())
+    cancelled = _CancelledTasks()
+    # Session versions start from 1, None when the trainer is unreachable
+    version = 0
+    processes, datasets = [], []
+    try:
+        while True:
+            if board is None: board = __connect(address, authkey)
+            try:
+                current_version, current = board.session() if board is not None else (None, None)
+                interrupts = board.interrupts(daemon) if board is not None else []
+            except (OSError, EOFError):
+                board, current_version, current, interrupts = None, None, None, []
+            if current_version != version:
+                __stop_session(processes, datasets)
+                processes, datasets = [], []
+                version = current_version
+                if board is None: print("Waiting for a trainer at " + address[0] + ":" + str(address[1]), flush = True)
+                if current is not None: processes, datasets = __start_session(address, authkey, version, current[0], current[1], processes_number, daemon, cancelled, data_folder)
+            for pid, job_id in interrupts:
+                cancelled.add(job_id)
+                _interrupt_process(pid)
+            time.sleep(1 if board is not None else 5)
+    finally:
+        __stop_session(processes, datasets)
+
+
+# endregion
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or "-h" in sys.argv:
+        print("Usage: python -m core.training.executor <trainer host[:port]> [-p processes] [-d data folder] [-k authkey]")
+        print("The authkey is read from " + config.EXECUTOR_AUTHKEY_VARIABLE + " if not given")
+        exit(0)
+    arguments = dict(zip(sys.argv[2::2], sys.argv[3::2]))
+    authkey = arguments["-k"] if "-k" in arguments else os.environ.get(config.EXECUTOR_AUTHKEY_VARIABLE)
+    if not authkey:
+        print("Missing authkey, pass it with -k or set " + config.EXECUTOR_AUTHKEY_VARIABLE)
+        exit(1)
+    try:
+        serve_workers(sys.argv[1], authkey, int(arguments["-p"]) if "-p" in arguments else None, arguments.get("-d"))
+    except KeyboardInterrupt:
+        exit(0)
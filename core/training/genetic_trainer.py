@@ -1,20 +1,30 @@
 import copy
+import functools
+import itertools
 import json
 import math
 import multiprocessing
+import os
+import queue
 import random
 import time
-from itertools import repeat
-
-from numpy import genfromtxt
+from collections import OrderedDict
 
 import config
 from core import lib
 from core.bot import dataset_evaluator
 from core.bot.strategy import Strategy
 from core.bot.dataset_evaluator import TestResult
+from core.bot.indicator_store import get_dataset_hash
 from core.lib import ProgressBar
 from core.bot.wallet_handler import TestWallet
+from core.training import worker, checkpoint, validation, executor
+from core.training.migration import MigrationChannel, parse_address
+from core.training.scheduler import TaskScheduler
+from core.training.validation import Validator
+
+
+PENALTY_FITNESS = 0
 
 
 class Gene:
@@ -58,9 +68,24 @@ class _Individual:
         self.strategy_class = strategy_class
         self.fitness = 0
         self.test_result = None
+        self.test_results = None
 
     def build_strategy(self, initial_balance: int) -> Strategy:
-        return self.strategy_class(TestWallet.factory(initial_balance), **dict([(p.name, p.value) for p in self.genome]))
+        return self.strategy_class(TestWallet.factory(initial_balance), **dict(self.genes()))
+
+    def genes(self) -> list[tuple[str, float]]:
+        return [(p.name, p.value) for p in self.genome]
+
+    def genome_key(self) -> tuple:
+        """Hashable identity of the genome, equal genomes simulate to the same result"""
+        return tuple(p.value for p in self.genome)
+
+    def quantize(self, step: float):
+        """Snaps each bounded gene to a grid of 'step' times its range"""
+        for gene in self.genome:
+            span = gene.upper_bound - gene.lower_bound
+            if not math.isfinite(span) or span <= 0: continue
+            gene.value = gene.lower_bound + round((gene.value - gene.lower_bound) / (span * step)) * span * step
 
     def __str__(self):
         s = "Strategy: " + str(self.strategy_class)
@@ -68,22 +93,70 @@ class _Individual:
         for index, gene in enumerate(self.genome):
             s += str(gene) + "\n"
         s += "\nFitness: " + str(self.fitness)
-        s += "\n\nTest:\n" + str(self.test_result)
+        if self.test_results is not None and len(self.test_results) > 1:
+            for index, test_result in enumerate(self.test_results):
+                s += "\n\nTest on dataset " + str(index + 1) + ":\n" + str(test_result)
+        else:
+            s += "\n\nTest:\n" + str(self.test_result)
         return s
 
-    def calculate_fitness(self, test_result: TestResult) -> float:
-        self.test_result = test_result
-        positions_percentage = 0
-        for p in test_result.closed_positions:
-            val = p.result_percentage
-            # losses are 15% more serious
-            # if val < 0: val *= 1.15
-            positions_percentage += val
-        balance_ratio = test_result.final_balance / test_result.initial_balance
-        self.fitness = math.exp(balance_ratio * positions_percentage * math.pow(test_result.win_ratio + 1, 2.5) / (test_result.minutes / test_result.time_frame_minutes))
-        if self.fitness < 0: self.fitness = 0
+    def calculate_fitness(self, test_results) -> float:
+        """Fitness of the test result, or the mean fitness of the test results on the training datasets"""
+        self.test_results = test_results if isinstance(test_results, list) else [test_results]
+        self.test_result = self.test_results[0]
+        self.fitness = sum(self.__get_fitness(test_result) for test_result in self.test_results) / len(self.test_results)
         return self.fitness
 
+    @staticmethod
+    def __get_fitness(test_result: TestResult) -> float:
+        # Simulations interrupted or abandoned by the scheduler, and the ones on no bars
+        if test_result is None or test_result.minutes == 0: return PENALTY_FITNESS
+        positions_percentage = test_result.positions_percentage
+        balance_ratio = test_result.final_balance / test_result.initial_balance
+        fitness = math.exp(balance_ratio * positions_percentage * math.pow(test_result.win_ratio + 1, 2.5) / (test_result.minutes / test_result.time_frame_minutes))
+        return fitness if fitness > 0 else 0
+
+
+class FitnessCache:
+    """LRU cache of the test results of the simulated genomes without their trades, keyed by the gene values"""
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.__results = OrderedDict()
+
+    def get(self, key: tuple) -> list[TestResult]:
+        results = self.__results.get(key)
+        if results is not None:
+            self.__results.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return results
+
+    def put(self, key: tuple, results: list[TestResult]):
+        """Stores the test results of a genome on the training datasets, without their trades"""
+        if results is None or any(r is None for r in results): return
+        self.__results[key] = [r.compact(False) for r in results]
+        self.__results.move_to_end(key)
+        while self.capacity is not None and len(self.__results) > self.capacity:
+            self.__results.popitem(last = False)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0
+
+    def __len__(self):
+        return len(self.__results)
+
+    def __contains__(self, key):
+        return key in self.__results
+
 
 def train_strategy(strategy_class: type, ancestor_genome: list[Gene], data_path: str, result_path: str, **kwargs) -> any:
     # Optional parameters
@@ -98,109 +171,475 @@ def train_strategy(strategy_class: type, ancestor_genome: list[Gene], data_path:
     initial_balance = kwargs.get("initial_balance") if kwargs.get("initial_balance") is not None else 10000
     report_path = kwargs.get("report_path")
     validation_set_path = kwargs.get("validation_set_path") if kwargs.get("validation_set_path") is not None else None
+    validation_folds = kwargs.get("validation_folds") if kwargs.get("validation_folds") is not None else 1
+    validation_mode = kwargs.get("validation_mode") if kwargs.get("validation_mode") is not None else "k-fold"
+    validation_lead_in = kwargs.get("validation_lead_in") if kwargs.get("validation_lead_in") is not None else 1
+    validation_top = kwargs.get("validation_top") if kwargs.get("validation_top") is not None else 1
     validation_report_path = kwargs.get("validation_report_path") if kwargs.get("validation_report_path") is not None else None
+    closed_bars = kwargs.get("closed_bars") if kwargs.get("closed_bars") is not None else False
+    vectorized = kwargs.get("vectorized") if kwargs.get("vectorized") is not None else False
+    indicators_cache_mb = kwargs.get("indicators_cache_mb") if kwargs.get("indicators_cache_mb") is not None else 256
+    store_indicators = kwargs.get("store_indicators") if kwargs.get("store_indicators") is not None else True
+    fitness_cache_size = kwargs.get("fitness_cache_size") if kwargs.get("fitness_cache_size") is not None else 10000
+    fitness_cache = FitnessCache(fitness_cache_size) if (kwargs.get("fitness_cache") if kwargs.get("fitness_cache") is not None else True) else None
+    gene_quantization = kwargs.get("gene_quantization")
+    racing_segments = kwargs.get("racing_segments") if kwargs.get("racing_segments") is not None else 1
+    racing_keep = kwargs.get("racing_keep") if kwargs.get("racing_keep") is not None else 0.5
+    racing_metric = kwargs.get("racing_metric") if kwargs.get("racing_metric") is not None else "fitness"
+    evolution = kwargs.get("evolution") if kwargs.get("evolution") is not None else "generational"
+    islands_number = kwargs.get("islands") if kwargs.get("islands") is not None else 1
+    migration_interval = kwargs.get("migration_interval") if kwargs.get("migration_interval") is not None else 5
+    migrants_number = kwargs.get("migrants") if kwargs.get("migrants") is not None else 1
+    migration_authkey = kwargs.get("migration_authkey") if kwargs.get("migration_authkey") is not None else os.environ.get(config.MIGRATION_BROKER_AUTHKEY_VARIABLE)
+    checkpoint_path = kwargs.get("checkpoint_path") if kwargs.get("checkpoint_path") is not None else checkpoint.get_checkpoint_path(result_path)
+    checkpoint_interval = kwargs.get("checkpoint_interval") if kwargs.get("checkpoint_interval") is not None else 10
+    resume_path = kwargs.get("resume_path")
+    executor_mode = kwargs.get("executor") if kwargs.get("executor") is not None else "local"
+    executor_address = parse_address(kwargs.get("executor_address"), config.EXECUTOR_PORT, config.EXECUTOR_HOST)
+    executor_authkey = kwargs.get("executor_authkey") if kwargs.get("executor_authkey") is not None else os.environ.get(config.EXECUTOR_AUTHKEY_VARIABLE)
+    task_timeout = kwargs.get("task_timeout")
+    task_cap = kwargs.get("task_cap") if kwargs.get("task_cap") is not None else 1000
+    speculation = kwargs.get("speculation") if kwargs.get("speculation") is not None else True
+
+    if executor_mode == "remote" and not executor_authkey:
+        print("The remote executor needs an authkey, pass it or set " + config.EXECUTOR_AUTHKEY_VARIABLE)
+        return
+    if kwargs.get("migration_broker") is not None and not migration_authkey:
+        print("The migration broker needs an authkey, pass it or set " + config.MIGRATION_BROKER_AUTHKEY_VARIABLE)
+        return
+    if validation_mode not in validation.VALIDATION_MODES:
+        print("Unknown validation mode " + str(validation_mode) + ", the modes are " + ", ".join(validation.VALIDATION_MODES))
+        return
+    if vectorized and not closed_bars:
+        print("The vectorized engine trades as the event engine only on the closed bars, enable closed_bars or disable vectorized")
+        return
+    if evolution == "steady_state" and (islands_number > 1 or kwargs.get("migration_broker") is not None):
+        print("The steady state evolution has a single population, it does not support the islands and the migration")
+        return
+    migration_channel = MigrationChannel(kwargs.get("migration_broker"), migration_authkey) if kwargs.get("migration_broker") is not None else None
 
     population = []
+    pending = []
     champion = None
     epoch = 0
-    validation_data = None
-    validation_progress_bar = None
     current_validation = validation_interval
-    if validation_set_path is not None:
-        print("Loading validation set " + validation_set_path + "...")
-        validation_data = genfromtxt(validation_set_path, delimiter = config.DEFAULT_DELIMITER)
-        validation_progress_bar = ProgressBar.create(len(validation_data)).width(30).no_percentage().build()
-    print("Loading " + data_path + "...")
-    data = genfromtxt(data_path, delimiter = config.DEFAULT_DELIMITER)
-    if data is None: return
-    workers_pool = multiprocessing.Pool(processes_number)
-    progress_bar = ProgressBar.create(len(data)).width(50).no_percentage().build()
-
-    print("\nStarting " + str(processes_number) + " parallel simulations on " + str(data_path) + " | " + lib.get_flag_from_minutes(timeframe) + "\n")
-
-    # Instantiate random ancestors
-    for i in range(population_number):
-        population.append(_Individual(strategy_class, ancestor_genome))
-
-    __mutation(population, mutation_type, mutation_rate)
-
-    while epoch < float("inf"):
-        avg_fitness = 0
-        # Process data and run simulations
-        start = time.time()
-        print("Epoch " + str(epoch + 1))
-        progress_bar.reset()
-        test_results_async = workers_pool.starmap_async(
-            dataset_evaluator.evaluate,
-            zip([i.build_strategy(initial_balance) for i in population],
-                repeat(initial_balance),
-                repeat(data),
-                repeat(progress_bar.step),
-                repeat(1440),
-                repeat(timeframe),
-                range(population_number)))
-
-        test_results = test_results_async.get(timeout = 1000)
-        if test_results is None: break
-
-        end = time.time()
-        progress_bar.dispose()
-        print("Epoch " + str(epoch + 1) + " completed in " + "{:.3f}".format(end - start) + "s", flush = True)
-
-        # Compute fitness and results
-        for result, balance, index in test_results:
-            avg_fitness += population[index].calculate_fitness(result)
-
-        # Calculate champion
-        epoch_champion = max(population, key = lambda x: x.fitness)
-
-        if champion is None or epoch_champion.fitness > champion.fitness:
-            champion = copy.deepcopy(epoch_champion)
-            with open(result_path, "w") as res_out_file:
-                res_out_file.write(TrainingResult([g for g in epoch_champion.genome], epoch_champion.strategy_class.__name__, lib.get_flag_from_minutes(timeframe)).to_json())
-            # print("Evaluating champion...")
-            # res, i = dataset_evaluator.evaluate(epoch_champion.strategy, 1000, data, None, False, 0)
-            # print(str(res))
-        if report_path is not None:
-            with open(report_path, "w") as outfile:
-                outfile.write("Epoch champion:\n")
-                outfile.write(str(epoch_champion))
-                if champion is not None:
-                    outfile.write("\n\n" + "-" * 100 + "\n")
-                    outfile.write("\nChampion:\n")
-                    outfile.write(str(champion))
-
-        avg_fitness /= population_number
-        print("Average fitness: " + str(avg_fitness), flush = True)
-        print("Max fitness: " + str(epoch_champion.fitness), flush = True)
-        print("Champion fitness: " + str(champion.fitness), flush = True)
-        print("\n", flush = True)
-        # Crossover
-        population = __crossover(population, crossover_rate, crossover_operator)
-        # Mutation
+    if resume_path is not None:
+        state = checkpoint.load(resume_path)
+        if state is None: return
+        if state["strategy"] != strategy_class.__name__:
+            print("Checkpoint " + resume_path + " is a training of " + state["strategy"] + ", not of " + strategy_class.__name__)
+            return
+        population, pending, champion, epoch, current_validation = state["population"], state["pending"], state["champion"], state["epoch"], state["current_validation"]
+        if fitness_cache is not None and state["fitness_cache"] is not None:
+            fitness_cache = state["fitness_cache"]
+            fitness_cache.capacity = fitness_cache_size
+        random.setstate(state["random_state"])
+        # Generations are evaluated whole, the steady state keeps apart the evaluated individuals from the ones to evaluate
+        if evolution != state["evolution"]:
+            pending = population + pending if evolution == "steady_state" else []
+            population = [] if evolution == "steady_state" else population + pending
+        print("Resuming " + resume_path + " from epoch " + str(epoch + 1) + ", " + str(len(population) + len(pending)) + " individuals")
+    # Validation sets and training datasets, one or more paths in a list or separated by commas, are published for the workers
+    validation_paths = validation_set_path.split(",") if isinstance(validation_set_path, str) else validation_set_path if validation_set_path is not None else []
+    validation_sets = executor.publish_datasets(validation_paths, timeframe, closed_bars, vectorized, store_indicators)
+    # Each genome is simulated on all the training datasets
+    data_paths = data_path.split(",") if isinstance(data_path, str) else data_path
+    datasets = executor.publish_datasets(data_paths, timeframe, closed_bars, vectorized, store_indicators)
+    if len(datasets) < len(data_paths):
+        for path, dataset, store in datasets + validation_sets: dataset.dispose()
+        return
+    # The fitness in a checkpoint holds only for the same datasets and backtest settings
+    training = {"datasets": [get_dataset_hash(path) for path in data_paths], "timeframe": timeframe, "initial_balance": initial_balance, "closed_bars": closed_bars,
+                "vectorized": vectorized}
+    if resume_path is not None and state["training"] != training:
+        print("Checkpoint " + resume_path + " is a training with other " + ", ".join(k for k in training if state["training"].get(k) != training[k]))
+        for path, dataset, store in datasets + validation_sets: dataset.dispose()
+        return
+    save_checkpoint = None
+    if checkpoint_interval > 0:
+        save_checkpoint = functools.partial(__save_checkpoint, checkpoint_path, strategy_class, evolution, training, fitness_cache)
+    progress_bar = ProgressBar.create(sum(dataset.shape[0] for path, dataset, store in datasets)).width(50).no_percentage().build()
+    # Workers import the strategy and attach the datasets once, then only receive genomes
+    session = executor.Session(strategy_class.__module__, strategy_class.__name__, data_paths, [path for path, dataset, store in validation_sets], initial_balance, timeframe,
+                               closed_bars, vectorized, indicators_cache_mb, store_indicators)
+    workers_pool = executor.create(executor_mode, processes_number, session, datasets, validation_sets, progress_bar.step, executor_address, executor_authkey)
+    scheduler = TaskScheduler(workers_pool, processes_number, task_timeout, task_cap, speculation)
+    report_epoch = functools.partial(__report_epoch, result_path, report_path, timeframe, fitness_cache, scheduler)
+
+    validator = None
+    if len(validation_sets) > 0:
+        validator = Validator(workers_pool, validation_sets, validation.get_folds(validation_folds, validation_mode, validation_lead_in), validation_report_path)
+
+    print("\nStarting " + str(processes_number) + " parallel simulations on " + ", ".join(data_paths) + " | " + lib.get_flag_from_minutes(timeframe) + "\n")
+
+    # Instantiate random ancestors, the islands are consecutive slices of 'population_number' individuals
+    if resume_path is None:
+        for i in range(population_number * islands_number):
+            population.append(_Individual(strategy_class, ancestor_genome))
+
         __mutation(population, mutation_type, mutation_rate)
+        if evolution == "steady_state": population, pending = [], population
+
+    try:
+        if evolution == "steady_state":
+            breed = functools.partial(__breed, crossover_rate = crossover_rate, crossover_operator = crossover_operator, mutation_type = mutation_type, mutation_rate = mutation_rate)
+            __evolve_steady_state(scheduler, population, pending, population_number, len(datasets), vectorized, breed, report_epoch, fitness_cache, gene_quantization, progress_bar,
+                                  validator, validation_interval, validation_top, champion, epoch, current_validation, save_checkpoint, checkpoint_interval)
+            return
+        while epoch < float("inf"):
+            avg_fitness = 0
+            # Process data and run simulations
+            start = time.time()
+            print("Epoch " + str(epoch + 1))
+            progress_bar.reset()
+            if gene_quantization is not None:
+                for individual in population: individual.quantize(gene_quantization)
+            # Only the genomes never simulated are sent to the workers, once each
+            keys = [i.genome_key() for i in population]
+            cached_results = {}
+            pending = {}
+            if fitness_cache is not None: fitness_cache.reset_stats()
+            scheduler.reset_stats()
+            for index, key in enumerate(keys):
+                if key in pending or key in cached_results:
+                    # Duplicate of a genome of this epoch
+                    if fitness_cache is not None: fitness_cache.hits += 1
+                    continue
+                cached = fitness_cache.get(key) if fitness_cache is not None else None
+                if cached is not None:
+                    cached_results[key] = cached
+                else:
+                    pending[key] = index
+            genomes = [(index, population[index].genes()) for index in pending.values()]
+
+            test_results = []
+            stopped_results = []
+            if len(genomes) > 0:
+                if racing_segments > 1:
+                    test_results, stopped_results = __race(scheduler, population, genomes, len(datasets), vectorized, processes_number, racing_segments, racing_keep, racing_metric)
+                else:
+                    test_results = __evaluate_genomes(scheduler, genomes, len(datasets), vectorized, processes_number)
+
+            end = time.time()
+            progress_bar.dispose()
+            print("Epoch " + str(epoch + 1) + " completed in " + "{:.3f}".format(end - start) + "s", flush = True)
+
+            # Compute fitness and results, of each individual on all the datasets
+            for results, index in test_results:
+                cached_results[keys[index]] = results
+                if fitness_cache is not None: fitness_cache.put(keys[index], results)
+            # Individuals stopped by the racing keep their partial test, they rank below all the ones that ran the whole data
+            stopped = {}
+            for results, index in stopped_results:
+                stopped[keys[index]] = results
+            stopped_number = 0
+            for index, individual in enumerate(population):
+                if keys[index] in stopped:
+                    individual.calculate_fitness(stopped[keys[index]])
+                    individual.fitness = 0
+                    stopped_number += 1
+                else:
+                    avg_fitness += individual.calculate_fitness(cached_results[keys[index]])
+
+            # Calculate champion
+            epoch_champion = max(population, key = lambda x: x.fitness)
+            # The average is over the individuals that ran the whole data
+            champion = report_epoch(champion, epoch_champion, avg_fitness / (len(population) - stopped_number), stopped_number)
+            # Validation runs on the pool together with the next epochs
+            current_validation -= 1
+            if validator is not None and current_validation == 0:
+                validator.submit(epoch + 1, __get_validation_candidates(champion, population, validation_top))
+                current_validation = validation_interval
+            # Migration of the elites among the islands and the other trainers
+            if (epoch + 1) % migration_interval == 0 and (islands_number > 1 or migration_channel is not None):
+                __migrate(population, population_number, migrants_number, migration_channel, strategy_class, ancestor_genome)
+            # Crossover, each island breeds its own individuals
+            population = [child for i in range(0, len(population), population_number) for child in __crossover(population[i:i + population_number], crossover_rate, crossover_operator)]
+            # Mutation
+            __mutation(population, mutation_type, mutation_rate)
+            epoch += 1
+            if validator is not None and not validator.collect(): break
+            if save_checkpoint is not None and epoch % checkpoint_interval == 0:
+                save_checkpoint(epoch, population, [], champion, current_validation)
+
+    finally:
+        try:
+            # The validator owns the validation sets, its pending submissions are reported while the workers run
+            if validator is not None: validator.dispose()
+        finally:
+            workers_pool.terminate()
+            workers_pool.join()
+            for path, dataset, store in datasets: dataset.dispose()
+
+
+def __evolve_steady_state(scheduler: TaskScheduler, population: list[_Individual], ancestors: list[_Individual], population_number: int, datasets_number: int, vectorized: bool,
+                          breed, report_epoch, fitness_cache: FitnessCache, gene_quantization: float, progress_bar: ProgressBar, validator: Validator, validation_interval: int,
+                          validation_top: int = 1, champion: _Individual = None, epoch: int = 0, current_validation: int = None, save_checkpoint = None, checkpoint_interval: int = 1):
+    """Steady state evolution, each evaluated genome replaces the worst individual if fitter and a new child takes its worker"""
+    # Results of the workers, and of the genomes found in the fitness cache, as lists of (result, id, dataset)
+    completed = queue.Queue()
+    # Id -> (individual, genome key, results on the datasets, datasets still running, async results of the datasets)
+    in_flight = {}
+    tasks_in_flight = 0
+    identifiers = itertools.count()
+    epoch_champion = None
+    epoch_evaluations = 0
+    epoch_fitness = 0
+    if current_validation is None: current_validation = validation_interval
+    if fitness_cache is not None: fitness_cache.reset_stats()
+    scheduler.reset_stats()
+    start = time.time()
+    print("Epoch " + str(epoch + 1))
+    progress_bar.reset()
+    while True:
+        # Keep every worker busy, with the ancestors first and then with the children of the elite
+        while tasks_in_flight < scheduler.processes_number and (len(ancestors) > 0 or len(population) >= 2):
+            individual = ancestors.pop() if len(ancestors) > 0 else breed(population)
+            if gene_quantization is not None: individual.quantize(gene_quantization)
+            key = individual.genome_key()
+            identifier = next(identifiers)
+            tasks = {}
+            in_flight[identifier] = (individual, key, [None] * datasets_number, set(range(datasets_number)), tasks)
+            tasks_in_flight += datasets_number
+            cached = fitness_cache.get(key) if fitness_cache is not None else None
+            if cached is not None:
+                completed.put([(result, identifier, d) for d, result in enumerate(cached)])
+                continue
+            for d in range(datasets_number):
+                if vectorized:
+                    tasks[d] = scheduler.workers_pool.apply_async(worker.evaluate_population, ([(identifier, individual.genes())], 1, d),
+                                                        callback = lambda r, d = d: completed.put([(r[0][0], r[0][1], d)]), error_callback = completed.put)
+                else:
+                    tasks[d] = scheduler.workers_pool.apply_async(worker.evaluate_genome, (identifier, individual.genes(), d), callback = lambda r, d = d: completed.put([(r[0], r[1], d)]),
+                                                        error_callback = completed.put)
+
+        try:
+            results = completed.get(timeout = 1)
+        except queue.Empty:
+            results = []
+        if isinstance(results, BaseException): raise results
+        if scheduler.task_cap is not None:
+            # Tasks running over the cap are cancelled and completed with no result
+            now = time.monotonic()
+            for identifier, (individual, key, test_results, running, tasks) in in_flight.items():
+                for d in running:
+                    started = scheduler.workers_pool.started(tasks[d]) if d in tasks else None
+                    if started is None or now - started <= scheduler.task_cap: continue
+                    scheduler.workers_pool.cancel(tasks[d])
+                    scheduler.penalized += 1
+                    results = results + [(None, identifier, d)]
+        for result, identifier, d in results:
+            if identifier not in in_flight or d not in in_flight[identifier][3]: continue
+            individual, key, test_results, running, tasks = in_flight[identifier]
+            running.remove(d)
+            tasks_in_flight -= 1
+            test_results[d] = result
+            if len(running) > 0: continue
+            del in_flight[identifier]
+            if fitness_cache is not None: fitness_cache.put(key, test_results)
+            epoch_fitness += individual.calculate_fitness(test_results)
+            epoch_evaluations += 1
+            __replace_worst(population, individual, population_number)
+            if epoch_champion is None or individual.fitness > epoch_champion.fitness: epoch_champion = individual
+
+        if epoch_evaluations < population_number: continue
+        progress_bar.dispose()
+        print("Epoch " + str(epoch + 1) + " completed in " + "{:.3f}".format(time.time() - start) + "s", flush = True)
+        champion = report_epoch(champion, epoch_champion, epoch_fitness / epoch_evaluations)
         epoch += 1
         current_validation -= 1
-        if champion is not None and validation_set_path is not None and current_validation == 0:
-            print("Running champion on validation set")
-            validation_progress_bar.reset()
-            result, balance, index = dataset_evaluator.evaluate(champion.build_strategy(initial_balance), initial_balance, validation_data, validation_progress_bar.step, 1440, timeframe, 0)
-            if result is None: break
-            if validation_report_path is not None:
-                with open(validation_report_path, "a") as outfile:
-                    outfile.write("Validation " + str(epoch)+"\n")
-                    outfile.write(str(champion))
-                    outfile.write("\n\n" + "-" * 75 + "\n")
-                    outfile.write("\nTest on validation set:\n")
-                    outfile.write(str(result))
-                    outfile.write("\n\n" + "#" * 100 + "\n\n")
-
-            validation_progress_bar.dispose()
+        if validator is not None and current_validation == 0:
+            validator.submit(epoch, __get_validation_candidates(champion, population, validation_top))
             current_validation = validation_interval
-            print(str(result) + "\n")
+        if validator is not None and not validator.collect(): return
+        if save_checkpoint is not None and epoch % checkpoint_interval == 0:
+            # Individuals still being simulated are evaluated again on resume
+            save_checkpoint(epoch, population, [individual for individual, key, test_results, running, tasks in in_flight.values()] + ancestors, champion, current_validation)
+        epoch_champion = None
+        epoch_evaluations = 0
+        epoch_fitness = 0
+        if fitness_cache is not None: fitness_cache.reset_stats()
+        scheduler.reset_stats()
+        start = time.time()
+        print("Epoch " + str(epoch + 1))
+        progress_bar.reset()
+
+
+def __breed(population: list[_Individual], crossover_rate: float, crossover_operator: str, mutation_type: str, mutation_rate: float) -> _Individual:
+    """Returns a mutated child of the two best individuals, or a mutated copy of one of them"""
+    parent1, parent2 = __selection_operator(population)
+    if random.random() < crossover_rate:
+        genome = __crossover_operator(crossover_operator, parent1, parent2)
+    else:
+        genome = copy.deepcopy(parent1.genome if random.random() < 0.5 else parent2.genome)
+    child = _Individual(parent1.strategy_class, genome, False)
+    __mutation_operator(mutation_type, child, mutation_rate)
+    return child
+
+
+def __replace_worst(population: list[_Individual], individual: _Individual, population_number: int):
+    if len(population) < population_number:
+        population.append(individual)
+        return
+    worst = min(range(len(population)), key = lambda i: population[i].fitness)
+    if individual.fitness > population[worst].fitness: population[worst] = individual
+
+
+def __migrate(population: list[_Individual], island_size: int, migrants_number: int, channel: MigrationChannel, strategy_class: type, ancestor_genome: list[Gene]):
+    """Ring migration of the best individuals among the islands, and among the trainers through the channel if any"""
+    islands = [population[i:i + island_size] for i in range(0, len(population), island_size)]
+    elites = [sorted(island, key = lambda x: x.fitness, reverse = True)[:migrants_number] for island in islands]
+    if len(islands) > 1:
+        for index in range(len(islands)):
+            __replace_worsts(population, index * island_size, island_size, [copy.deepcopy(m) for m in elites[index - 1]])
+
+    if channel is None: return
+    best = sorted([m for island in elites for m in island], key = lambda x: x.fitness, reverse = True)[:migrants_number]
+    channel.send([(m.genes(), m.fitness) for m in best])
+    received = sorted(channel.receive(), key = lambda m: m[1], reverse = True)[:migrants_number]
+    if len(received) == 0: return
+    immigrants = []
+    for genes, fitness in received:
+        immigrant = _Individual(strategy_class, ancestor_genome)
+        values = dict(genes)
+        for gene in immigrant.genome:
+            if gene.name in values: gene.value = values[gene.name]
+        immigrant.fitness = fitness
+        immigrants.append(immigrant)
+    print("Received " + str(len(immigrants)) + " migrants", flush = True)
+    __replace_worsts(population, random.randrange(len(islands)) * island_size, island_size, immigrants)
+
+
+def __replace_worsts(population: list[_Individual], start: int, size: int, individuals: list[_Individual]):
+    worsts = sorted(range(start, min(start + size, len(population))), key = lambda i: population[i].fitness)
+    for index, individual in zip(worsts, individuals):
+        population[index] = individual
+
+
+def __save_checkpoint(path: str, strategy_class: type, evolution: str, training: dict, fitness_cache: FitnessCache, epoch: int, population: list[_Individual],
+                      pending: list[_Individual], champion: _Individual, current_validation: int):
+    checkpoint.save(path, {"strategy": strategy_class.__name__, "evolution": evolution, "training": training, "epoch": epoch, "population": population, "pending": pending, "champion": champion,
+                           "fitness_cache": fitness_cache, "random_state": random.getstate(), "current_validation": current_validation})
+
+
+def __report_epoch(result_path: str, report_path: str, timeframe: int, fitness_cache: FitnessCache, scheduler: TaskScheduler, champion: _Individual, epoch_champion: _Individual,
+                   avg_fitness: float, stopped_number: int = 0) -> _Individual:
+    """Prints the outcome of an epoch and writes the reports, returns the champion"""
+    champion = __update_champion(champion, epoch_champion, result_path, timeframe)
+    __write_report(report_path, epoch_champion, champion, fitness_cache)
+    print("Average fitness: " + str(avg_fitness), flush = True)
+    if stopped_number > 0: print("Stopped by the racing: " + str(stopped_number), flush = True)
+    print("Max fitness: " + str(epoch_champion.fitness), flush = True)
+    print("Champion fitness: " + str(champion.fitness), flush = True)
+    if fitness_cache is not None: print("Fitness cache: " + __cache_summary(fitness_cache), flush = True)
+    print("Tasks: " + scheduler.summary(), flush = True)
+    print("\n", flush = True)
+    return champion
+
+
+def __update_champion(champion: _Individual, epoch_champion: _Individual, result_path: str, timeframe: int) -> _Individual:
+    """Returns the best individual so far, writing the result file when the champion changes"""
+    if champion is not None and epoch_champion.fitness <= champion.fitness: return champion
+    with open(result_path, "w") as res_out_file:
+        res_out_file.write(TrainingResult([g for g in epoch_champion.genome], epoch_champion.strategy_class.__name__, lib.get_flag_from_minutes(timeframe)).to_json())
+    # print("Evaluating champion...")
+    # res, i = dataset_evaluator.evaluate(epoch_champion.strategy, 1000, data, None, False, 0)
+    # print(str(res))
+    return copy.deepcopy(epoch_champion)
+
+
+def __write_report(report_path: str, epoch_champion: _Individual, champion: _Individual, fitness_cache: FitnessCache):
+    if report_path is None: return
+    with open(report_path, "w") as outfile:
+        outfile.write("Epoch champion:\n")
+        outfile.write(str(epoch_champion))
+        if champion is not None:
+            outfile.write("\n\n" + "-" * 100 + "\n")
+            outfile.write("\nChampion:\n")
+            outfile.write(str(champion))
+        if fitness_cache is not None:
+            outfile.write("\n\n" + "-" * 100 + "\n")
+            outfile.write("\nFitness cache: " + __cache_summary(fitness_cache) + "\n")
+
+
+def __get_validation_candidates(champion: _Individual, population: list[_Individual], top: int) -> list[_Individual]:
+    """Returns the champion followed by the best individuals of the population with a different genome, 'top' at most"""
+    candidates = [champion]
+    keys = {champion.genome_key()}
+    for individual in sorted(population, key = lambda x: x.fitness, reverse = True):
+        if len(candidates) >= top: break
+        if individual.genome_key() in keys: continue
+        keys.add(individual.genome_key())
+        candidates.append(individual)
+    return candidates
+
+
+def __evaluate_genomes(scheduler: TaskScheduler, genomes: list[tuple[int, list[tuple[str, float]]]], datasets_number: int, vectorized: bool, processes_number: int,
+                       fraction: float = 1, states: dict = None) -> list[tuple[list[TestResult], int]]:
+    """Simulates the genomes on all the training datasets, resuming from the evaluator checkpoints in 'states' if any
+
+    Returns:
+        The test results on the datasets and the index of each genome, None for the tasks abandoned by the scheduler
+    """
+    if vectorized:
+        # Each worker simulates a whole slice of the population on a dataset in a single pass
+        batches = [(genomes[b::processes_number], fraction, d) for d in range(datasets_number) for b in range(min(processes_number, len(genomes)))]
+        results = scheduler.run(worker.evaluate_population, batches)
+        # An abandoned batch penalizes all of its genomes
+        results = [(result, index, task[2]) for batch, task in zip(results, batches) for result, index in (batch if batch is not None else [(None, i) for i, genes in task[0]])]
+    elif states is not None:
+        tasks = [(index, genes, states.get((index, d)), fraction, d) for index, genes in genomes for d in range(datasets_number)]
+        results = scheduler.run(worker.race_genome, tasks)
+        for result, task in zip(results, tasks): states[(task[0], task[4])] = result[1] if result is not None else None
+        results = [(result[0] if result is not None else None, task[0], task[4]) for result, task in zip(results, tasks)]
+    else:
+        tasks = [(index, genes, d) for index, genes in genomes for d in range(datasets_number)]
+        results = scheduler.run(worker.evaluate_genome, tasks)
+        results = [(result[0] if result is not None else None, task[0], task[2]) for result, task in zip(results, tasks)]
+
+    test_results = dict((index, [None] * datasets_number) for index, genes in genomes)
+    for result, index, d in results:
+        test_results[index][d] = result
+    return [(test_results[index], index) for index, genes in genomes]
+
+
+def __race(scheduler: TaskScheduler, population: list[_Individual], genomes: list[tuple[int, list[tuple[str, float]]]], datasets_number: int, vectorized: bool,
+           processes_number: int, segments: int, keep: float, metric: str) -> [list, list]:
+    """Successive halving, after each segment of the dataset only the best 'keep' fraction of the genomes continues
+
+    Returns:
+        The (results, index) of the genomes that ran the whole dataset and the partial ones of the stopped genomes
+    """
+    racing = genomes
+    # Evaluator checkpoints of each (index, dataset)
+    states = {}
+    stopped = []
+    survivors_trend = [str(len(racing))]
+    for segment in range(1, segments + 1):
+        fraction = segment / segments
+        results = __evaluate_genomes(scheduler, racing, datasets_number, vectorized, processes_number, fraction, states)
+        if segment == segments: break
+
+        if metric == "drawdown":
+            # The worst drawdown among the datasets
+            score = lambda r: -max(result.max_drawdown for result in r[0]) if None not in r[0] else -math.inf
+        else:
+            score = lambda r: population[r[1]].calculate_fitness(r[0]) if None not in r[0] else -math.inf
+        ranked = sorted(results, key = score, reverse = True)
+        survivors = max(1, math.ceil(len(ranked) * keep))
+        stopped += ranked[survivors:]
+        for result, index in ranked[survivors:]:
+            for d in range(datasets_number): states.pop((index, d), None)
+        survivors = set(index for result, index in ranked[:survivors])
+        racing = [(index, genes) for index, genes in racing if index in survivors]
+        survivors_trend.append(str(len(racing)))
+    print("Racing: " + " -> ".join(survivors_trend) + " genomes", flush = True)
+    return results, stopped
+
 
-    workers_pool.terminate()
-    workers_pool.join()
+def __cache_summary(fitness_cache: FitnessCache) -> str:
+    requests = fitness_cache.hits + fitness_cache.misses
+    return "{:d}/{:d} hits ({:.1f}%), {:d} genomes".format(fitness_cache.hits, requests, fitness_cache.hit_rate() * 100, len(fitness_cache))
 
 
 def __selection_operator(population: list[_Individual]) -> [_Individual, _Individual]:
@@ -242,10 +681,10 @@ def __crossover_operator(key: str, parent1: _Individual, parent2: _Individual) -
 
     elif key == "s-point":
         point = random.randint(0, len(parent1.genome) - 1)
-        for i in parent1.genome[:point]:
-            new_genome.append(i)
-        for i in parent1.genome[point:]:
-            new_genome.append(i)
+        for g in parent1.genome[:point]:
+            new_genome.append(Gene(g.name, g.lower_bound, g.upper_bound, g.value))
+        for g in parent2.genome[point:]:
+            new_genome.append(Gene(g.name, g.lower_bound, g.upper_bound, g.value))
 
     return new_genome
 
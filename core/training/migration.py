@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import socket
+import sys
+from multiprocessing.managers import BaseManager
+
+import config
+
+
+class MigrationBoard:
+    """Latest elites posted by each island, kept by the broker
+
+    Migrants are (genes, fitness) pairs, with the genes as (name, value) pairs. Each post replaces the previous one of the
+    same island and increases its version, so an island only takes the elites it has not seen yet.
+    """
+
+    def __init__(self):
+        self.__posts = {}
+
+    def post(self, island: str, migrants: list):
+        version = self.__posts[island][0] + 1 if island in self.__posts else 0
+        self.__posts[island] = (version, migrants)
+
+    def collect(self, island: str) -> list:
+        """Returns the (island, version, migrants) posted by the other islands"""
+        return [(other, version, migrants) for other, (version, migrants) in self.__posts.items() if other != island]
+
+
+class _BrokerServer(BaseManager):
+    pass
+
+
+class _BrokerClient(BaseManager):
+    pass
+
+
+_BrokerClient.register("board")
+
+
+def parse_address(address: str, default_port: int = config.MIGRATION_BROKER_PORT, default_host: str = "localhost") -> tuple[str, int]:
+    """Returns the (host, port) of a 'host:port', 'host' or ':port' address"""
+    host, _, port = address.partition(":") if address is not None else ("", "", "")
+    return host if host != "" else default_host, int(port) if port != "" else default_port
+
+
+def serve(address: tuple[str, int], authkey: str):
+    """Runs the broker in the current process until interrupted, only the trainers sharing the secret 'authkey' are accepted"""
+    if not authkey: raise ValueError("The migration broker needs an authkey")
+    board = MigrationBoard()
+    _BrokerServer.register("board", callable = lambda: board)
+    server = _BrokerServer(address = address, authkey = authkey.encode()).get_server()
+    print("Migration broker listening on " + address[0] + ":" + str(address[1]), flush = True)
+    server.serve_forever()
+
+
+class MigrationChannel:
+    """Connection of the islands of a trainer to a broker, shared with the trainers of other machines"""
+
+    def __init__(self, address: str, authkey: str, island: str = None):
+        self.address = parse_address(address)
+        self.island = island if island is not None else socket.gethostname() + "-" + str(os.getpid())
+        self.__authkey = authkey.encode()
+        self.__board = None
+        self.__seen = {}
+
+    def __connect(self) -> bool:
+        if self.__board is not None: return True
+        try:
+            client = _BrokerClient(address = self.address, authkey = self.__authkey)
+            client.connect()
+            self.__board = client.board()
+            return True
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as error:
+            print("Unable to reach the migration broker at " + self.address[0] + ":" + str(self.address[1]) + ", " + str(error), flush = True)
+            return False
+
+    def send(self, migrants: list):
+        """Posts the elites of the trainer, as (genes, fitness) pairs"""
+        if not self.__connect(): return
+        try:
+            self.__board.post(self.island, migrants)
+        except (OSError, EOFError) as error:
+            print("Migration broker lost, " + str(error), flush = True)
+            self.__board = None
+
+    def receive(self) -> list:
+        """Returns the migrants posted by the other trainers since the last call"""
+        if not self.__connect(): return []
+        try:
+            posts = self.__board.collect(self.island)
+        except (OSError, EOFError) as error:
+            print("Migration broker lost, " + str(error), flush = True)
+            self.__board = None
+            return []
+        migrants = []
+        for island, version, island_migrants in posts:
+            if self.__seen.get(island) == version: continue
+            self.__seen[island] = version
+            migrants.extend(island_migrants)
+        return migrants
+
+
+if __name__ == "__main__":
+    if "-h" in sys.argv:
+        print("Usage: python -m core.training.migration [-a host:port] [-k authkey]")
+        print("The broker listens on " + config.MIGRATION_BROKER_HOST + ":" + str(config.MIGRATION_BROKER_PORT) + " by default, the authkey is read from " +
+              config.MIGRATION_BROKER_AUTHKEY_VARIABLE + " if not given")
+        exit(0)
+    arguments = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+    authkey = arguments["-k"] if "-k" in arguments else os.environ.get(config.MIGRATION_BROKER_AUTHKEY_VARIABLE)
+    if not authkey:
+        print("Missing authkey, pass it with -k or set " + config.MIGRATION_BROKER_AUTHKEY_VARIABLE)
+        exit(1)
+    try:
+        serve(parse_address(arguments.get("-a"), config.MIGRATION_BROKER_PORT, config.MIGRATION_BROKER_HOST), authkey)
+    except KeyboardInterrupt:
+        exit(0)
@@ -0,0 +1,88 @@
+import queue
+import time
+
+POLL_INTERVAL = 0.05
+
+
+class TaskScheduler:
+    """Runs the tasks of an epoch on the executor, copying the stragglers on idle workers and abandoning the ones over the cap"""
+
+    def __init__(self, workers_pool, processes_number: int, task_timeout: float = None, task_cap: float = None, speculation: bool = True, speculation_factor: float = 2):
+        self.workers_pool = workers_pool
+        self.processes_number = processes_number
+        self.task_timeout = task_timeout
+        self.task_cap = task_cap
+        self.speculation = speculation
+        self.speculation_factor = speculation_factor
+        self.wall_time = 0
+        self.straggler_time = 0
+        self.speculated = 0
+        self.penalized = 0
+
+    def run(self, function, tasks: list[tuple]) -> list:
+        """Runs 'function' on the arguments of each task, returns the results in order, None for the abandoned tasks"""
+        completed = queue.Queue()
+        results = [None] * len(tasks)
+        remaining = set(range(len(tasks)))
+        # Async results of the copies of each task, the first one is the original
+        copies = dict((index, []) for index in remaining)
+        durations = []
+        start = time.monotonic()
+        drained = None
+        workers = min(self.processes_number, len(tasks))
+        for index, args in enumerate(tasks):
+            self.__submit(completed, function, index, args, copies[index])
+
+        while len(remaining) > 0:
+            try:
+                index, copy, value = completed.get(timeout = POLL_INTERVAL)
+                if isinstance(value, BaseException): raise value
+                if index in remaining:
+                    remaining.remove(index)
+                    results[index] = value
+                    started = self.workers_pool.started(copies[index][copy])
+                    if started is not None: durations.append(time.monotonic() - started)
+                    self.__cancel(copies[index], copy)
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            # From the drain on, the workers that complete go idle
+            if drained is None and len(remaining) < workers: drained = now
+            # Times run from the pickup, the timeout defaults to 'speculation_factor' times the mean task time
+            deadline = self.task_timeout
+            if deadline is None and len(durations) > 0: deadline = self.speculation_factor * sum(durations) / len(durations)
+            for index in list(remaining):
+                started = self.workers_pool.started(copies[index][0])
+                if started is None: continue
+                running_time = now - started
+                if self.task_cap is not None and running_time > self.task_cap:
+                    remaining.remove(index)
+                    self.penalized += 1
+                    self.__cancel(copies[index])
+                elif self.speculation and deadline is not None and len(copies[index]) == 1 and running_time > deadline and sum(len(copies[i]) for i in remaining) < self.processes_number:
+                    self.speculated += 1
+                    self.__submit(completed, function, index, tasks[index], copies[index])
+
+        end = time.monotonic()
+        self.wall_time += end - start
+        if drained is not None: self.straggler_time += end - drained
+        return results
+
+    def reset_stats(self):
+        self.wall_time = 0
+        self.straggler_time = 0
+        self.speculated = 0
+        self.penalized = 0
+
+    def summary(self) -> str:
+        lost = self.straggler_time / self.wall_time * 100 if self.wall_time > 0 else 0
+        return "{:.3f}s lost to stragglers ({:.1f}%), {:d} speculated, {:d} penalized".format(self.straggler_time, lost, self.speculated, self.penalized)
+
+    def __submit(self, completed: queue.Queue, function, index: int, args: tuple, copies: list):
+        copy = len(copies)
+        copies.append(self.workers_pool.apply_async(function, args, callback = lambda value: completed.put((index, copy, value)),
+                                                    error_callback = lambda error: completed.put((index, copy, error))))
+
+    def __cancel(self, copies: list, kept: int = None):
+        for copy, result in enumerate(copies):
+            if copy != kept: self.workers_pool.cancel(result)
@@ -0,0 +1,66 @@
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    """Opens an existing block without registering it to the resource tracker, only the publisher unlinks it
+
+    Unregistering after the open would also drop the registration of the publisher when the tracker is shared with it, as
+    in the workers of a pool, so the registration is skipped instead, as 'track = False' does from Python 3.13.
+    """
+    if sys.version_info >= (3, 13): return shared_memory.SharedMemory(name = name, track = False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda resource, kind: register(resource, kind) if kind != "shared_memory" else None
+    try:
+        return shared_memory.SharedMemory(name = name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedDataset:
+    """Candle matrix published once in shared memory and attached zero-copy by the workers"""
+
+    def __init__(self, name: str, shape: tuple, dtype: str, order: str = "C"):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.order = order
+        self.__memory = None
+        self.__owner = False
+
+    @classmethod
+    def publish(cls, data: numpy.ndarray):
+        """Copies the data into a new shared memory block, the caller owns it and has to dispose it"""
+        order = "F" if data.flags["F_CONTIGUOUS"] and not data.flags["C_CONTIGUOUS"] else "C"
+        memory = shared_memory.SharedMemory(create = True, size = max(data.nbytes, 1))
+        dataset = cls(memory.name, data.shape, data.dtype.str, order)
+        dataset.__memory = memory
+        dataset.__owner = True
+        dataset.array()[...] = data
+        return dataset
+
+    def attach(self) -> numpy.ndarray:
+        """Maps the shared block in the current process and returns it as a read only array"""
+        if self.__memory is None:
+            self.__memory = _open_untracked(self.name)
+        data = self.array()
+        data.flags.writeable = False
+        return data
+
+    def array(self) -> numpy.ndarray:
+        return numpy.ndarray(self.shape, dtype = numpy.dtype(self.dtype), buffer = self.__memory.buf, order = self.order)
+
+    def dispose(self):
+        if self.__memory is None: return
+        self.__memory.close()
+        if self.__owner: self.__memory.unlink()
+        self.__memory = None
+
+    def __getstate__(self):
+        # Only the descriptor travels to the workers
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype, "order": self.order}
+
+    def __setstate__(self, state):
+        self.__init__(state["name"], state["shape"], state["dtype"], state["order"])
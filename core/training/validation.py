@@ -0,0 +1,116 @@
+import copy
+import math
+import os
+
+from core.bot.dataset_evaluator import TestResult
+from core.bot.indicator_store import IndicatorStore
+from core.training import worker
+from core.training.shared_dataset import SharedDataset
+
+
+VALIDATION_MODES = ["k-fold", "rolling"]
+
+
+def get_folds(folds_number: int, mode: str = "k-fold", lead_in_ratio: float = 1) -> list[tuple[float, float, float]]:
+    """Returns the (lead-in start, test start, test end) of each fold as fractions of the dataset, consecutive windows with
+    'k-fold', rolling windows each run after 'lead_in_ratio' unmeasured windows with 'rolling'"""
+    folds_number = max(1, int(folds_number))
+    if mode == "rolling":
+        size = 1 / (folds_number + lead_in_ratio)
+        return [(i * size, (i + lead_in_ratio) * size, min(1, (i + lead_in_ratio + 1) * size)) for i in range(folds_number)]
+    size = 1 / folds_number
+    return [(i * size, i * size, min(1, (i + 1) * size)) for i in range(folds_number)]
+
+
+class _Submission:
+
+    def __init__(self, epoch: int, individuals: list):
+        self.epoch = epoch
+        self.individuals = individuals
+        # (individual, dataset, fold) -> async result
+        self.tests = {}
+
+
+class Validator:
+    """Out-of-sample tests of the best genomes on the folds of the validation datasets, run by the training pool"""
+
+    def __init__(self, workers_pool, datasets: list[tuple[str, SharedDataset, IndicatorStore]], folds: list[tuple[float, float, float]], report_path: str = None):
+        self.workers_pool = workers_pool
+        self.datasets = datasets
+        self.folds = folds
+        self.report_path = report_path
+        self.__submissions = []
+
+    def submit(self, epoch: int, individuals: list):
+        """Dispatches the tests of the individuals on all the folds of all the datasets"""
+        # Copies, the genomes of the population are mutated in place while the tests run
+        submission = _Submission(epoch, copy.deepcopy(individuals))
+        for i, individual in enumerate(submission.individuals):
+            for d in range(len(self.datasets)):
+                for f, fold in enumerate(self.folds):
+                    submission.tests[(i, d, f)] = self.workers_pool.apply_async(worker.validate_genome, (i, individual.genes(), d, fold))
+        self.__submissions.append(submission)
+        print("Validating " + str(len(individuals)) + " genomes on " + str(len(submission.tests)) + " folds", flush = True)
+
+    def collect(self, wait: bool = False) -> bool:
+        """Reports the submissions whose tests are all completed, returns False if a test has been interrupted"""
+        while len(self.__submissions) > 0:
+            submission = self.__submissions[0]
+            if not wait and not all(test.ready() for test in submission.tests.values()): return True
+            results = {}
+            for (i, d, f), test in submission.tests.items():
+                try:
+                    results[(i, d, f)] = test.get()[0]
+                except Exception as e:
+                    # A failed fold is left out of the report, the other folds are still reported
+                    print("Validation " + str(submission.epoch) + ", genome " + str(i + 1) + " failed on fold " + str(f + 1) + " of " + self.datasets[d][0] + ": " + repr(e),
+                          flush = True)
+            if any(result is None for result in results.values()): return False
+            self.__report(submission, results)
+            self.__submissions.pop(0)
+        return True
+
+    def pending(self) -> int:
+        return len(self.__submissions)
+
+    def dispose(self):
+        """Reports the pending submissions and releases the validation sets, the workers have to be still running"""
+        try:
+            self.collect(wait = True)
+        finally:
+            self.__submissions.clear()
+            for path, dataset, store in self.datasets:
+                dataset.dispose()
+
+    def __report(self, submission: _Submission, results: dict[tuple[int, int, int], TestResult]):
+        report = ""
+        for i, individual in enumerate(submission.individuals):
+            individual_results = [(d, f, results[(i, d, f)]) for d in range(len(self.datasets)) for f in range(len(self.folds)) if (i, d, f) in results]
+            if len(individual_results) == 0:
+                print("Validation " + str(submission.epoch) + ", genome " + str(i + 1) + ": all the folds failed", flush = True)
+                continue
+            failed = len(self.datasets) * len(self.folds) - len(individual_results)
+            profits = [get_profit_percentage(result) for d, f, result in individual_results]
+            mean = sum(profits) / len(profits)
+            deviation = math.sqrt(sum((p - mean) ** 2 for p in profits) / len(profits))
+            print("Validation " + str(submission.epoch) + ", genome " + str(i + 1) + ": profit {:.3f}% (min {:.3f}%, std {:.3f}) over {:d} folds".format(mean, min(profits), deviation, len(profits)) +
+                  (", {:d} failed".format(failed) if failed > 0 else ""), flush = True)
+            report += "Genome " + str(i + 1) + "\n" + str(individual) + "\n\n" + "-" * 75 + "\n"
+            report += "\n{:<25s}{:>6s}{:>10s}{:>12s}{:>12s}{:>12s}{:>14s}\n".format("Dataset", "Fold", "Days", "Profit %", "Win rate %", "Positions", "Drawdown %")
+            for d, f, result in individual_results:
+                report += "{:<25s}{:>6d}{:>10.2f}{:>12.3f}{:>12.3f}{:>12d}{:>14.3f}\n".format(os.path.basename(self.datasets[d][0])[:24], f + 1, result.days, get_profit_percentage(result),
+                                                                                          result.win_ratio * 100, result.opened_positions, result.max_drawdown * 100)
+            report += "\n{:<25s}{:>6s}{:>10s}{:>12.3f}{:>12.3f}{:>12.1f}{:>14.3f}\n".format("Mean", "", "", mean, sum(r.win_ratio for d, f, r in individual_results) * 100 / len(profits),
+                                                                                           sum(r.opened_positions for d, f, r in individual_results) / len(profits),
+                                                                                           sum(r.max_drawdown for d, f, r in individual_results) * 100 / len(profits))
+            report += "{:<25s}{:>6s}{:>10s}{:>12.3f}\n".format("Min", "", "", min(profits))
+            report += "{:<25s}{:>6s}{:>10s}{:>12.3f}\n\n".format("Std", "", "", deviation)
+        if self.report_path is not None:
+            with open(self.report_path, "a") as outfile:
+                outfile.write("Validation " + str(submission.epoch) + "\n")
+                outfile.write(report)
+                outfile.write("#" * 100 + "\n\n")
+
+
+def get_profit_percentage(result: TestResult) -> float:
+    return (result.final_balance / result.initial_balance - 1) * 100 if result.initial_balance != 0 else 0
@@ -0,0 +1,157 @@
+import importlib
+
+from core.bot import vector_evaluator, bar_pyramid, dataset_evaluator
+from core.bot.indicator_cache import IndicatorCache, MEGABYTE
+from core.bot.indicator_store import IndicatorStore
+from core.bot.dataset_evaluator import TestResult, EvaluationState
+from core.bot.wallet_handler import TestWallet
+from core.training.shared_dataset import SharedDataset
+
+
+class _WorkerDataset:
+    """Dataset attached by a worker, with the bars and the exit candles of the vectorized engine"""
+
+    def __init__(self, dataset: SharedDataset, timeframe: int, closed_bars: bool, vectorized: bool, indicators_store: IndicatorStore = None):
+        self.dataset = dataset
+        self.data = dataset.attach()
+        # The vectorized engine takes signals on the bars and, if available, checks the exits on the 1m candles
+        self.bars = None
+        self.exits_data = None
+        if vectorized:
+            self.bars = self.data if closed_bars else bar_pyramid.resample(self.data, timeframe)
+            self.exits_data = None if closed_bars else self.data
+        # Indicators stored next to the dataset by previous runs, shared with the other workers
+        self.indicators_store = indicators_store
+
+
+class WorkerContext:
+    """State loaded once when a training worker starts and reused by all of its tasks"""
+
+    def __init__(self, strategy_class: type, datasets: list[SharedDataset], initial_balance: float, timeframe: int, progress_delegate = None, closed_bars: bool = False,
+                 vectorized: bool = False, indicators_cache_mb: int = 256, indicators_stores: list[IndicatorStore] = None, validation_datasets: list[SharedDataset] = None,
+                 validation_stores: list[IndicatorStore] = None):
+        self.strategy_class = strategy_class
+        self.initial_balance = initial_balance
+        self.timeframe = timeframe
+        self.progress_delegate = progress_delegate
+        self.closed_bars = closed_bars
+        self.vectorized = vectorized
+        # With closed bars the datasets already contain the bars of the timeframe
+        self.evaluator = vector_evaluator.get_evaluator(closed_bars, vectorized)
+        if indicators_stores is None: indicators_stores = [None] * len(datasets)
+        self.datasets = [_WorkerDataset(dataset, timeframe, closed_bars, vectorized, store) for dataset, store in zip(datasets, indicators_stores)]
+        # Indicator series of the genomes sharing the indicator genes, kept across batches and epochs
+        self.indicators_cache = IndicatorCache(indicators_cache_mb * MEGABYTE)
+        if validation_datasets is None: validation_datasets = []
+        if validation_stores is None: validation_stores = [None] * len(validation_datasets)
+        self.validation_sets = [_WorkerDataset(dataset, timeframe, closed_bars, vectorized, store) for dataset, store in zip(validation_datasets, validation_stores)]
+
+    def build_strategy(self, genes: list[tuple[str, float]]):
+        return self.strategy_class(TestWallet.factory(self.initial_balance), **dict(genes))
+
+
+__context: WorkerContext = None
+
+
+def initialize(strategy_module: str, strategy_name: str, datasets: list[SharedDataset], initial_balance: float, timeframe: int, progress_delegate = None, closed_bars: bool = False,
+               vectorized: bool = False, indicators_cache_mb: int = 256, indicators_stores: list[IndicatorStore] = None, validation_datasets: list[SharedDataset] = None,
+               validation_stores: list[IndicatorStore] = None):
+    """Pool initializer, imports the strategy class and attaches the shared training and validation datasets"""
+    global __context
+    strategy_class = getattr(importlib.import_module(strategy_module), strategy_name)
+    __context = WorkerContext(strategy_class, datasets, initial_balance, timeframe, progress_delegate, closed_bars, vectorized, indicators_cache_mb, indicators_stores,
+                              validation_datasets, validation_stores)
+
+
+def evaluate_genome(index: int, genes: list[tuple[str, float]], dataset_index: int = 0) -> [TestResult, int]:
+    """Simulates a genome on a dataset of the worker
+
+    Parameters:
+        index (int): index of the individual in the population
+        genes (list): (name, value) pairs of the genome
+        dataset_index (int): index of the training dataset
+
+    Returns:
+        The compact test result and the index of the individual
+    """
+    strategy = __context.build_strategy(genes)
+    data = __context.datasets[dataset_index].data
+    result, balance, index = __context.evaluator(strategy, __context.initial_balance, data, __context.progress_delegate, 1440, __context.timeframe, index)
+    return (result.compact() if result is not None else None), index
+
+
+def race_genome(index: int, genes: list[tuple[str, float]], state: EvaluationState, fraction: float, dataset_index: int = 0) -> [TestResult, EvaluationState, int]:
+    """Simulates a genome up to a fraction of the worker dataset, resuming from the checkpoint of the previous segment
+
+    Parameters:
+        index (int): index of the individual in the population
+        genes (list): (name, value) pairs of the genome
+        state (EvaluationState): checkpoint returned by the previous segment, None to start from the beginning
+        fraction (float): fraction of the dataset at which the segment ends
+        dataset_index (int): index of the training dataset
+
+    Returns:
+        The compact test result up to the end of the segment, the checkpoint to resume from (None if interrupted) and the index
+    """
+    data = __context.datasets[dataset_index].data
+    if state is None: state = EvaluationState(__context.build_strategy(genes), None if __context.closed_bars else data)
+    end = int(round(len(data) * fraction))
+    evaluate_segment = dataset_evaluator.evaluate_bars_segment if __context.closed_bars else dataset_evaluator.evaluate_segment
+    if not evaluate_segment(state, data, end, __context.progress_delegate, 1440, __context.timeframe, index):
+        return None, None, index
+    minutes = dataset_evaluator.get_bars_minutes(data, end) if __context.closed_bars else end
+    result = TestResult.construct(state.strategy, __context.initial_balance, minutes, __context.timeframe)
+    return result.compact(), state, index
+
+
+def evaluate_population(batch: list[tuple[int, list[tuple[str, float]]]], fraction: float = 1, dataset_index: int = 0) -> list[tuple[TestResult, int]]:
+    """Simulates a batch of genomes together with the vectorized population engine
+
+    Parameters:
+        batch (list): (index, genes) of each individual
+        fraction (float): fraction of the bars to simulate, from the first one
+        dataset_index (int): index of the training dataset
+
+    Returns:
+        The compact test result and the index of each individual
+    """
+    strategies = [__context.build_strategy(genes) for index, genes in batch]
+    dataset = __context.datasets[dataset_index]
+    end = int(round(len(dataset.bars) * fraction))
+    results = vector_evaluator.evaluate_population(strategies, __context.initial_balance, dataset.bars, __context.timeframe, dataset.exits_data,
+                                                   __context.indicators_cache, dataset.dataset.name, dataset.indicators_store, end)
+    if __context.progress_delegate is not None: __context.progress_delegate(len(dataset.data))
+    return [((result.compact() if result is not None else None), index) for result, (index, genes) in zip(results, batch)]
+
+
+def validate_genome(index: int, genes: list[tuple[str, float]], dataset_index: int, fold: tuple[float, float, float]) -> [TestResult, int]:
+    """Tests a genome on a fold of a validation dataset
+
+    Parameters:
+        index (int): identifier of the test
+        genes (list): (name, value) pairs of the genome
+        dataset_index (int): index of the validation dataset
+        fold (tuple): lead-in start, test start and test end as fractions of the dataset, only the positions closed in the test are measured
+
+    Returns:
+        The compact test result and the identifier
+    """
+    validation_set = __context.validation_sets[dataset_index]
+    data = validation_set.data
+    strategy = __context.build_strategy(genes)
+    if __context.vectorized:
+        # Indicators are computed on the whole dataset, the bars before the test already warm them up
+        lead_in, start, end = (int(round(len(validation_set.bars) * f)) for f in fold)
+        result = vector_evaluator.evaluate_population([strategy], __context.initial_balance, validation_set.bars, __context.timeframe, validation_set.exits_data,
+                                                      __context.indicators_cache, validation_set.dataset.name, validation_set.indicators_store, end, start)[0]
+        return (result.compact() if result is not None else None), index
+
+    lead_in, start, end = (int(round(len(data) * f)) for f in fold)
+    fold_data = data[lead_in:end]
+    state = EvaluationState(strategy, None if __context.closed_bars else fold_data)
+    evaluate_segment = dataset_evaluator.evaluate_bars_segment if __context.closed_bars else dataset_evaluator.evaluate_segment
+    if not evaluate_segment(state, fold_data, start - lead_in, None, 1440, __context.timeframe, index): return None, index
+    strategy.trade_log.clear()
+    if not evaluate_segment(state, fold_data, len(fold_data), None, 1440, __context.timeframe, index): return None, index
+    minutes = dataset_evaluator.get_bars_minutes(fold_data[start - lead_in:], end - start) if __context.closed_bars else end - start
+    return TestResult.construct(strategy, __context.initial_balance, minutes, __context.timeframe).compact(), index
@@ -3,10 +3,10 @@ import json
 import sys
 
 import matplotlib.pyplot as plot
-from numpy import genfromtxt
 
 import config
-from core.bot import dataset_evaluator
+from core.bot import candle_store, bar_pyramid, vector_evaluator
+from core.bot.indicator_store import IndicatorStore
 from core import lib
 from core.command_handler import CommandHandler
 from core.lib import ProgressBar
@@ -30,6 +30,8 @@ command_manager = CommandHandler.create() \
     .keyed("-o", "Output file .res") \
     .keyed("-p", "Plot balance with a certain precision") \
     .keyed("-ib", "The initial balance") \
+    .flag("-bars") \
+    .flag("-vector") \
     .on_help(helper) \
     .on_fail(failure) \
     .build(sys.argv)
@@ -56,13 +58,21 @@ strategy = strategy_class(TestWallet.factory(initial_balance), **dict([(p["name"
 
 # Load data
 print("Loading " + dataset + "...")
-data = genfromtxt(dataset, delimiter = config.DEFAULT_DELIMITER)
+closed_bars = command_manager.has_flag("-bars")
+data = bar_pyramid.load_bars(dataset, timeframe) if closed_bars else candle_store.load(dataset)
+if data is None: sys.exit(1)
 
 # Evaluate
 print("Evaluating " + strategy_name + " on " + dataset + " | " + str(options_file["timeframe"]))
 progress_bar = ProgressBar.create(len(data)).width(50).build()
-res, balance, index = dataset_evaluator.evaluate(strategy, initial_balance, data, progress_delegate = progress_bar.step, balance_update_interval = balance_plot_interval, timeframe = timeframe)
+vectorized = command_manager.has_flag("-vector")
+evaluator = vector_evaluator.get_evaluator(closed_bars, vectorized)
+# The vectorized engine reuses the indicators stored next to the dataset (see core.bot.indicator_store)
+options = {"indicators_store": IndicatorStore(dataset, timeframe)} if vectorized else {}
+res, balance, index = evaluator(strategy, initial_balance, data, progress_delegate = progress_bar.step, balance_update_interval = balance_plot_interval, timeframe = timeframe, **options)
 progress_bar.dispose()
+# The engines print why they can not test the strategy
+if res is None: sys.exit(1)
 print(str(res))
 
 # Print to file
@@ -1,10 +1,6 @@
-from collections import deque
-
 import numpy as np
-import talib as ta
-from numpy import genfromtxt
 
-import config
+from indicators.rolling import accumulate, linear_filter
 
 
 class ATR:
@@ -12,40 +8,53 @@ class ATR:
     def __init__(self, period: int = 14):
         self.period = period
         self.prev_close = 0
-        self.tr = deque(maxlen = period)
         self.atr = 0
         self.count = 0
 
     def compute_next(self, high: float, low: float, close: float) -> float:
         self.count += 1
-        self.tr.append(max(high - low, abs(high - self.prev_close), abs(low - self.prev_close)))
+        prev_close = self.prev_close
         self.prev_close = close
+        # The true range needs the previous close, the first candle has none
+        if self.count == 1:
+            return np.nan
 
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
         if self.count <= self.period + 1:
-            self.atr = np.mean(self.tr)
-            if self.count == self.period + 1:
-                return (self.atr * (self.period - 1) + self.tr[-1]) / self.period
-            else:
+            self.atr += tr
+            if self.count < self.period + 1:
                 return np.nan
+            self.atr /= self.period
+        else:
+            self.atr = (self.atr * (self.period - 1) + tr) / self.period
+        return self.atr
+
+    def compute_all(self, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, exact: bool = True) -> np.ndarray:
+        """Computes the whole series from a fresh state, leaving the indicator ready to continue with compute_next. The
+        series matches compute_next bit for bit, unless not 'exact' where the recursion is a rolling.linear_filter"""
+        highs, lows, closes = (np.asarray(series, dtype = np.float64) for series in (highs, lows, closes))
+        values = np.full(len(closes), np.nan)
+        self.count = len(closes)
+        self.prev_close = float(closes[-1]) if len(closes) > 0 else 0
+        prev_closes = closes[:-1]
+        trs = np.maximum(np.maximum(highs[1:] - lows[1:], np.abs(highs[1:] - prev_closes)), np.abs(lows[1:] - prev_closes))
+        seed = min(len(trs), self.period)
+        self.atr = float(np.cumsum(trs[:seed])[-1]) if seed > 0 else 0
+        if len(closes) <= self.period:
+            return values
+
+        period = self.period
+        self.atr /= period
+        values[period] = self.atr
+        if exact:
+            values[period + 1:] = accumulate(trs[period:], lambda atr, tr: (atr * (period - 1) + tr) / period, self.atr)
         else:
-            self.atr = (self.atr * (self.period - 1) + self.tr[-1]) / self.period
-            return self.atr
-
-# if __name__ == "__main__":
-#
-#     atr = ATR()
-#
-#     OPEN_T: int = 0
-#     HIGH: int = 2
-#     LOW: int = 3
-#     CLOSE: int = 4
-#     CLOSE_T: int = 6
-#
-#     data = genfromtxt(r"..\bot\data\ETHUSDT_1-6_2021.csv", delimiter = config.DEFAULT_DELIMITER)
-#     close = data[:, CLOSE][:100]
-#     high = data[:, HIGH][:100]
-#     low = data[:, LOW][:100]
-#     for (n, c), h, l in zip(enumerate(close), np.array(high), np.array(low)):
-#         print(n, " my ", atr.compute_next(h, l, c))
-#         print(n, " ta ", ta.ATR(np.array(high), np.array(low), np.array(close))[n])
-#         print()
+            values[period + 1:] = linear_filter(trs[period:] / period, (period - 1) / period, self.atr)
+        self.atr = float(values[-1])
+        return values
+
+
+if __name__ == "__main__":
+    from indicators import parity
+
+    parity.run(["ATR"])
@@ -1,47 +1,57 @@
 import numpy as np
-import talib as ta
-from numpy import genfromtxt
 
-import config
+from indicators.rolling import accumulate, linear_filter
 
 
 class EMA:
     def __init__(self, period: int = 20, smoothing: int = 2):
         self.smoothing = smoothing
-        self.first_values = []
+        self.count = 0
+        self.total = 0
         self.previous_val = 0
         self.period = period
+        self.alpha = smoothing / (1 + period)
 
     def compute_next(self, close: float) -> float:
-        if len(self.first_values) < self.period:
-            self.first_values.append(close)
-            self.previous_val = np.mean(self.first_values)
-            return np.nan
+        if self.count < self.period:
+            # Seeded with the simple average of the first values, as talib
+            self.count += 1
+            self.total += close
+            if self.count < self.period:
+                return np.nan
+            self.previous_val = self.total / self.period
+            return self.previous_val
         else:
-            smooth = self.smoothing / (1 + self.period)
-            self.previous_val = close * smooth + self.previous_val * (1 - smooth)
+            self.previous_val = (close - self.previous_val) * self.alpha + self.previous_val
             return self.previous_val
 
+    def compute_all(self, closes: np.ndarray, exact: bool = True) -> np.ndarray:
+        """Computes the whole series from a fresh state, leaving the indicator ready to continue with compute_next. The
+        series matches compute_next bit for bit, unless not 'exact' where the recursion is a rolling.linear_filter"""
+        closes = np.asarray(closes, dtype = np.float64)
+        self.reset()
+        values = np.full(len(closes), np.nan)
+        self.count = min(len(closes), self.period)
+        self.total = float(np.cumsum(closes[:self.count])[-1]) if self.count > 0 else 0
+        if len(closes) < self.period:
+            return values
+
+        alpha = self.alpha
+        values[self.period - 1] = self.total / self.period
+        if exact:
+            values[self.period:] = accumulate(closes[self.period:], lambda previous, close: (close - previous) * alpha + previous, values[self.period - 1])
+        else:
+            values[self.period:] = linear_filter(closes[self.period:] * alpha, 1 - alpha, values[self.period - 1])
+        self.previous_val = float(values[-1])
+        return values
+
     def reset(self):
         self.previous_val = 0
-        self.first_values = []
-
-# if __name__ == "__main__":
-#     # TEST EMA
-#
-#     ema = EMA()
-#
-#     OPEN_T: int = 0
-#     HIGH: int = 2
-#     LOW: int = 3
-#     CLOSE: int = 4
-#     CLOSE_T: int = 6
-#
-#     data = genfromtxt(r"..\bot\data\ETHUSDT_1-6_2021.csv", delimiter = config.DEFAULT_DELIMITER)
-#     close = data[:, CLOSE][:100]
-#     high = data[:, HIGH][:100]
-#     low = data[:, LOW][:100]
-#
-#     for n, i in enumerate(close):
-#         print(n, " my ", ema.compute_next(i), " ta ", ta.EMA(close, 20)[n])
-#     # print(ta.EMA(a, 20)[:200])
+        self.count = 0
+        self.total = 0
+
+
+if __name__ == "__main__":
+    from indicators import parity
+
+    parity.run(["EMA"])
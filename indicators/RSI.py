@@ -1,80 +1,85 @@
-import collections
-import itertools
-from collections import deque
-
 import numpy as np
-import talib as ta
-from numpy import genfromtxt
 
-import config
+from indicators.rolling import accumulate, linear_filter
 
 
 class RSI:
 
     def __init__(self, period: int = 14):
         self.period = period
-        self.first_closes = deque(maxlen = period + 1)
         self.counter = 0
         self.prev = 0
         self.gain = 0
         self.loss = 0
 
-    def __avg_gain_loss(self, closes):
-        gain = []
-        loss = []
-        prev = closes[0]
-        if len(closes) == 1:
-            return [0, 0]
-
-        for current in collections.deque(itertools.islice(closes, 1, len(closes))):
-            if prev <= current:
-                gain.append(current - prev)
-                loss.append(0)
-            elif prev > current:
-                gain.append(0)
-                loss.append(prev - current)
-            prev = current
-
-        return [np.mean(gain), np.mean(loss)]
-
     def compute_next(self, value):
-        if self.counter <= self.period:
+        if self.counter == 0:
             self.counter += 1
-            self.first_closes.append(value)
-            self.gain, self.loss = self.__avg_gain_loss(self.first_closes)
-        else:
-            if self.prev <= value:
-                self.gain = (self.gain * (self.period - 1) + (value - self.prev)) / self.period
-                self.loss = (self.loss * (self.period - 1)) / self.period
-            elif self.prev > value:
-                self.loss = (self.loss * (self.period - 1) + (self.prev - value)) / self.period
-                self.gain = (self.gain * (self.period - 1)) / self.period
+            self.prev = value
+            return np.nan
 
+        change = value - self.prev
         self.prev = value
+        if self.counter <= self.period:
+            # Sums of the first 'period' changes, averaged once all of them are available
+            self.counter += 1
+            if change >= 0:
+                self.gain += change
+            else:
+                self.loss -= change
+            if self.counter <= self.period:
+                return np.nan
+            self.gain /= self.period
+            self.loss /= self.period
+        elif change >= 0:
+            self.gain = (self.gain * (self.period - 1) + change) / self.period
+            self.loss = (self.loss * (self.period - 1)) / self.period
+        else:
+            self.loss = (self.loss * (self.period - 1) - change) / self.period
+            self.gain = (self.gain * (self.period - 1)) / self.period
+
+        return self.__rsi(self.gain, self.loss)
+
+    def compute_all(self, closes: np.ndarray, exact: bool = True) -> np.ndarray:
+        """Computes the whole series from a fresh state, leaving the indicator ready to continue with compute_next. The
+        series matches compute_next bit for bit, unless not 'exact' where the recursion is a rolling.linear_filter"""
+        closes = np.asarray(closes, dtype = np.float64)
+        values = np.full(len(closes), np.nan)
+        self.counter = min(len(closes), self.period + 1)
+        self.prev = float(closes[-1]) if len(closes) > 0 else 0
+        changes = np.diff(closes)
+        # Adding a zero gain or loss is exact, the branches of compute_next reduce to the same operations
+        gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+        seed = self.counter - 1
+        self.gain = float(np.cumsum(gains[:seed])[-1]) if seed > 0 else 0
+        self.loss = float(np.cumsum(losses[:seed])[-1]) if seed > 0 else 0
+        if len(closes) <= self.period:
+            return values
+
+        period = self.period
+        self.gain /= period
+        self.loss /= period
+        if exact:
+            step = lambda average, change: (average * (period - 1) + change) / period
+            average_gains = np.concatenate(([self.gain], accumulate(gains[period:], step, self.gain)))
+            average_losses = np.concatenate(([self.loss], accumulate(losses[period:], step, self.loss)))
+        else:
+            average_gains = np.concatenate(([self.gain], linear_filter(gains[period:] / period, (period - 1) / period, self.gain)))
+            average_losses = np.concatenate(([self.loss], linear_filter(losses[period:] / period, (period - 1) / period, self.loss)))
+        totals = average_gains + average_losses
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            values[period:] = np.where(totals >= 0.00000001, 100 * (average_gains / totals), 0)
+        self.gain, self.loss = float(average_gains[-1]), float(average_losses[-1])
+        return values
 
-        if self.counter < self.period + 1:
-            return np.nan
-
-        return 100 - (100 / (1 + (self.gain / self.loss)))
+    @staticmethod
+    def __rsi(gain: float, loss: float) -> float:
+        # Same zero threshold of talib
+        total = gain + loss
+        return 100 * (gain / total) if total >= 0.00000001 else 0
 
 
 if __name__ == "__main__":
+    from indicators import parity
 
-    rsi = RSI()
-    OPEN_T: int = 0
-    HIGH: int = 2
-    LOW: int = 3
-    CLOSE: int = 4
-    CLOSE_T: int = 6
-
-    data = genfromtxt(r"..\bot\data\ETHUSDT_1-6_2021.csv", delimiter = config.DEFAULT_DELIMITER)
-    close = data[:, CLOSE][:100]
-    high = data[:, HIGH][:100]
-    low = data[:, LOW][:100]
-
-    print(len(high))
-
-    for n, i in enumerate(close):
-        print(n, " my ", rsi.compute_next(i))
-        print(n, " ta ", ta.RSI(close)[n])
-        print()
+    parity.run(["RSI"])
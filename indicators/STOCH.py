@@ -1,79 +1,58 @@
-from collections import deque
-
 import numpy as np
-import talib as ta
-from numpy import genfromtxt
+
+from indicators.rolling import RollingExtremum, RollingMean
 
 
 class STOCH:
 
     def __init__(self, fastk_period: int = 14, slowk_period: int = 3, slowd_period: int = 3):
         self.fastk_period = fastk_period
-        self.stoch = deque(maxlen = fastk_period)
-        self.close = deque(maxlen = fastk_period)
-        self.high = deque(maxlen = fastk_period)
-        self.low = deque(maxlen = fastk_period)
-
         self.slowk_period = slowk_period
         self.slowd_period = slowd_period
-        self.fastk = deque(maxlen = slowk_period)
-        self.slowd = deque(maxlen = slowd_period)
+        self.lowest = RollingExtremum(fastk_period)
+        self.highest = RollingExtremum(fastk_period, maximum = True)
+        self.fastk = RollingMean(slowk_period)
+        self.slowd = RollingMean(slowd_period)
+        self.count = 0
 
     def compute_next(self, close: float, low: float, high: float) -> tuple[float, float]:
-        self.high.append(high)
-        self.low.append(low)
-        self.close.append(close)
-        min_val = np.min(self.low)
-        max_val = np.max(self.high)
-        # print("close ", self.close[-1], "min ", min_val, "max ", max_val)
-        self.stoch.append((((self.close[-1] - min_val) / (max_val - min_val)) * 100))
-
-        if len(self.stoch) == self.fastk_period:
-
-            last_k = self.stoch[-1]
-            self.fastk.append(last_k)
-
-            if len(self.fastk) == self.slowk_period:
-                new_k = np.sum(self.fastk) / self.slowk_period
-            else:
-                new_k = np.nan
-
-            self.slowd.append(new_k)
-            if len(self.slowd) == self.slowd_period:
-
-                stoch_d = np.mean(self.slowd)
-            else:
-                stoch_d = np.nan
-
-            return new_k, stoch_d
+        self.count += 1
+        min_val = self.lowest.push(low)
+        max_val = self.highest.push(high)
+        if self.count < self.fastk_period:
+            return np.nan, np.nan
 
-        else:
+        diff = (max_val - min_val) / 100
+        new_k = self.fastk.push((close - min_val) / diff if diff != 0 else 0)
+        if self.count < self.fastk_period + self.slowk_period - 1:
             return np.nan, np.nan
+        stoch_d = self.slowd.push(new_k)
+        # Both lines become valid together, as in talib
+        if self.count < self.fastk_period + self.slowk_period + self.slowd_period - 2:
+            return np.nan, np.nan
+        return new_k, stoch_d
+
+    def compute_all(self, closes: np.ndarray, lows: np.ndarray, highs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Computes the whole series from a fresh state, leaving the indicator ready to continue with compute_next"""
+        closes, lows, highs = (np.asarray(series, dtype = np.float64) for series in (closes, lows, highs))
+        self.count = len(closes)
+        min_vals = self.lowest.push_all(lows)[self.fastk_period - 1:]
+        max_vals = self.highest.push_all(highs)[self.fastk_period - 1:]
+        diffs = (max_vals - min_vals) / 100
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            fastk = np.where(diffs != 0, (closes[self.fastk_period - 1:] - min_vals) / diffs, 0)
+        slowk = self.fastk.push_all(fastk)[self.slowk_period - 1:]
+        slowd = self.slowd.push_all(slowk)
+
+        lookback = self.fastk_period + self.slowk_period + self.slowd_period - 3
+        k_values, d_values = np.full(len(closes), np.nan), np.full(len(closes), np.nan)
+        if len(closes) > lookback:
+            k_values[lookback:] = slowk[self.slowd_period - 1:]
+            d_values[lookback:] = slowd[self.slowd_period - 1:]
+        return k_values, d_values
 
 
 if __name__ == "__main__":
+    from indicators import parity
 
-    stoch = STOCH()
-    OPEN_T: int = 0
-    HIGH: int = 2
-    LOW: int = 3
-    CLOSE: int = 4
-    CLOSE_T: int = 6
-
-    data = genfromtxt("../data/ETHUSDT_1-6_2021.csv", delimiter = ';')
-    close = data[:, CLOSE][:100]
-    high = data[:, HIGH][:100]
-    low = data[:, LOW][:100]
-
-    k_wind = []
-    d_wind = []
-
-    for i in range(len(close)):
-        print(
-            ta.STOCH(high, low, close, fastk_period = 14, slowk_period = 3, slowk_matype = 0, slowd_period = 3, slowd_matype = 0)[0][i],
-            ta.STOCH(high, low, close, fastk_period = 14, slowk_period = 3, slowk_matype = 0, slowd_period = 3, slowd_matype = 0)[1][i])
-
-        # print("his"  , stochastic(np.array(close[:i+1]), np.array(low[:i+1]), np.array(high[:i+1]), k_wind, d_wind) )
-
-        print("my", stoch.compute_next(close[i], low[i], high[i]))
-        print()
+    parity.run(["STOCH"])
@@ -1,58 +1,66 @@
-from collections import deque
+
+import math
 
 import numpy as np
-import talib as ta
-from numpy import genfromtxt
 
 from indicators.RSI import RSI
-from indicators.STOCH import STOCH
+from indicators.rolling import RollingExtremum, RollingMean
 
 
 class STOCHRSI:
 
     def __init__(self, period: int = 14, fastk_period: int = 3, slowd_period: int = 3):
         self.period = period
-        self.values = deque(maxlen = period)
         self.fastk_period = fastk_period
         self.slowd_period = slowd_period
         self.rsi = RSI(period = period)
-        self.stoch = STOCH(fastk_period = period, slowd_period = fastk_period)
+        self.lowest = RollingExtremum(period)
+        self.highest = RollingExtremum(period, maximum = True)
+        self.fast_d = RollingMean(fastk_period)
+        self.count = 0
 
     def compute_next(self, close: float) -> tuple[float, float]:
-        current = self.rsi.compute_next(close)
-        self.values.append(current)
-
-        min_val = np.min(self.values)
-        max_val = np.max(self.values)
-        fast_k = (((current - min_val) / (max_val - min_val)) * 100)
-        fast_d = self.stoch.compute_next(current, current, current)[0]
+        return self.compute_next_rsi(self.rsi.compute_next(close))
 
-        if np.isnan(fast_d):
+    def compute_next_rsi(self, current: float) -> tuple[float, float]:
+        """Steps the oscillator with an RSI computed elsewhere, as a shared RSI node of an indicator graph"""
+        if math.isnan(current):
             return np.nan, np.nan
 
-        return fast_k, fast_d
-
+        self.count += 1
+        min_val = self.lowest.push(current)
+        max_val = self.highest.push(current)
+        if self.count < self.period:
+            return np.nan, np.nan
 
-if __name__ == "__main__":
+        diff = (max_val - min_val) / 100
+        fast_k = (current - min_val) / diff if diff != 0 else 0
+        fast_d = self.fast_d.push(fast_k)
+        if self.count < self.period + self.fastk_period - 1:
+            return np.nan, np.nan
 
-    stochrsi = STOCHRSI()
-    OPEN_T: int = 0
-    HIGH: int = 2
-    LOW: int = 3
-    CLOSE: int = 4
-    CLOSE_T: int = 6
+        return fast_k, fast_d
 
-    data = genfromtxt(r"data\ETHUSDT_1-6_2021.csv", delimiter = ";")
-    close = data[:, CLOSE][:100]
-    high = data[:, HIGH][:100]
-    low = data[:, LOW][:100]
+    def compute_all(self, closes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Computes the whole series from a fresh state, leaving the indicator ready to continue with compute_next"""
+        rsi = self.rsi.compute_all(closes)[self.period:]
+        self.count = len(rsi)
+        min_vals = self.lowest.push_all(rsi)[self.period - 1:]
+        max_vals = self.highest.push_all(rsi)[self.period - 1:]
+        diffs = (max_vals - min_vals) / 100
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            fast_k = np.where(diffs != 0, (rsi[self.period - 1:] - min_vals) / diffs, 0)
+        fast_d = self.fast_d.push_all(fast_k)
+
+        lookback = 2 * self.period + self.fastk_period - 2
+        k_values, d_values = np.full(len(closes), np.nan), np.full(len(closes), np.nan)
+        if len(closes) > lookback:
+            k_values[lookback:] = fast_k[self.fastk_period - 1:]
+            d_values[lookback:] = fast_d[self.fastk_period - 1:]
+        return k_values, d_values
 
-    for i in range(len(close)):
-        print(
-            ta.STOCHRSI(close, timeperiod = 14, fastk_period = 14, fastd_period = 3)[0][i],
-            ta.STOCHRSI(close, timeperiod = 14, fastk_period = 14, fastd_period = 3)[1][i])
 
-        # print("his"  , stochastic(np.array(close[:i+1]), np.array(low[:i+1]), np.array(high[:i+1]), k_wind, d_wind) )
+if __name__ == "__main__":
+    from indicators import parity
 
-        print("my", stochrsi.compute_next(close[i]))
-        print()
+    parity.run(["STOCHRSI"])
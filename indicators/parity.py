@@ -0,0 +1,142 @@
+import sys
+import time
+
+import numpy as np
+import talib as ta
+
+from indicators.ATR import ATR
+from indicators.EMA import EMA
+from indicators.RSI import RSI
+from indicators.STOCH import STOCH
+from indicators.STOCHRSI import STOCHRSI
+
+TOLERANCE = 1e-8
+# Relative difference allowed between the series of rolling.linear_filter and the streamed ones
+FILTER_TOLERANCE = 1e-12
+
+
+def load_series(data_path: str = None, length: int = 200000, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the highs, lows and closes of a dataset, or of a synthetic random walk if no path is given"""
+    if data_path is not None:
+        from core.bot import candle_store
+        from core.bot.candle_store import HIGH, LOW, CLOSE
+        data = candle_store.load(data_path)
+        data = data[:length] if length is not None else data
+        return np.array(data[:, HIGH]), np.array(data[:, LOW]), np.array(data[:, CLOSE])
+    generator = np.random.default_rng(seed)
+    closes = 2000 + np.cumsum(generator.normal(0, 1, length))
+    spreads = np.abs(generator.normal(0, 0.8, (2, length)))
+    return closes + spreads[0], closes - spreads[1], closes
+
+
+# Indicator factory, how each tick and the whole series are fed to it and the talib reference on the whole series
+CASES = {
+    "EMA": (lambda: EMA(20), lambda indicator, h, l, c: indicator.compute_next(c),
+            lambda indicator, highs, lows, closes: indicator.compute_all(closes),
+            lambda highs, lows, closes: [ta.EMA(closes, 20)]),
+    "RSI": (lambda: RSI(14), lambda indicator, h, l, c: indicator.compute_next(c),
+            lambda indicator, highs, lows, closes: indicator.compute_all(closes),
+            lambda highs, lows, closes: [ta.RSI(closes, 14)]),
+    "ATR": (lambda: ATR(14), lambda indicator, h, l, c: indicator.compute_next(h, l, c),
+            lambda indicator, highs, lows, closes: indicator.compute_all(highs, lows, closes),
+            lambda highs, lows, closes: [ta.ATR(highs, lows, closes, 14)]),
+    "STOCH": (lambda: STOCH(14, 3, 3), lambda indicator, h, l, c: indicator.compute_next(c, l, h),
+              lambda indicator, highs, lows, closes: indicator.compute_all(closes, lows, highs),
+              lambda highs, lows, closes: list(ta.STOCH(highs, lows, closes, fastk_period = 14, slowk_period = 3, slowk_matype = 0, slowd_period = 3, slowd_matype = 0))),
+    "STOCHRSI": (lambda: STOCHRSI(14, 3), lambda indicator, h, l, c: indicator.compute_next(c),
+                 lambda indicator, highs, lows, closes: indicator.compute_all(closes),
+                 lambda highs, lows, closes: list(ta.STOCHRSI(closes, timeperiod = 14, fastk_period = 14, fastd_period = 3)))
+}
+
+# Batch series through rolling.linear_filter, for the indicators with a recursion
+FILTER_CASES = {
+    "EMA": lambda indicator, highs, lows, closes: indicator.compute_all(closes, exact = False),
+    "RSI": lambda indicator, highs, lows, closes: indicator.compute_all(closes, exact = False),
+    "ATR": lambda indicator, highs, lows, closes: indicator.compute_all(highs, lows, closes, exact = False)
+}
+
+
+def __stream(indicator, feed, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    outputs = [feed(indicator, h, l, c) for h, l, c in zip(highs.tolist(), lows.tolist(), closes.tolist())]
+    return np.array(outputs, dtype = np.float64).reshape(len(closes), -1)
+
+
+def __columns(outputs) -> np.ndarray:
+    return np.column_stack(outputs if isinstance(outputs, tuple) else [outputs])
+
+
+def __matches_talib(outputs: np.ndarray, references: list[np.ndarray]) -> tuple[bool, float]:
+    matches = True
+    max_diff = 0.0
+    for column, expected in enumerate(references):
+        actual = outputs[:, column]
+        if not np.array_equal(np.isnan(actual), np.isnan(expected)):
+            matches = False
+            continue
+        valid = ~np.isnan(expected)
+        if valid.any():
+            diff = np.abs(actual[valid] - expected[valid])
+            max_diff = max(max_diff, float(diff.max()))
+            matches = matches and bool(np.all(diff <= TOLERANCE * np.maximum(1, np.abs(expected[valid]))))
+    return matches, max_diff
+
+
+def check(name: str, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> dict[str, any]:
+    """Compares an indicator with talib and its batch series with the streamed one
+
+    The batch series has to be bit-identical to the streamed one, also when streaming continues after a batch warm up.
+
+    Returns:
+        The parity results, the maximum absolute difference from talib and the costs in ns/tick
+    """
+    factory, feed, batch, reference = CASES[name]
+    start = time.perf_counter_ns()
+    streamed = __stream(factory(), feed, highs, lows, closes)
+    stream_ns = (time.perf_counter_ns() - start) / len(closes)
+
+    start = time.perf_counter_ns()
+    batched = __columns(batch(factory(), highs, lows, closes))
+    batch_ns = (time.perf_counter_ns() - start) / len(closes)
+
+    half = len(closes) // 2
+    warmed = factory()
+    head = __columns(batch(warmed, highs[:half], lows[:half], closes[:half]))
+    continued = np.concatenate((head, __stream(warmed, feed, highs[half:], lows[half:], closes[half:])))
+
+    filtered, filter_ns = None, None
+    if name in FILTER_CASES:
+        start = time.perf_counter_ns()
+        series = __columns(FILTER_CASES[name](factory(), highs, lows, closes))
+        filter_ns = (time.perf_counter_ns() - start) / len(closes)
+        filtered = np.array_equal(np.isnan(series), np.isnan(streamed)) and \
+            bool(np.all(np.abs(series - streamed)[~np.isnan(streamed)] <= FILTER_TOLERANCE * np.abs(streamed[~np.isnan(streamed)])))
+
+    talib_match, max_diff = __matches_talib(streamed, reference(highs, lows, closes))
+    return {"talib": talib_match, "max_diff": max_diff, "filter": filtered, "filter_ns": filter_ns,
+            "batch": np.array_equal(streamed, batched, equal_nan = True),
+            "warm_up": np.array_equal(streamed, continued, equal_nan = True),
+            "stream_ns": stream_ns, "batch_ns": batch_ns}
+
+
+def run(names: list[str] = None, data_path: str = None, length: int = 200000) -> bool:
+    """Prints the parity and the costs of the indicators, returns whether all of them match"""
+    if names is None: names = list(CASES.keys())
+    highs, lows, closes = load_series(data_path, length)
+    print("{:d} ticks of {:s}".format(len(closes), data_path if data_path is not None else "random walk"))
+    print("{:<10s}{:<7s}{:<14s}{:<7s}{:<9s}{:<8s}{:>12s}{:>12s}{:>12s}".format("", "talib", "max diff", "batch", "warm up", "filter", "stream ns", "batch ns", "filter ns"))
+    all_match = True
+    for name in names:
+        result = check(name, highs, lows, closes)
+        all_match = all_match and result["talib"] and result["batch"] and result["warm_up"] and result["filter"] is not False
+        print("{:<10s}{:<7s}{:<14.3e}{:<7s}{:<9s}{:<8s}{:>12.0f}{:>12.1f}{:>12s}".format(name, "ok" if result["talib"] else "FAIL", result["max_diff"], "ok" if result["batch"] else "FAIL",
+                                                                                    "ok" if result["warm_up"] else "FAIL", "-" if result["filter"] is None else "ok" if result["filter"] else "FAIL",
+                                                                                    result["stream_ns"], result["batch_ns"],
+                                                                                    "-" if result["filter_ns"] is None else "{:.1f}".format(result["filter_ns"])), flush = True)
+    return all_match
+
+
+if __name__ == "__main__":
+    if "-h" in sys.argv:
+        print("Usage: python -m indicators.parity [dataset]")
+        exit(0)
+    exit(0 if run(data_path = sys.argv[1] if len(sys.argv) > 1 else None) else 1)
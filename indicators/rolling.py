@@ -0,0 +1,108 @@
+import itertools
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class RollingExtremum:
+    """Minimum or maximum of the last 'period' values in amortized O(1), through a monotonic deque"""
+
+    def __init__(self, period: int, maximum: bool = False):
+        self.period = period
+        self.maximum = maximum
+        self.candidates = deque()
+        self.count = 0
+
+    def push(self, value: float) -> float:
+        candidates = self.candidates
+        if self.maximum:
+            while candidates and candidates[-1][1] <= value: candidates.pop()
+        else:
+            while candidates and candidates[-1][1] >= value: candidates.pop()
+        candidates.append((self.count, value))
+        if candidates[0][0] <= self.count - self.period: candidates.popleft()
+        self.count += 1
+        return candidates[0][1]
+
+    def push_all(self, values: np.ndarray) -> np.ndarray:
+        """Pushes all the values into a fresh extremum and returns the extreme after each one, as push"""
+        accumulate = np.maximum.accumulate if self.maximum else np.minimum.accumulate
+        extremes = np.empty(len(values))
+        extremes[:self.period - 1] = accumulate(values[:self.period - 1])
+        if len(values) >= self.period:
+            windows = sliding_window_view(values, self.period)
+            extremes[self.period - 1:] = windows.max(axis = 1) if self.maximum else windows.min(axis = 1)
+        # Only the values of the last window can still be candidates
+        tail = max(0, len(values) - self.period)
+        self.candidates = deque()
+        self.count = tail
+        for value in values[tail:].tolist():
+            self.push(value)
+        return extremes
+
+
+class RollingMean:
+    """Simple moving average of the last 'period' values with a running sum updated in the order of talib, nan until the window is full"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values = deque()
+        self.total = 0.0
+
+    def push(self, value: float) -> float:
+        self.values.append(value)
+        self.total += value
+        if len(self.values) < self.period:
+            return np.nan
+        mean = self.total / self.period
+        self.total -= self.values.popleft()
+        return mean
+
+    def push_all(self, values: np.ndarray) -> np.ndarray:
+        """Pushes all the values into a fresh average and returns the average after each one, bit-identical to push"""
+        count, period = len(values), self.period
+        means = np.full(count, np.nan)
+        self.values = deque(values[max(0, count - period + 1):].tolist())
+        if count < period:
+            self.total = float(np.cumsum(values)[-1]) if count > 0 else 0.0
+            return means
+
+        # The running sum is the sequential sum of the first values followed by alternated additions and removals,
+        # cumsum accumulates it in the same order and therefore with the same roundings
+        operations = np.empty(period - 1 + 2 * (count - period + 1))
+        operations[:period - 1] = values[:period - 1]
+        operations[period - 1::2] = values[period - 1:]
+        operations[period::2] = -values[:count - period + 1]
+        sums = np.cumsum(operations)
+        means[period - 1:] = sums[period - 1::2] / period
+        self.total = float(sums[-1])
+        return means
+
+
+def accumulate(values: np.ndarray, step, initial: float) -> np.ndarray:
+    """Runs the recursion 'state = step(state, value)' one value at a time, returning the states bit for bit as compute_next"""
+    states = np.fromiter(itertools.accumulate(values.tolist(), step, initial = initial), dtype = np.float64, count = len(values) + 1)
+    return states[1:]
+
+
+FILTER_BLOCK = 64
+
+
+def linear_filter(inputs: np.ndarray, decay: float, initial: float) -> np.ndarray:
+    """Vectorized 'state = decay * state + input' by blocks of FILTER_BLOCK, within a relative error of 1e-12 from the recursion"""
+    count = len(inputs)
+    blocks = -(-count // FILTER_BLOCK)
+    padded = np.zeros(blocks * FILTER_BLOCK)
+    padded[:count] = inputs
+    lags = np.arange(FILTER_BLOCK)[:, None] - np.arange(FILTER_BLOCK)[None, :]
+    kernel = np.where(lags >= 0, decay ** np.maximum(lags, 0), 0)
+    local = padded.reshape(blocks, FILTER_BLOCK) @ kernel.T
+    # State before each block, the local states add its decayed contribution
+    carries = np.empty(blocks)
+    carry, block_decay = initial, decay ** FILTER_BLOCK
+    for block, last in enumerate(local[:, -1].tolist()):
+        carries[block] = carry
+        carry = last + block_decay * carry
+    states = local + carries[:, None] * (decay ** np.arange(1, FILTER_BLOCK + 1))[None, :]
+    return states.ravel()[:count]
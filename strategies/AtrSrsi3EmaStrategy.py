@@ -1,9 +1,8 @@
-import numpy as np
-
 from core.bot.condition import PerpetualStrategyCondition, EventStrategyCondition
 from core.bot.strategy import *
 from indicators.ATR import ATR
 from indicators.EMA import EMA
+from indicators.RSI import RSI
 from indicators.STOCHRSI import STOCHRSI
 
 
@@ -28,45 +27,33 @@ class AtrSrsi3EmaStrategy(Strategy):
         self.interval_tolerance = strategy_params["interval_tolerance"]
         self.leverage = strategy_params["leverage"]
 
-        self.ema8 = EMA(period = 8)
-        self.current_ema8 = {}
-        self.ema14 = EMA(period = 14)
-        self.current_ema14 = {}
-        self.ema50 = EMA(period = 50)
-        self.current_ema50 = {}
-
-        self.stoch_rsi = STOCHRSI()
-        self.current_k = {}
-        self.last_k = {}
-        self.current_d = {}
-        self.last_d = {}
-        self.atr = ATR()
-        self.current_atr = {}
         super().__init__(wallet_handler, self.MAX_OPEN_POSITIONS_NUMBER)
 
-    def compute_indicators_step(self, symbol,  frame):
-        close = float(frame.close_time)
-        high = float(frame.high_price)
-        low = float(frame.low_price)
-        self.current_ema8[symbol] = self.ema8.compute_next(close)
-        self.current_ema14[symbol] = self.ema14.compute_next(close)
-        self.current_ema50[symbol] = self.ema50.compute_next(close)
-        self.last_k[symbol] = self.current_k
-        self.last_d[symbol] = self.current_d
-        self.current_k[symbol], self.current_d[symbol] = self.stoch_rsi.compute_next(close)
-        self.current_atr[symbol] = self.atr.compute_next(high, low, close)
+        close = self.graph.source("close")
+        self.ema8 = self.graph.indicator(EMA, close, period = 8)
+        self.ema14 = self.graph.indicator(EMA, close, period = 14)
+        self.ema50 = self.graph.indicator(EMA, close, period = 50)
+        # The RSI node feeds the STOCHRSI, any other condition on RSI(14) reads the same node
+        self.rsi = self.graph.indicator(RSI, close, period = 14)
+        stoch_rsi = self.graph.indicator(STOCHRSI, self.rsi, method = "compute_next_rsi", period = 14)
+        self.stoch_k = self.graph.element(stoch_rsi, 0)
+        self.stoch_d = self.graph.element(stoch_rsi, 1)
+        self.atr = self.graph.indicator(ATR, self.graph.source("high"), self.graph.source("low"), close, period = 14)
+
+    def compute_indicators_step(self, frame):
+        pass
 
     def get_stop_loss(self, symbol, open_price: float, position_type: PositionType) -> float:
         if position_type == PositionType.LONG:
-            return open_price - (self.atr_factor * self.current_atr[symbol])
+            return open_price - (self.atr_factor * self.atr.value())
         elif position_type == PositionType.SHORT:
-            return open_price + (self.atr_factor * self.current_atr[symbol])
+            return open_price + (self.atr_factor * self.atr.value())
 
     def get_take_profit(self, symbol, open_price: float, position_type: PositionType) -> float:
         if position_type == PositionType.LONG:
-            return open_price + (self.risk_reward_ratio * self.atr_factor * self.current_atr[symbol])
+            return open_price + (self.risk_reward_ratio * self.atr_factor * self.atr.value())
         elif position_type == PositionType.SHORT:
-            return open_price - (self.risk_reward_ratio * self.atr_factor * self.current_atr[symbol])
+            return open_price - (self.risk_reward_ratio * self.atr_factor * self.atr.value())
 
     def get_leverage(self) -> float:
         return self.leverage
@@ -87,23 +74,14 @@ class AtrSrsi3EmaStrategy(Strategy):
         ]
 
     def long_perpetual_condition(self, frame):
-        close = float(frame.close_price)
-        symbol = frame.symbol
-        if symbol is not self.current_ema8 or symbol is not self.current_ema14 or symbol is not self.current_ema50 : return False
-        return self.current_ema50[symbol] < self.current_ema14[symbol] < self.current_ema8[symbol] < close
+        # Comparisons with nan are false while the EMAs warm up
+        return self.ema50.value() < self.ema14.value() < self.ema8.value() < frame.close_price
 
     def long_event_condition(self, frame) -> bool:
-        symbol = frame.symbol
-        if symbol is not self.last_k or symbol is not self.current_k or symbol is not self.last_d or symbol is not self.current_d: return False
-        return self.last_k[symbol]  <= self.last_d[symbol]  and self.current_k[symbol]  > self.current_d[symbol]
+        return self.stoch_k.value(1) <= self.stoch_d.value(1) and self.stoch_k.value() > self.stoch_d.value()
 
     def short_perpetual_condition(self, frame) -> bool:
-        close = frame.close_price
-        symbol = frame.symbol
-        if symbol is not self.current_ema8 is np.nan or symbol is not  self.current_ema14 is np.nan or symbol is not self.current_ema50 is np.nan: return False
-        return self.current_ema50[symbol]  > self.current_ema14[symbol]  > self.current_ema8[symbol]  > close
+        return self.ema50.value() > self.ema14.value() > self.ema8.value() > frame.close_price
 
     def short_event_condition(self, frame) -> bool:
-        symbol = frame.symbol
-        if symbol is not self.last_k or symbol is not self.current_k or symbol is not self.last_d  or symbol is not self.current_d : return False
-        return self.last_k[symbol]  >= self.last_d[symbol]  and self.current_k[symbol]  < self.current_d[symbol]
+        return self.stoch_k.value(1) >= self.stoch_d.value(1) and self.stoch_k.value() < self.stoch_d.value()
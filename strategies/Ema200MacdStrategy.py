@@ -33,30 +33,36 @@ class Ema200MacdStrategy(Strategy):
         self.atr_factor = strategy_params["atr_factor"]
         self.investment_rate = strategy_params["investment_ratio"]
         self.interval_tolerance = strategy_params["interval_tolerance"]
-        super().__init__(wallet_handler, self.MAX_OPEN_POSITIONS_NUMBER)
+        super().__init__(wallet_handler, self.MAX_OPEN_POSITIONS_NUMBER, longest_period = 200)
+
+    def compute_indicators_step(self, frame):
+        pass
 
     def compute_indicators(self) -> list[tuple[str, any]]:
-        return [('200ema', technical.EMA(np.array(self.closes), timeperiod=200)),
-                ("macd", technical.MACD(np.array(self.closes), fastperiod=self.FAST_PERIOD, slowperiod=self.SLOW_PERIOD,
+        return [('200ema', technical.EMA(self.closes, timeperiod=200)),
+                ("macd", technical.MACD(self.closes, fastperiod=self.FAST_PERIOD, slowperiod=self.SLOW_PERIOD,
                                         signalperiod=self.SMOOTHING)),
-                ("atr", technical.ATR(np.array(self.highs), np.array(self.lows), np.array(self.closes)))
+                ("atr", technical.ATR(self.highs, self.lows, self.closes))
 
                 ]
 
-    def get_stop_loss(self, open_price: float, position_type: PositionType) -> float:
+    def get_stop_loss(self, symbol: str, open_price: float, position_type: PositionType) -> float:
         atr = self.get_indicator("atr")
         if position_type == PositionType.LONG:
             return open_price - (self.atr_factor * atr[-1])
         elif position_type == PositionType.SHORT:
             return open_price + (self.atr_factor * atr[-1])
 
-    def get_take_profit(self, open_price: float, position_type: PositionType) -> float:
+    def get_take_profit(self, symbol: str, open_price: float, position_type: PositionType) -> float:
         atr = self.get_indicator("atr")
         if position_type == PositionType.LONG:
             return open_price + (self.risk_reward_ratio * self.atr_factor * atr[-1])
         elif position_type == PositionType.SHORT:
             return open_price - (self.risk_reward_ratio * self.atr_factor * atr[-1])
 
+    def get_leverage(self) -> float:
+        return 1
+
     def get_margin_investment(self) -> float:
         return self.wallet_handler.get_balance() * self.investment_rate
 
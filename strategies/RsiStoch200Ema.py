@@ -34,33 +34,36 @@ class RsiStoch200Ema(Strategy):
         self.last_low_closes = 0
 
         self.last_low_rsi = 0
-        super().__init__(wallet_handler, self.MAX_OPEN_POSITIONS_NUMBER)
+        super().__init__(wallet_handler, self.MAX_OPEN_POSITIONS_NUMBER, longest_period = 200)
 
     def compute_indicators(self) -> list[tuple[str, any]]:
         return [
-            ("stoch", technical.STOCH(np.array(self.highs), np.array(self.lows), np.array(self.closes),
+            ("stoch", technical.STOCH(self.highs, self.lows, self.closes,
                                       fastk_period = 14,
                                       slowk_period = 1,
                                       slowd_period = 3,
                                       slowk_matype = 0, slowd_matype = 0)),
-            ("atr", technical.ATR(np.array(self.highs), np.array(self.lows), np.array(self.closes))),
-            ("rsi", technical.RSI(np.array(self.closes), 14)),
-            ('200ema', technical.EMA(np.array(self.closes), timeperiod = 200))]
+            ("atr", technical.ATR(self.highs, self.lows, self.closes)),
+            ("rsi", technical.RSI(self.closes, 14)),
+            ('200ema', technical.EMA(self.closes, timeperiod = 200))]
 
-    def get_stop_loss(self, open_price: float, position_type: PositionType) -> float:
+    def get_stop_loss(self, symbol: str, open_price: float, position_type: PositionType) -> float:
         atr = self.get_indicator("atr")
         if position_type == PositionType.LONG:
             return open_price - (self.atr_factor * atr[-1])
         elif position_type == PositionType.SHORT:
             return open_price + (self.atr_factor * atr[-1])
 
-    def get_take_profit(self, open_price: float, position_type: PositionType) -> float:
+    def get_take_profit(self, symbol: str, open_price: float, position_type: PositionType) -> float:
         atr = self.get_indicator("atr")
         if position_type == PositionType.LONG:
             return open_price + (self.risk_reward_ratio * self.atr_factor * atr[-1])
         elif position_type == PositionType.SHORT:
             return open_price - (self.risk_reward_ratio * self.atr_factor * atr[-1])
 
+    def get_leverage(self) -> float:
+        return 1
+
     def get_margin_investment(self) -> float:
         return self.wallet_handler.get_balance() * self.investment_rate
 
@@ -104,13 +107,13 @@ class RsiStoch200Ema(Strategy):
 
         return self.last_low_closes > self.closes[-1]
 
-    def long_rsi_condition(self, frame) -> bool:
+    def short_rsi_condition(self, frame) -> bool:
         rsi = self.get_indicator('rsi')
         if len(rsi) > 0 and len(rsi) > self.hidden_divergence_timeframe:
             self.last_low_rsi = min(rsi[-self.hidden_divergence_timeframe:-1])
         else:
             self.last_low_rsi = min(rsi)
-        return self.last_low_rsi > self.rsi[-1]
+        return self.last_low_rsi > rsi[-1]
 
     def long_rsi_condition(self, frame) -> bool:
         rsi = self.get_indicator('rsi')
@@ -118,7 +121,7 @@ class RsiStoch200Ema(Strategy):
             self.last_low_rsi = min(rsi[-self.hidden_divergence_timeframe:-1])
         else:
             self.last_low_rsi = min(rsi)
-        return self.last_low_rsi < self.rsi[-1]
+        return self.last_low_rsi < rsi[-1]
 
     def long_stoch_condition(self, frame) -> bool:
         slow_k, slow_d = self.get_indicator('stoch')
@@ -1,11 +1,14 @@
 import numpy as np
 import talib as technical
 
+from core.bot import vector_evaluator
+from core.bot.candle_store import HIGH, LOW, CLOSE
 from core.bot.condition import EventStrategyCondition, PerpetualStrategyCondition, BoundedStrategyCondition
 from core.bot.strategy import *
+from core.bot.vector_evaluator import VectorizedStrategy
 
 
-class StochRsiMacdStrategy(Strategy):
+class StochRsiMacdStrategy(Strategy, VectorizedStrategy):
     """
     Simple STOCH, MACD, RSI strategy.
 
@@ -27,31 +30,38 @@ class StochRsiMacdStrategy(Strategy):
         self.investment_rate = strategy_params["investment_ratio"]
         self.stoch_overbought = strategy_params["stoch_overbought"]
         self.stoch_oversold = strategy_params["stoch_oversold"]
+        self.atr_series = None
         super().__init__(wallet_handler, self.MAX_OPEN_POSITIONS_NUMBER)
 
+    def compute_indicators_step(self, frame):
+        pass
+
     def compute_indicators(self) -> list[tuple[str, any]]:
         return [
-            ("stoch", technical.STOCH(np.array(self.highs), np.array(self.lows), np.array(self.closes),
+            ("stoch", technical.STOCH(self.highs, self.lows, self.closes,
                                       fastk_period = 14,
                                       slowk_period = 1,
                                       slowd_period = 3,
                                       slowk_matype = 0, slowd_matype = 0)),
-            ("atr", technical.ATR(np.array(self.highs), np.array(self.lows), np.array(self.closes))),
-            ("rsi", technical.RSI(np.array(self.closes), 14)),
-            ("macd", technical.MACD(np.array(self.closes)))]
+            ("atr", technical.ATR(self.highs, self.lows, self.closes)),
+            ("rsi", technical.RSI(self.closes, 14)),
+            ("macd", technical.MACD(self.closes))]
+
+    def get_leverage(self) -> float:
+        return 1
 
     def get_margin_investment(self):
         # TODO set a new margin investment strategy
         return self.wallet_handler.get_balance() * self.investment_rate
 
-    def get_stop_loss(self, open_price: float, position_type: PositionType) -> float:
+    def get_stop_loss(self, symbol: str, open_price: float, position_type: PositionType) -> float:
         atr = self.get_indicator("atr")
         if position_type == PositionType.LONG:
             return open_price - (self.atr_factor * atr[-1])
         elif position_type == PositionType.SHORT:
             return open_price + (self.atr_factor * atr[-1])
 
-    def get_take_profit(self, open_price: float, position_type: PositionType) -> float:
+    def get_take_profit(self, symbol: str, open_price: float, position_type: PositionType) -> float:
         atr = self.get_indicator("atr")
         if position_type == PositionType.LONG:
             return open_price + (self.risk_reward_ratio * self.atr_factor * atr[-1])
@@ -120,3 +130,48 @@ class StochRsiMacdStrategy(Strategy):
         return rsi[-1] < 50  # and macd[-1] <= signal[-1]
 
     # endregion
+
+    # region Vectorized
+
+    def compute_bar_indicators(self, bars: np.ndarray) -> dict[str, any]:
+        highs, lows, closes = np.ascontiguousarray(bars[:, HIGH]), np.ascontiguousarray(bars[:, LOW]), np.ascontiguousarray(bars[:, CLOSE])
+        return {
+            "stoch": technical.STOCH(highs, lows, closes, fastk_period = 14, slowk_period = 1, slowd_period = 3, slowk_matype = 0, slowd_matype = 0),
+            "atr": technical.ATR(highs, lows, closes),
+            "rsi": technical.RSI(closes, 14),
+            "macd": technical.MACD(closes)}
+
+    def compute_signals(self, bars: np.ndarray, indicators: dict[str, any]) -> [list[vector_evaluator.ConditionSignal], list[vector_evaluator.ConditionSignal]]:
+        stoch_k, stoch_d = indicators["stoch"]
+        rsi = indicators["rsi"]
+        macd, signal, hist = indicators["macd"]
+        self.atr_series = indicators["atr"]
+
+        macd_prev, signal_prev = np.roll(macd, 1), np.roll(signal, 1)
+        macd_prev[0], signal_prev[0] = np.nan, np.nan
+        with np.errstate(invalid = "ignore"):
+            long_conditions = [
+                vector_evaluator.BoundedSignal((stoch_k < self.stoch_oversold) & (stoch_d < self.stoch_oversold),
+                                               (stoch_k > self.stoch_overbought) | (stoch_d > self.stoch_overbought), self.intervals_tolerance),
+                vector_evaluator.PerpetualSignal(rsi > 50),
+                vector_evaluator.EventSignal((macd_prev <= signal_prev) & (macd > signal), self.intervals_tolerance)
+            ]
+            short_conditions = [
+                vector_evaluator.EventSignal((macd_prev >= signal_prev) & (macd < signal), self.intervals_tolerance),
+                vector_evaluator.PerpetualSignal(rsi < 50),
+                vector_evaluator.BoundedSignal((stoch_k > self.stoch_overbought) & (stoch_d > self.stoch_overbought),
+                                               (stoch_k < self.stoch_oversold) | (stoch_d < self.stoch_oversold), self.intervals_tolerance)
+            ]
+        return long_conditions, short_conditions
+
+    def get_investment_ratio(self) -> float:
+        return self.investment_rate
+
+    def get_exit_levels(self, open_prices: np.ndarray, entry_indexes: np.ndarray, position_type: PositionType) -> [np.ndarray, np.ndarray]:
+        atr = self.atr_series[entry_indexes]
+        if position_type == PositionType.LONG:
+            return open_prices + (self.risk_reward_ratio * self.atr_factor * atr), open_prices - (self.atr_factor * atr)
+        else:
+            return open_prices - (self.risk_reward_ratio * self.atr_factor * atr), open_prices + (self.atr_factor * atr)
+
+    # endregion
@@ -0,0 +1,37 @@
+from core.bot import dataset_evaluator, trade_log
+from core.training.genetic_trainer import FitnessCache
+
+
+def create_results(trades: int = 2) -> list[dataset_evaluator.TestResult]:
+    return [dataset_evaluator.TestResult.from_trades(1000, 1440, 3, trade_log.create(trades), trades)]
+
+
+def test_counts_hits_and_misses():
+    cache = FitnessCache(10)
+    assert cache.get((1.0,)) is None
+    cache.put((1.0,), create_results())
+    assert cache.get((1.0,)) is not None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
+
+
+def test_stores_the_results_without_trades():
+    cache = FitnessCache(10)
+    cache.put((1.0,), create_results())
+    assert len(cache.get((1.0,))[0].trades) == 0
+
+
+def test_evicts_the_least_recently_used():
+    cache = FitnessCache(2)
+    cache.put((1.0,), create_results())
+    cache.put((2.0,), create_results())
+    cache.get((1.0,))
+    cache.put((3.0,), create_results())
+    assert (1.0,) in cache and (3.0,) in cache and (2.0,) not in cache
+
+
+def test_skips_incomplete_results():
+    cache = FitnessCache(10)
+    cache.put((1.0,), [None])
+    cache.put((2.0,), None)
+    assert len(cache) == 0
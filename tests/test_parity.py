@@ -0,0 +1,10 @@
+from core.bot import parity as engines_parity
+from indicators import parity as indicators_parity
+
+
+def test_indicators_match_talib_and_streaming():
+    assert indicators_parity.run(length = 50000)
+
+
+def test_engines_trade_the_same():
+    assert engines_parity.run()
@@ -0,0 +1,46 @@
+import datetime
+import math
+
+from core.bot import wallet_handler
+from core.bot.position import KucoinPosition, PositionType, OrderType
+from core.bot.position_book import PositionBook
+
+
+def create_position(position_type: PositionType, take_profit: float, stop_loss: float, currency: str = "BTCUSDT") -> KucoinPosition:
+    return KucoinPosition(currency, position_type, OrderType.MARKET, datetime.datetime.utcnow(), 100, take_profit, stop_loss, 1, 1, wallet_handler.TestWallet(1000))
+
+
+def test_closes_the_positions_in_the_candle_range():
+    book = PositionBook()
+    long = create_position(PositionType.LONG, 105, 95)
+    short = create_position(PositionType.SHORT, 95, 105)
+    untouched = create_position(PositionType.LONG, 110, 90)
+    for position in (long, short, untouched): book.add(position)
+    assert book.close_triggered("BTCUSDT", 99, 106) == [long, short]
+    assert long.won and not short.won
+    assert list(book) == [untouched]
+
+
+def test_closes_in_opening_order():
+    book = PositionBook()
+    positions = [create_position(PositionType.LONG, take_profit, 90) for take_profit in (104, 102, 103)]
+    for position in positions: book.add(position)
+    assert book.close_triggered("BTCUSDT", 99, 104) == positions
+
+
+def test_keeps_the_symbols_apart():
+    book = PositionBook()
+    book.add(create_position(PositionType.LONG, 105, 95, "ETHUSDT"))
+    assert book.close_triggered("BTCUSDT", 90, 110) == []
+    assert len(book) == 1
+
+
+def test_non_finite_levels_do_not_block_the_others():
+    book = PositionBook()
+    undefined = create_position(PositionType.LONG, math.nan, math.nan)
+    half = create_position(PositionType.LONG, math.nan, 95)
+    defined = create_position(PositionType.LONG, 105, 95)
+    for position in (undefined, half, defined): book.add(position)
+    assert book.close_triggered("BTCUSDT", 99, 106) == [defined]
+    assert book.close_triggered("BTCUSDT", 94, 99) == [half]
+    assert list(book) == [undefined]
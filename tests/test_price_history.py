@@ -0,0 +1,21 @@
+import numpy
+
+from core.bot.price_history import PriceHistory, OPENS, CLOSES
+
+
+def test_views_grow_until_full():
+    history = PriceHistory(3)
+    assert len(history) == 0 and len(history.view(CLOSES)) == 0
+    history.append(1, 2, 0, 1.5)
+    history.append(2, 3, 1, 2.5)
+    assert len(history) == 2
+    assert numpy.array_equal(history.view(OPENS), [1, 2])
+    assert numpy.array_equal(history.view(CLOSES), [1.5, 2.5])
+
+
+def test_views_roll_over_the_last_values():
+    history = PriceHistory(3)
+    for value in range(10): history.append(value, value + 1, value - 1, value + 0.5)
+    assert len(history) == 3
+    assert numpy.array_equal(history.view(OPENS), [7, 8, 9])
+    assert history.view(CLOSES).flags["C_CONTIGUOUS"]
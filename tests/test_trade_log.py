@@ -0,0 +1,31 @@
+import pickle
+
+from core.bot import trade_log
+from core.bot.trade_log import TradeLog, LONG, SHORT
+
+
+def test_grows_past_its_capacity():
+    log = TradeLog(2)
+    for i in range(5): log.append(i, i + 1, 100, 101, LONG if i % 2 == 0 else SHORT, 10, 0.1, 1, True)
+    assert len(log) == 5
+    assert list(log.trades["open_time"]) == [0, 1, 2, 3, 4]
+    assert list(log.trades["side"]) == [LONG, SHORT, LONG, SHORT, LONG]
+
+
+def test_pickles_only_the_recorded_trades():
+    log = TradeLog(256)
+    log.append(0, 1, 100, 99, SHORT, 10, 0.1, 1.01, True)
+    restored = pickle.loads(pickle.dumps(log))
+    assert len(restored) == 1
+    assert restored.trades.dtype == trade_log.TRADE_DTYPE
+    assert restored.trades[0]["close_price"] == 99
+
+
+def test_clear_and_empty_restore():
+    log = TradeLog()
+    log.append(0, 1, 100, 101, LONG, 10, 0.1, 1, True)
+    log.clear()
+    restored = pickle.loads(pickle.dumps(log))
+    assert len(log) == 0 and len(restored) == 0
+    restored.append(0, 1, 100, 101, LONG, 10, 0.1, 1, True)
+    assert len(restored) == 1
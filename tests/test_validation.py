@@ -0,0 +1,26 @@
+import pytest
+
+from core.training.validation import get_folds
+
+
+def test_k_fold_windows_are_consecutive():
+    assert get_folds(4) == [(0, 0, 0.25), (0.25, 0.25, 0.5), (0.5, 0.5, 0.75), (0.75, 0.75, 1)]
+
+
+def test_rolling_windows_follow_their_lead_in():
+    folds = get_folds(3, "rolling", 1)
+    assert folds == [(0, 0.25, 0.5), (0.25, 0.5, 0.75), (0.5, 0.75, 1)]
+
+
+@pytest.mark.parametrize("folds_number, lead_in_ratio", [(1, 1), (5, 2), (7, 0.5)])
+def test_rolling_tests_cover_the_data_after_the_lead_in(folds_number, lead_in_ratio):
+    folds = get_folds(folds_number, "rolling", lead_in_ratio)
+    assert len(folds) == folds_number
+    assert folds[-1][2] == pytest.approx(1)
+    for (lead_in, start, end), following in zip(folds, folds[1:] + [None]):
+        assert lead_in < start < end
+        if following is not None: assert following[1] == pytest.approx(end)
+
+
+def test_at_least_one_fold():
+    assert get_folds(0) == [(0, 0, 1)]
@@ -22,12 +22,17 @@ def failure(helper_str: str):
 
 command_manager = CommandHandler.create() \
     .positional("Genetic parameters") \
-    .positional("Dataset file") \
+    .positional("Dataset files, separated by commas") \
     .keyed("-o", "Output file .res") \
     .keyed("-r", "Epoch report") \
     .keyed("-ib", "Initial balance") \
-    .keyed("-v", "Validation set file") \
+    .keyed("-v", "Validation set files, separated by commas") \
     .keyed("-vr", "Validation report file") \
+    .keyed("-mb", "Migration broker host:port") \
+    .keyed("-mk", "Authkey of the migration broker, " + config.MIGRATION_BROKER_AUTHKEY_VARIABLE + " if not given") \
+    .keyed("--resume", "Checkpoint to resume the training from") \
+    .keyed("-ea", "Address host:port the remote workers connect to, with the remote executor (127.0.0.1 by default)") \
+    .keyed("-ek", "Authkey of the remote workers, " + config.EXECUTOR_AUTHKEY_VARIABLE + " if not given") \
     .on_help(helper) \
     .on_fail(failure) \
     .build(sys.argv)
@@ -68,9 +73,38 @@ if __name__ == "__main__":
                                        processes_number = lib.try_get_json_attr("processes_number", hyperparameters),
                                        validation_interval = lib.try_get_json_attr("validation_interval", hyperparameters),
                                        validation_set_path = command_manager.get_k("-v"),
+                                       validation_folds = lib.try_get_json_attr("validation_folds", hyperparameters),
+                                       validation_mode = lib.try_get_json_attr("validation_mode", hyperparameters),
+                                       validation_lead_in = lib.try_get_json_attr("validation_lead_in", hyperparameters),
+                                       validation_top = lib.try_get_json_attr("validation_top", hyperparameters),
                                        validation_report_path = command_manager.get_k("-vr"),
                                        initial_balance = initial_balance,
                                        timeframe = timeframe,
+                                       closed_bars = lib.try_get_json_attr("closed_bars", hyperparameters),
+                                       # The event engine is authoritative, the vectorized one is allowed only on the closed bars where core.bot.parity checks they trade the same
+                                       vectorized = lib.try_get_json_attr("vectorized", hyperparameters),
+                                       indicators_cache_mb = lib.try_get_json_attr("indicators_cache_mb", hyperparameters),
+                                       store_indicators = lib.try_get_json_attr("store_indicators", hyperparameters),
+                                       fitness_cache = lib.try_get_json_attr("fitness_cache", hyperparameters),
+                                       fitness_cache_size = lib.try_get_json_attr("fitness_cache_size", hyperparameters),
+                                       gene_quantization = lib.try_get_json_attr("gene_quantization", hyperparameters),
+                                       racing_segments = lib.try_get_json_attr("racing_segments", hyperparameters),
+                                       racing_keep = lib.try_get_json_attr("racing_keep", hyperparameters),
+                                       racing_metric = lib.try_get_json_attr("racing_metric", hyperparameters),
+                                       evolution = lib.try_get_json_attr("evolution", hyperparameters),
+                                       islands = lib.try_get_json_attr("islands", hyperparameters),
+                                       migration_interval = lib.try_get_json_attr("migration_interval", hyperparameters),
+                                       migrants = lib.try_get_json_attr("migrants", hyperparameters),
+                                       migration_broker = command_manager.get_k("-mb"),
+                                       migration_authkey = command_manager.get_k("-mk"),
+                                       checkpoint_interval = lib.try_get_json_attr("checkpoint_interval", hyperparameters),
+                                       resume_path = command_manager.get_k("--resume"),
+                                       executor = lib.try_get_json_attr("executor", hyperparameters),
+                                       executor_address = command_manager.get_k("-ea"),
+                                       executor_authkey = command_manager.get_k("-ek"),
+                                       task_timeout = lib.try_get_json_attr("task_timeout", hyperparameters),
+                                       task_cap = lib.try_get_json_attr("task_cap", hyperparameters),
+                                       speculation = lib.try_get_json_attr("speculation", hyperparameters),
                                        report_path = report_path)
     except(KeyboardInterrupt, SystemExit):
         exit(0)